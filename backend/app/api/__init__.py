@@ -6,11 +6,16 @@ from app.core.environment import API_V1_STR
 api_router = APIRouter()
 
 # Importar y agregar routers de los diferentes módulos
-from app.api.endpoints import auth, usuarios, trabajadores, obras, partidas, horas
+from app.api.endpoints import auth, usuarios, trabajadores, obras, partidas, horas, propagaciones, trabajos, metricas, informes, nominas
 
 api_router.include_router(auth.router, prefix="/auth", tags=["autenticación"])
 api_router.include_router(usuarios.router, prefix="/usuarios", tags=["usuarios"])
 api_router.include_router(trabajadores.router, prefix="/trabajadores", tags=["trabajadores"])
 api_router.include_router(obras.router, prefix="/obras", tags=["obras"])
 api_router.include_router(partidas.router, prefix="/partidas", tags=["partidas"])
-api_router.include_router(horas.router, prefix="/horas", tags=["horas"]) 
\ No newline at end of file
+api_router.include_router(horas.router, prefix="/horas", tags=["horas"])
+api_router.include_router(propagaciones.router, prefix="/propagaciones", tags=["propagaciones"])
+api_router.include_router(trabajos.router, prefix="/trabajos", tags=["trabajos"])
+api_router.include_router(metricas.router, prefix="/metricas", tags=["métricas"])
+api_router.include_router(informes.router, prefix="/informes", tags=["informes"])
+api_router.include_router(nominas.router, prefix="/nominas", tags=["nóminas"]) 
\ No newline at end of file
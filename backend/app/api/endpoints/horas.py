@@ -1,10 +1,15 @@
-from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+import asyncio
+import json
+import logging
+from typing import List, Literal, Optional, Tuple
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, UploadFile, File, Header
+from fastapi.responses import StreamingResponse, Response
+from pydantic import TypeAdapter
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
+from sqlalchemy import func, and_, case, tuple_
 from datetime import date, datetime, timedelta, time
 
-from app.db.database import get_db
+from app.db.database import get_db, get_db_lectura
 from app.models.horas import Hora
 from app.schemas.horas import (
     Hora as HoraSchema,
@@ -13,15 +18,112 @@ from app.schemas.horas import (
     ResumenDiario,
     ResumenMensual,
     HorasLoteCreate,
-    TramoCreate
+    TramoCreate,
+    ResumenHoy,
+    ResumenObraHoy,
+    ImportacionHorasResultado,
+    DisponibilidadHoras,
+    IntervaloHorario,
+    CalendarioHoras,
+    CalendarioEquipo
 )
 from app.core.permissions import get_current_secretaria_user, get_current_trabajador_user
+from app.core.auth import get_current_user_stream
+from app.core.trabajos import encolar_trabajo, registrar_trabajo
+from app.schemas.trabajos import Trabajo as TrabajoSchema
+from app.core.cache_informes import (
+    responder_con_cache,
+    CLAVE_TRABAJADORES,
+    incrementar_versiones,
+    claves_afectadas,
+    claves_meses_rango,
+    clave_mes,
+    clave_obra
+)
+from app.db.database import SessionLocal
 from app.models.usuarios import Usuario
 from app.models.trabajadores import Trabajador
 from app.models.partidas import Partida  # Import Partida model
+from app.models.obras import Obra
+from app.core.columnar import FORMATO_COLUMNAR, respuesta_columnar
+from app.core.eventos_horas import (
+    publicar_evento_horas,
+    calcular_totales_dia,
+    difusor_horas,
+    filtrar_mensaje_trabajador,
+    ACCION_CREADO,
+    ACCION_ACTUALIZADO,
+    ACCION_ELIMINADO
+)
+from app.core.importacion_horas import importar_horas_csv
+from app.core.idempotencia import (
+    ejecutar_idempotente,
+    confirmar_escritura,
+    guardar_en_transaccion,
+    idempotencia_en_curso,
+    sesion_idempotente,
+    CABECERA_IDEMPOTENCIA
+)
+from app.core.agrupador import AgrupadorEscrituras
+from app.core.intervalos import IndiceTramos, a_hora, a_segundos
+from app.core.calendario import calendario_trabajador, calendario_equipo, limites_año
+from app.core.auditoria import registrar_auditoria, instantanea
+from app.core.listados import paginar
+from app.models.auditoria import HoraAudit
+from app.schemas.auditoria import RegistroAuditoria
+from app.core.environment import HORAS_GROUP_COMMIT, HORAS_GROUP_COMMIT_VENTANA_MS, HORAS_GROUP_COMMIT_MAX_LOTE
 from sqlalchemy.exc import IntegrityError # Import for commit error handling
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Columnas devueltas en el formato columnar (?format=columnar)
+HORA_COLUMNAS = [
+    "id_movimiento", "timestamp", "chat_id", "nombre_trabajador", "fecha",
+    "id_obra", "nombre_obra", "id_partida", "nombre_partida", "horario",
+    "hora_inicio", "hora_fin", "horas_totales", "año", "mes", "es_extra",
+    "tipo_extra", "descripcion_extra", "es_regularizacion"
+]
+# Columnas de texto repetitivas que se codifican como índices sobre un diccionario
+HORA_COLUMNAS_DICCIONARIO = ["chat_id", "nombre_trabajador", "nombre_obra", "nombre_partida", "tipo_extra"]
+
+# Serializadores para devolver respuestas ya codificadas (necesario para poder cachearlas)
+_horas_adapter = TypeAdapter(List[HoraSchema])
+_hora_adapter = TypeAdapter(HoraSchema)
+_resumen_mensual_adapter = TypeAdapter(List[ResumenMensual])
+_calendario_adapter = TypeAdapter(CalendarioHoras)
+_calendario_equipo_adapter = TypeAdapter(CalendarioEquipo)
+
+def _respuesta_json(adapter: TypeAdapter, datos) -> Response:
+    """Valida y serializa los datos con el schema de respuesta y devuelve el JSON ya codificado"""
+    return Response(
+        content=adapter.dump_json(adapter.validate_python(datos, from_attributes=True)),
+        media_type="application/json"
+    )
+
+def _refrescar(db: Session, horas: List[Hora]) -> List[Hora]:
+    """Recarga los registros recién escritos (valores calculados por la base de datos)"""
+    for hora in horas:
+        db.refresh(hora)
+    return horas
+
+def _respuesta_horas_columnar(db: Session, horas: List[Hora]):
+    """Construye la respuesta columnar de una lista de horas, resolviendo los nombres de obra en una sola consulta"""
+    ids_obra = {hora.id_obra for hora in horas if hora.id_obra is not None}
+    nombres_obra = {}
+    if ids_obra:
+        nombres_obra = dict(
+            db.query(Obra.id_obra, Obra.nombre_obra).filter(Obra.id_obra.in_(ids_obra)).all()
+        )
+
+    filas = (
+        {
+            **{columna: getattr(hora, columna) for columna in HORA_COLUMNAS if columna != "nombre_obra"},
+            "nombre_obra": nombres_obra.get(hora.id_obra)
+        }
+        for hora in horas
+    )
+    return respuesta_columnar(filas, HORA_COLUMNAS, HORA_COLUMNAS_DICCIONARIO)
 
 @router.get("", response_model=List[HoraSchema])
 async def read_horas(
@@ -34,13 +136,15 @@ async def read_horas(
     fecha: Optional[date] = None,
     fecha_inicio: Optional[date] = None,
     fecha_fin: Optional[date] = None,
-    db: Session = Depends(get_db),
+    format: Optional[str] = Query(None, description="Usar 'columnar' para recibir arrays por columna"),
+    db: Session = Depends(get_db_lectura),
     current_user: Usuario = Depends(get_current_trabajador_user)
 ):
     """
     Obtener registros de horas con filtros opcionales
     - Si es un trabajador, solo puede obtener sus propios registros
     - Si es secretaria o admin, puede obtener todos los registros
+    - Con format=columnar se devuelven arrays por columna y los nombres como índices de diccionario
     """
     query = db.query(Hora)
     
@@ -77,8 +181,30 @@ async def read_horas(
         if fecha_fin:
             query = query.filter(Hora.fecha <= fecha_fin)
     
-    horas = query.order_by(Hora.fecha.desc()).offset(skip).limit(limit).all()
-    return horas
+    def generar():
+        horas = query.order_by(Hora.fecha.desc()).offset(skip).limit(limit).all()
+        if format == FORMATO_COLUMNAR:
+            return _respuesta_horas_columnar(db, horas)
+        return _respuesta_json(_horas_adapter, horas)
+    
+    # Solo se cachean las consultas tipo informe: acotadas por obra o por un rango de meses
+    dependencias = []
+    if fecha:
+        dependencias = [clave_mes(fecha.year, fecha.month)]
+    elif fecha_inicio and fecha_fin:
+        dependencias = claves_meses_rango(fecha_inicio, fecha_fin) or []
+    if id_obra:
+        dependencias.append(clave_obra(id_obra))
+    
+    if not dependencias:
+        return generar()
+    
+    parametros = {
+        "skip": skip, "limit": limit, "chat_id": target_chat_id, "id_obra": id_obra,
+        "id_partida": id_partida, "fecha": fecha, "fecha_inicio": fecha_inicio,
+        "fecha_fin": fecha_fin, "format": format
+    }
+    return responder_con_cache(db, "horas", parametros, current_user, dependencias, generar)
 
 @router.get("/hoy", response_model=List[HoraSchema])
 async def read_horas_hoy(
@@ -101,17 +227,131 @@ async def read_horas_hoy(
     horas = query.all()
     return horas
 
+@router.get("/hoy/resumen", response_model=ResumenHoy)
+async def read_resumen_hoy(
+    db: Session = Depends(get_db),
+    current_user: Usuario = Depends(get_current_trabajador_user)
+):
+    """
+    Obtener los totales del día actual calculados en SQL (una sola consulta con GROUPING SETS)
+    - Si es un trabajador, solo se agregan sus propios registros
+    - Si es secretaria o admin, se agregan todos los registros
+    """
+    hoy = date.today()
+    horas_extra = case((Hora.es_extra == True, Hora.horas_totales), else_=0)
+    horas_regularizacion = case((Hora.es_regularizacion == True, Hora.horas_totales), else_=0)
+
+    query = db.query(
+        func.grouping(Hora.id_obra).label("es_total"),
+        Hora.id_obra,
+        Obra.nombre_obra,
+        func.count(Hora.id_movimiento).label("registros"),
+        func.count(func.distinct(Hora.chat_id)).label("trabajadores"),
+        func.coalesce(func.sum(Hora.horas_totales), 0).label("horas_totales"),
+        func.coalesce(func.sum(horas_extra), 0).label("horas_extra"),
+        func.count(case((Hora.es_regularizacion == True, 1))).label("registros_regularizacion"),
+        func.coalesce(func.sum(horas_regularizacion), 0).label("horas_regularizacion")
+    ).outerjoin(Obra, Obra.id_obra == Hora.id_obra).filter(Hora.fecha == hoy)
+
+    # Filtrar por trabajador si es un rol de trabajador
+    if current_user.rol == "trabajador":
+        query = query.filter(Hora.chat_id == current_user.chat_id)
+
+    # Fila total (grouping = 1) y una fila por obra en la misma consulta
+    filas = query.group_by(
+        func.grouping_sets(tuple_(), tuple_(Hora.id_obra, Obra.nombre_obra))
+    ).all()
+
+    total = next((fila for fila in filas if fila.es_total == 1), None)
+    obras = [
+        ResumenObraHoy(
+            id_obra=fila.id_obra,
+            nombre_obra=fila.nombre_obra,
+            trabajadores=fila.trabajadores,
+            horas_totales=fila.horas_totales,
+            horas_extra=fila.horas_extra
+        )
+        for fila in filas if fila.es_total == 0
+    ]
+
+    return ResumenHoy(
+        fecha=hoy,
+        registros=total.registros if total else 0,
+        trabajadores=total.trabajadores if total else 0,
+        horas_totales=total.horas_totales if total else 0,
+        horas_extra=total.horas_extra if total else 0,
+        horas_normales=(total.horas_totales - total.horas_extra) if total else 0,
+        registros_regularizacion=total.registros_regularizacion if total else 0,
+        horas_regularizacion=total.horas_regularizacion if total else 0,
+        obras=sorted(obras, key=lambda obra: obra.horas_totales, reverse=True)
+    )
+
+@router.get("/stream")
+async def stream_horas(
+    request: Request,
+    current_user: Usuario = Depends(get_current_user_stream)
+):
+    """
+    Stream de eventos (Server-Sent Events) con los registros de horas creados, actualizados
+    y eliminados, junto con los totales del día actual.
+    - Los eventos llegan por LISTEN/NOTIFY de Postgres, así que funciona con varios workers
+    - Solo secretaria y admin reciben los eventos completos y los totales; cualquier otro rol
+      recibe únicamente sus propios registros (ids, filas y chat_id filtrados) y sin totales globales
+    """
+    es_trabajador = current_user.rol not in ("secretaria", "admin")
+    chat_id_usuario = current_user.chat_id
+
+    def formatear(evento: str, datos: dict) -> str:
+        return f"event: {evento}\ndata: {json.dumps(datos)}\n\n"
+
+    async def generar_eventos():
+        cola = difusor_horas.suscribir()
+        try:
+            if not es_trabajador:
+                db = SessionLocal()
+                try:
+                    totales = await asyncio.to_thread(calcular_totales_dia, db, date.today())
+                finally:
+                    db.close()
+                yield formatear("totales", totales)
+
+            while not await request.is_disconnected():
+                try:
+                    mensaje = await asyncio.wait_for(cola.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    # Comentario keep-alive para que proxies no cierren la conexión
+                    yield ": ping\n\n"
+                    continue
+
+                if es_trabajador:
+                    mensaje = filtrar_mensaje_trabajador(mensaje, chat_id_usuario)
+                    if mensaje is None:
+                        continue
+                else:
+                    mensaje = {clave: valor for clave, valor in mensaje.items() if clave != "propietarios"}
+                yield formatear("horas", mensaje)
+        finally:
+            difusor_horas.cancelar(cola)
+
+    return StreamingResponse(
+        generar_eventos(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.get("/mes", response_model=List[HoraSchema])
 async def read_horas_mes(
     año: int = Query(..., description="Año (ej: 2024)"),
     mes: int = Query(..., ge=1, le=12, description="Mes (1-12)"),
-    db: Session = Depends(get_db),
+    format: Optional[str] = Query(None, description="Usar 'columnar' para recibir arrays por columna"),
+    db: Session = Depends(get_db_lectura),
     current_user: Usuario = Depends(get_current_trabajador_user)
 ):
     """
     Obtener registros de horas de un mes específico
     - Si es un trabajador, solo puede obtener sus propios registros
     - Si es secretaria o admin, puede obtener todos los registros
+    - Con format=columnar se devuelven arrays por columna
     """
     # Determinar primer y último día del mes
     primer_dia = date(año, mes, 1)
@@ -130,21 +370,17 @@ async def read_horas_mes(
     if current_user.rol == "trabajador":
         query = query.filter(Hora.chat_id == current_user.chat_id)
     
-    horas = query.order_by(Hora.fecha).all()
-    return horas
+    def generar():
+        horas = query.order_by(Hora.fecha).all()
+        if format == FORMATO_COLUMNAR:
+            return _respuesta_horas_columnar(db, horas)
+        return _respuesta_json(_horas_adapter, horas)
+    
+    parametros = {"año": año, "mes": mes, "format": format}
+    return responder_con_cache(db, "horas/mes", parametros, current_user, [clave_mes(año, mes)], generar)
 
-@router.get("/resumen-mensual", response_model=List[ResumenMensual])
-async def read_resumen_mensual(
-    año: int = Query(..., description="Año (ej: 2024)"),
-    mes: int = Query(..., ge=1, le=12, description="Mes (1-12)"),
-    db: Session = Depends(get_db),
-    current_user: Usuario = Depends(get_current_trabajador_user)
-):
-    """
-    Obtener resumen mensual agrupado por trabajador y día
-    - Si es un trabajador, solo puede obtener su propio resumen
-    - Si es secretaria o admin, puede obtener todos los resúmenes
-    """
+def _calcular_resumen_mensual(db: Session, año: int, mes: int, current_user: Usuario) -> List[ResumenMensual]:
+    """Calcula el resumen mensual por trabajador y día (compartido por el endpoint y la cola de trabajos)"""
     # Determinar primer y último día del mes
     primer_dia = date(año, mes, 1)
     
@@ -195,6 +431,190 @@ async def read_resumen_mensual(
     
     return resultados
 
+@router.get("/resumen-mensual", response_model=List[ResumenMensual])
+async def read_resumen_mensual(
+    año: int = Query(..., description="Año (ej: 2024)"),
+    mes: int = Query(..., ge=1, le=12, description="Mes (1-12)"),
+    format: Optional[str] = Query(None, description="Usar 'columnar' para recibir arrays por columna"),
+    db: Session = Depends(get_db_lectura),
+    current_user: Usuario = Depends(get_current_trabajador_user)
+):
+    """
+    Obtener resumen mensual agrupado por trabajador y día
+    - Si es un trabajador, solo puede obtener su propio resumen
+    - Si es secretaria o admin, puede obtener todos los resúmenes
+    - Con format=columnar se devuelve una fila por trabajador y día (trabajador, fecha, horas_totales)
+    """
+    def generar():
+        resultados = _calcular_resumen_mensual(db, año, mes, current_user)
+        
+        if format == FORMATO_COLUMNAR:
+            filas = (
+                {"trabajador": resumen.trabajador, "fecha": dia.fecha, "horas_totales": dia.horas_totales}
+                for resumen in resultados
+                for dia in resumen.días
+            )
+            return respuesta_columnar(filas, ["trabajador", "fecha", "horas_totales"], ["trabajador"])
+        
+        return _respuesta_json(_resumen_mensual_adapter, resultados)
+    
+    # Los meses cerrados que no se tocan conservan su versión y nunca se recalculan.
+    # El resumen incluye a todos los trabajadores, así que también depende de las altas y bajas
+    parametros = {"año": año, "mes": mes, "format": format}
+    return responder_con_cache(
+        db, "resumen-mensual", parametros, current_user, [clave_mes(año, mes), CLAVE_TRABAJADORES], generar
+    )
+
+@router.post("/resumen-mensual/trabajo", response_model=TrabajoSchema, status_code=status.HTTP_202_ACCEPTED)
+async def create_resumen_mensual_trabajo(
+    año: int = Query(..., description="Año (ej: 2024)"),
+    mes: int = Query(..., ge=1, le=12, description="Mes (1-12)"),
+    db: Session = Depends(get_db),
+    current_user: Usuario = Depends(get_current_trabajador_user)
+):
+    """
+    Encolar el cálculo del resumen mensual como trabajo en segundo plano.
+    Devuelve 202 con el trabajo; el resultado se obtiene en /trabajos/{id}/resultado
+    """
+    return encolar_trabajo(db, "resumen_mensual", {"año": año, "mes": mes}, current_user)
+
+@registrar_trabajo("resumen_mensual", max_concurrencia=1)
+def _trabajo_resumen_mensual(db: Session, parametros: dict, usuario: Usuario):
+    return _calcular_resumen_mensual(db, parametros["año"], parametros["mes"], usuario)
+
+_ORDEN_AUDITORIA = {"id": HoraAudit.id}
+
+@router.get("/auditoria", response_model=List[RegistroAuditoria])
+async def read_auditoria(
+    response: Response,
+    chat_id: Optional[str] = Query(None, description="Cambios en los registros de este trabajador"),
+    id_movimiento: Optional[int] = Query(None, description="Cambios de este registro"),
+    desde: Optional[datetime] = Query(None, description="Cambios hechos desde este momento"),
+    hasta: Optional[datetime] = Query(None, description="Cambios hechos antes de este momento"),
+    accion: Optional[Literal["creado", "actualizado", "eliminado"]] = None,
+    id_usuario: Optional[int] = Query(None, description="Cambios hechos por este usuario"),
+    orden: str = Query("-id", description="id o -id (más recientes primero)"),
+    cursor: Optional[str] = Query(None, description="Valor de X-Siguiente-Cursor de la página anterior"),
+    limit: int = Query(500, ge=1, le=5000),
+    db: Session = Depends(get_db_lectura),
+    current_user: Usuario = Depends(get_current_secretaria_user)
+):
+    """
+    Historial de cambios en horas por registro, trabajador, usuario o periodo (requiere rol secretaria o admin)
+    - El periodo (desde/hasta) usa el índice BRIN por momento; trabajador y registro, sus índices btree
+    - Paginación por clave con X-Siguiente-Cursor
+    """
+    consulta = db.query(HoraAudit)
+    if chat_id:
+        consulta = consulta.filter(HoraAudit.chat_id == chat_id)
+    if id_movimiento is not None:
+        consulta = consulta.filter(HoraAudit.id_movimiento == id_movimiento)
+    if desde:
+        consulta = consulta.filter(HoraAudit.momento >= desde)
+    if hasta:
+        consulta = consulta.filter(HoraAudit.momento < hasta)
+    if accion:
+        consulta = consulta.filter(HoraAudit.accion == accion)
+    if id_usuario is not None:
+        consulta = consulta.filter(HoraAudit.id_usuario == id_usuario)
+    return paginar(consulta, response, _ORDEN_AUDITORIA, HoraAudit.id, orden, cursor, 0, limit, None)
+
+@router.get("/calendario", response_model=CalendarioHoras)
+async def read_calendario(
+    año: int = Query(..., ge=2000, le=2100, description="Año (ej: 2024)"),
+    chat_id: Optional[str] = None,
+    extra: bool = Query(False, description="Incluir las horas extra de cada día"),
+    obras: bool = Query(False, description="Incluir la obra principal de cada día"),
+    db: Session = Depends(get_db_lectura),
+    current_user: Usuario = Depends(get_current_trabajador_user)
+):
+    """
+    Calendario anual de un trabajador: un array de 365/366 posiciones con las horas de cada día
+    - Se calcula con una sola consulta agrupada por día (no devuelve los registros)
+    - Si es un trabajador, solo puede consultar su propio calendario
+    """
+    chat_id = chat_id or current_user.chat_id
+    if current_user.rol == "trabajador" and current_user.chat_id != chat_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="No tienes permisos para consultar el calendario de otro trabajador"
+        )
+    if not chat_id:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Indica el chat_id del trabajador")
+
+    def generar():
+        return _respuesta_json(_calendario_adapter, calendario_trabajador(db, chat_id, año, extra, obras))
+
+    parametros = {"año": año, "chat_id": chat_id, "extra": extra, "obras": obras}
+    # Con CACHE_INFORMES_MAX_MESES < 12 el año no se puede cachear: se calcula sin caché
+    dependencias = claves_meses_rango(*limites_año(año)[:2])
+    if dependencias is None:
+        return generar()
+    return responder_con_cache(db, "horas/calendario", parametros, current_user, dependencias, generar)
+
+@router.get("/calendario/equipo", response_model=CalendarioEquipo)
+async def read_calendario_equipo(
+    año: int = Query(..., ge=2000, le=2100, description="Año (ej: 2024)"),
+    id_obra: Optional[int] = Query(None, description="Contar solo las horas de esta obra"),
+    extra: bool = Query(False, description="Incluir la matriz de horas extra"),
+    db: Session = Depends(get_db_lectura),
+    current_user: Usuario = Depends(get_current_secretaria_user)
+):
+    """
+    Calendario anual de todo el equipo (requiere rol secretaria o admin)
+    - Matriz trabajador x día en base64 (float32 little-endian): en el navegador se lee con Float32Array
+    - Se calcula con una sola consulta agrupada por trabajador y día
+    """
+    def generar():
+        return _respuesta_json(_calendario_equipo_adapter, calendario_equipo(db, año, id_obra, extra))
+
+    parametros = {"año": año, "id_obra": id_obra, "extra": extra}
+    # Con CACHE_INFORMES_MAX_MESES < 12 el año no se puede cachear: se calcula sin caché
+    dependencias = claves_meses_rango(*limites_año(año)[:2])
+    if dependencias is None:
+        return generar()
+    return responder_con_cache(db, "horas/calendario/equipo", parametros, current_user, dependencias, generar)
+
+@router.get("/disponibilidad", response_model=DisponibilidadHoras)
+async def read_disponibilidad(
+    fecha: date,
+    chat_id: Optional[str] = None,
+    desde: time = Query(time(0, 0), description="Inicio de la franja a consultar"),
+    hasta: time = Query(time(23, 59, 59), description="Fin de la franja a consultar"),
+    minimo_minutos: int = Query(0, ge=0, le=1440, description="Duración mínima de los huecos libres"),
+    db: Session = Depends(get_db),
+    current_user: Usuario = Depends(get_current_trabajador_user)
+):
+    """
+    Tramos ocupados y huecos libres de un trabajador en un día
+    - Usa el mismo índice de intervalos que la validación de solapamiento al crear o actualizar,
+      así que cualquier hueco libre devuelto se puede registrar sin obtener un 409
+    - Se lee de la base de datos principal para ver las escrituras recién confirmadas
+    - Si es un trabajador, solo puede consultar su propia disponibilidad
+    """
+    chat_id = chat_id or current_user.chat_id
+    if current_user.rol == "trabajador" and current_user.chat_id != chat_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="No tienes permisos para consultar la disponibilidad de otro trabajador"
+        )
+    if not chat_id:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Indica el chat_id del trabajador")
+    if desde >= hasta:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="desde debe ser anterior a hasta")
+
+    dia = IndiceTramos.cargar(db, [(chat_id, fecha)]).dia(chat_id, fecha)
+    libres = dia.libres(a_segundos(desde), a_segundos(hasta), minimo_minutos * 60)
+    return DisponibilidadHoras(
+        chat_id=chat_id,
+        fecha=fecha,
+        ocupados=[
+            IntervaloHorario(inicio=inicio_existente, fin=fin_existente, id_movimiento=id_existente)
+            for _, _, (id_existente, inicio_existente, fin_existente) in dia.tramos()
+        ],
+        libres=[IntervaloHorario(inicio=a_hora(inicio), fin=a_hora(fin)) for inicio, fin in libres]
+    )
+
 @router.get("/{movimiento_id}", response_model=HoraSchema)
 async def read_hora(
     movimiento_id: int,
@@ -223,15 +643,36 @@ async def read_hora(
     
     return hora
 
-
-@router.post("/lote", response_model=List[HoraSchema], summary="Crear múltiples registros de horas (lote)")
-async def create_horas_lote(
-    lote_data: HorasLoteCreate,
-    db: Session = Depends(get_db),
+@router.get("/{movimiento_id}/historial", response_model=List[RegistroAuditoria])
+async def read_historial_hora(
+    movimiento_id: int,
+    db: Session = Depends(get_db_lectura),
     current_user: Usuario = Depends(get_current_trabajador_user)
 ):
+    """
+    Historial de cambios de un registro de horas, del más antiguo al más reciente (también si se eliminó)
+    - Si es un trabajador, solo puede ver el historial de sus propios registros
+    """
+    historial = db.query(HoraAudit).filter(HoraAudit.id_movimiento == movimiento_id).order_by(HoraAudit.id).all()
+    if not historial:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No hay historial para este registro"
+        )
+    if current_user.rol == "trabajador" and any(cambio.chat_id != current_user.chat_id for cambio in historial):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="No tienes permisos para ver este historial"
+        )
+    return historial
+
+
+def _crear_horas_lote(db: Session, lote_data: HorasLoteCreate, current_user: Usuario) -> List[Hora]:
+    """
+    Valida y crea todos los tramos de un lote en una única transacción
+    (compartido por el endpoint y la cola de trabajos)
+    """
     created_horas = []
-    processed_tramos_in_lote = [] # Para validar solapamientos dentro del mismo lote
 
     # Obtener todos los chat_id y fechas únicas del lote para una consulta eficiente
     trabajador_fechas_map = {}
@@ -262,16 +703,10 @@ async def create_horas_lote(
             trabajador_fechas_map[tramo_data.chat_id] = set()
         trabajador_fechas_map[tramo_data.chat_id].add(tramo_data.fecha)
 
-    # Obtener registros existentes para validación de solapamiento
-    existing_records_map = {}
-    for chat_id_key, fechas_set in trabajador_fechas_map.items():
-        for fecha_val_key in fechas_set:
-            records = db.query(Hora).filter(
-                Hora.chat_id == chat_id_key,
-                Hora.fecha == fecha_val_key,
-                Hora.es_regularizacion == False
-            ).all()
-            existing_records_map[(chat_id_key, fecha_val_key)] = records
+    # Tramos existentes de todos los (trabajador, día) del lote en una sola consulta
+    indice_tramos = IndiceTramos.cargar(
+        db, ((chat_id, fecha) for chat_id, fechas in trabajador_fechas_map.items() for fecha in fechas)
+    )
 
     for idx, tramo in enumerate(lote_data.tramos):
         # VALIDACIONES DE PERMISOS Y FECHA
@@ -307,29 +742,19 @@ async def create_horas_lote(
                 detail=f"Tramo {idx} ({tramo.chat_id} en {tramo.fecha}): La hora de inicio ({tramo.hora_inicio}) no puede ser posterior o igual a la hora de fin ({tramo.hora_fin})."
             )
 
-        # a) Contra registros existentes en BD
-        map_key = (tramo.chat_id, tramo.fecha)
-        if map_key in existing_records_map:
-            for record in existing_records_map[map_key]:
-                if record.hora_inicio and record.hora_fin: # Solo si el registro tiene tiempos definidos
-                    record_start_dt = datetime.combine(record.fecha, record.hora_inicio)
-                    record_end_dt = datetime.combine(record.fecha, record.hora_fin)
-                    if (current_tramo_start_dt < record_end_dt and record_start_dt < current_tramo_end_dt):
-                        raise HTTPException(
-                            status_code=status.HTTP_409_CONFLICT,
-                            detail=f"Tramo {idx} ({tramo.chat_id} en {tramo.fecha}): El tramo {tramo.hora_inicio}-{tramo.hora_fin} se solapa con el registro existente {record.hora_inicio}-{record.hora_fin} (ID: {record.id_movimiento})."
-                        )
-        
-        # b) Contra tramos ya procesados en este mismo lote
-        for processed_tramo_data in processed_tramos_in_lote:
-            if processed_tramo_data['chat_id'] == tramo.chat_id and processed_tramo_data['fecha'] == tramo.fecha:
-                proc_start_dt = datetime.combine(processed_tramo_data['fecha'], processed_tramo_data['hora_inicio'])
-                proc_end_dt = datetime.combine(processed_tramo_data['fecha'], processed_tramo_data['hora_fin'])
-                if (current_tramo_start_dt < proc_end_dt and proc_start_dt < current_tramo_end_dt):
-                    raise HTTPException(
-                        status_code=status.HTTP_409_CONFLICT,
-                        detail=f"Tramo {idx} ({tramo.chat_id} en {tramo.fecha}): Solapamiento DENTRO DEL LOTE. El tramo {tramo.hora_inicio}-{tramo.hora_fin} se solapa con {processed_tramo_data['hora_inicio']}-{processed_tramo_data['hora_fin']} del mismo lote."
-                    )
+        # a) Contra registros existentes en BD y b) contra tramos ya procesados en este mismo lote
+        solapado = indice_tramos.solapa(tramo.chat_id, tramo.fecha, tramo.hora_inicio, tramo.hora_fin)
+        if solapado is not None:
+            id_existente, inicio_existente, fin_existente = solapado[2]
+            if id_existente is not None:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail=f"Tramo {idx} ({tramo.chat_id} en {tramo.fecha}): El tramo {tramo.hora_inicio}-{tramo.hora_fin} se solapa con el registro existente {inicio_existente}-{fin_existente} (ID: {id_existente})."
+                )
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Tramo {idx} ({tramo.chat_id} en {tramo.fecha}): Solapamiento DENTRO DEL LOTE. El tramo {tramo.hora_inicio}-{tramo.hora_fin} se solapa con {inicio_existente}-{fin_existente} del mismo lote."
+            )
 
         # CREAR OBJETO Hora
         db_hora_data = {
@@ -353,15 +778,15 @@ async def create_horas_lote(
         db.add(db_hora)
         created_horas.append(db_hora)
         
-        processed_tramos_in_lote.append({
-            "chat_id": tramo.chat_id, "fecha": tramo.fecha,
-            "hora_inicio": tramo.hora_inicio, "hora_fin": tramo.hora_fin
-        })
+        indice_tramos.añadir(tramo.chat_id, tramo.fecha, tramo.hora_inicio, tramo.hora_fin, (None, tramo.hora_inicio, tramo.hora_fin))
 
     try:
-        db.commit()
-        for hora_obj in created_horas:
-            db.refresh(hora_obj)
+        db.flush()
+        publicar_evento_horas(db, ACCION_CREADO, created_horas)
+        registrar_auditoria(db, ACCION_CREADO, created_horas, current_user)
+        incrementar_versiones(db, claves_afectadas(created_horas))
+        confirmar_escritura(db, lambda: _respuesta_json(_horas_adapter, _refrescar(db, created_horas)))
+        _refrescar(db, created_horas)
     except IntegrityError as e:
         db.rollback()
         # Considera loggear el error 'e' para depuración
@@ -379,17 +804,63 @@ async def create_horas_lote(
 
     return created_horas
 
-@router.post("", response_model=HoraSchema)
-async def create_hora(
-    hora: HoraCreate,
+@router.post("/lote", response_model=List[HoraSchema], summary="Crear múltiples registros de horas (lote)")
+async def create_horas_lote(
+    lote_data: HorasLoteCreate,
+    idempotency_key: Optional[str] = Header(None, alias=CABECERA_IDEMPOTENCIA),
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(get_current_trabajador_user)
 ):
     """
-    Crear un nuevo registro de horas
-    - Si es un trabajador, solo puede crear registros para sí mismo
-    - Si es secretaria o admin, puede crear registros para cualquier trabajador
-    - Si es regularización, solo admin/secretaria pueden crearlo.
+    Crear todos los tramos de un lote en una única transacción
+    - Con la cabecera Idempotency-Key, los reintentos devuelven la respuesta guardada sin volver a crear nada
+    - Con HORAS_GROUP_COMMIT, las creaciones que llegan a la vez se validan e insertan en una sola transacción
+    """
+    if idempotency_key:
+        return await ejecutar_idempotente(
+            db, current_user, idempotency_key, "POST /horas/lote", lote_data.model_dump(mode="json"),
+            lambda: _respuesta_json(_horas_adapter, _crear_horas_lote(db, lote_data, current_user))
+        )
+    return _crear_horas_lote(db, lote_data, current_user)
+
+@router.post("/lote/trabajo", response_model=TrabajoSchema, status_code=status.HTTP_202_ACCEPTED)
+async def create_horas_lote_trabajo(
+    lote_data: HorasLoteCreate,
+    db: Session = Depends(get_db),
+    current_user: Usuario = Depends(get_current_trabajador_user)
+):
+    """
+    Encolar la creación de un lote grande de horas como trabajo en segundo plano.
+    Devuelve 202 con el trabajo; consultar su estado en /trabajos/{id}
+    """
+    return encolar_trabajo(db, "horas_lote", lote_data.model_dump(), current_user, max_intentos=1)
+
+@registrar_trabajo("horas_lote", max_concurrencia=1)
+def _trabajo_horas_lote(db: Session, parametros: dict, usuario: Usuario):
+    horas = _crear_horas_lote(db, HorasLoteCreate(**parametros), usuario)
+    return {"creados": len(horas), "ids": [hora.id_movimiento for hora in horas]}
+
+@router.post("/import", response_model=ImportacionHorasResultado, summary="Importar horas desde un CSV")
+async def import_horas(
+    archivo: UploadFile = File(...),
+    solo_validar: bool = Query(False, description="Validar el fichero sin insertar nada"),
+    max_errores: int = Query(1000, ge=0, le=100000, description="Máximo de filas con errores en el informe"),
+    db: Session = Depends(get_db),
+    current_user: Usuario = Depends(get_current_secretaria_user)
+):
+    """
+    Importar horas en bloque desde un CSV (solo secretaria/admin)
+    - Cabecera obligatoria con chat_id, fecha, hora_inicio y hora_fin; opcionales id_obra, id_partida,
+      horas_totales (si falta se calcula del horario), es_extra, tipo_extra y descripcion_extra
+    - Separador ',' o ';' y fechas YYYY-MM-DD o DD/MM/YYYY
+    - Se insertan las filas válidas y se devuelve el informe de errores por fila
+    """
+    return await asyncio.to_thread(importar_horas_csv, db, archivo.file, solo_validar, max_errores, current_user)
+
+def _validar_hora(hora: HoraCreate, current_user: Usuario) -> Tuple[Optional[time], Optional[time]]:
+    """
+    Validaciones de un registro que no necesitan la base de datos (permisos, formato del horario, fechas).
+    Devuelve la hora de inicio y fin ya convertidas a time.
     """
     # Validaciones de permisos generales
     if current_user.rol == "trabajador" and current_user.chat_id != hora.chat_id:
@@ -450,6 +921,48 @@ async def create_hora(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Como trabajador, solo puedes registrar horas de hoy o ayer"
             )
+
+    return hora_inicio_obj, hora_fin_obj
+
+def _comprobar_solapamiento(hora: HoraCreate, hora_inicio_obj: Optional[time], hora_fin_obj: Optional[time], indice_tramos: IndiceTramos):
+    """Lanza 409 si el tramo se solapa con alguno de los registros (con hora_inicio y hora_fin) del mismo día"""
+    if hora.es_regularizacion or not hora_inicio_obj or not hora_fin_obj:
+        return
+    solapado = indice_tramos.solapa(hora.chat_id, hora.fecha, hora_inicio_obj, hora_fin_obj)
+    if solapado is not None:
+        id_existente, inicio_existente, fin_existente = solapado[2]
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Solapamiento detectado: El tramo {hora_inicio_obj.strftime('%H:%M')}-{hora_fin_obj.strftime('%H:%M')} se solapa con el registro existente {inicio_existente.strftime('%H:%M')}-{fin_existente.strftime('%H:%M')} (ID: {id_existente})"
+        )
+
+def _nueva_hora(hora: HoraCreate, hora_inicio_obj: Optional[time], hora_fin_obj: Optional[time], trabajador: Trabajador, partida: Partida) -> Hora:
+    """Construye el objeto Hora a guardar, priorizando los objetos time"""
+    final_horario_str = hora.horario # Mantener el string original si se proporcionó
+    if hora_inicio_obj and hora_fin_obj and not final_horario_str:
+        # Si no se proporcionó horario string pero sí tiempos, formatearlo para el campo 'horario'
+        final_horario_str = f"{hora_inicio_obj.strftime('%H:%M')}-{hora_fin_obj.strftime('%H:%M')}"
+
+    return Hora(
+        chat_id=hora.chat_id,
+        nombre_trabajador=trabajador.nombre,
+        fecha=hora.fecha,
+        id_obra=hora.id_obra,
+        id_partida=hora.id_partida,
+        nombre_partida=partida.nombre_partida,
+        hora_inicio=hora_inicio_obj, # Guardar el objeto time
+        hora_fin=hora_fin_obj,     # Guardar el objeto time
+        horario=final_horario_str, # Guardar el string de horario (original o formateado)
+        horas_totales=hora.horas_totales,
+        es_extra=hora.es_extra,
+        tipo_extra=hora.tipo_extra,
+        descripcion_extra=hora.descripcion_extra,
+        es_regularizacion=hora.es_regularizacion
+    )
+
+def _crear_hora(db: Session, hora: HoraCreate, current_user: Usuario) -> Hora:
+    """Valida y crea un registro de horas en su propia transacción"""
+    hora_inicio_obj, hora_fin_obj = _validar_hora(hora, current_user)
     
     # Obtener el nombre del trabajador
     trabajador = db.query(Trabajador).filter(Trabajador.chat_id == hora.chat_id).first()
@@ -461,32 +974,10 @@ async def create_hora(
     
     # Validación de solapamiento de horas (usando hora_inicio_obj y hora_fin_obj)
     if not hora.es_regularizacion and hora_inicio_obj and hora_fin_obj:
-        current_start_dt = datetime.combine(hora.fecha, hora_inicio_obj)
-        current_end_dt = datetime.combine(hora.fecha, hora_fin_obj)
-
-        existing_horas_for_overlap = db.query(Hora).filter(
-            Hora.chat_id == hora.chat_id,
-            Hora.fecha == hora.fecha,
-            Hora.es_regularizacion == False,
-            Hora.hora_inicio != None, # Solo considerar registros con tiempos definidos
-            Hora.hora_fin != None
-        ).all()
-
-        for record in existing_horas_for_overlap:
-            # Asegurarse que el record tiene hora_inicio y hora_fin antes de combinar
-            if record.hora_inicio and record.hora_fin:
-                record_start_dt = datetime.combine(record.fecha, record.hora_inicio)
-                record_end_dt = datetime.combine(record.fecha, record.hora_fin)
-                
-                # Comprobar solapamiento: (StartA < EndB) and (StartB < EndA)
-                if (current_start_dt < record_end_dt and record_start_dt < current_end_dt):
-                    raise HTTPException(
-                        status_code=status.HTTP_409_CONFLICT,
-                        detail=f"Solapamiento detectado: El tramo {hora_inicio_obj.strftime('%H:%M')}-{hora_fin_obj.strftime('%H:%M')} se solapa con el registro existente {record.hora_inicio.strftime('%H:%M')}-{record.hora_fin.strftime('%H:%M')} (ID: {record.id_movimiento})"
-                    )
+        indice_tramos = IndiceTramos.cargar(db, [(hora.chat_id, hora.fecha)])
+        _comprobar_solapamiento(hora, hora_inicio_obj, hora_fin_obj, indice_tramos)
     
     # Convertir nombre_partida
-    from app.models.partidas import Partida
     partida = db.query(Partida).filter(Partida.id_partida == hora.id_partida).first()
     if not partida:
         raise HTTPException(
@@ -495,36 +986,153 @@ async def create_hora(
         )
     
     # Crear el registro
-    # Preparar datos para guardar, priorizando los objetos time
-    final_horario_str = hora.horario # Mantener el string original si se proporcionó
-    if hora_inicio_obj and hora_fin_obj and not final_horario_str:
-        # Si no se proporcionó horario string pero sí tiempos, formatearlo para el campo 'horario'
-        final_horario_str = f"{hora_inicio_obj.strftime('%H:%M')}-{hora_fin_obj.strftime('%H:%M')}"
-
-    db_hora_data = {
-        "chat_id": hora.chat_id,
-        "nombre_trabajador": trabajador.nombre_apellidos,
-        "fecha": hora.fecha,
-        "id_obra": hora.id_obra,
-        "id_partida": hora.id_partida,
-        "nombre_partida": partida.nombre_partida,
-        "hora_inicio": hora_inicio_obj, # Guardar el objeto time
-        "hora_fin": hora_fin_obj,     # Guardar el objeto time
-        "horario": final_horario_str, # Guardar el string de horario (original o formateado)
-        "horas_totales": hora.horas_totales,
-        "es_extra": hora.es_extra,
-        "tipo_extra": hora.tipo_extra,
-        "descripcion_extra": hora.descripcion_extra,
-        "es_regularizacion": hora.es_regularizacion
-    }
-
-    db_hora = Hora(**db_hora_data)
+    db_hora = _nueva_hora(hora, hora_inicio_obj, hora_fin_obj, trabajador, partida)
     
     db.add(db_hora)
-    db.commit()
+    db.flush()
+    publicar_evento_horas(db, ACCION_CREADO, [db_hora])
+    registrar_auditoria(db, ACCION_CREADO, [db_hora], current_user)
+    incrementar_versiones(db, claves_afectadas([db_hora]))
+    confirmar_escritura(db, lambda: _respuesta_json(_hora_adapter, _refrescar(db, [db_hora])[0]))
     db.refresh(db_hora)
     return db_hora
 
+def _crear_horas_agrupadas(pendientes: List[Tuple[HoraCreate, Usuario, Optional[dict]]]) -> list:
+    """
+    Group commit: valida y crea varios registros individuales llegados a la vez con una sola
+    transacción y un solo commit. Las consultas de trabajadores, partidas y registros existentes
+    se hacen una vez para todo el grupo. Cada registro obtiene su propio resultado (HoraSchema)
+    o su propia excepción, igual que si se hubiera creado por separado y en orden de llegada.
+    Las peticiones con Idempotency-Key (tercer elemento) guardan su respuesta en la misma transacción.
+    """
+    resultados: list = [None] * len(pendientes)
+    db = SessionLocal()
+    try:
+        validos = []
+        for indice, (hora, usuario, _) in enumerate(pendientes):
+            try:
+                validos.append((indice, hora, usuario, *_validar_hora(hora, usuario)))
+            except HTTPException as e:
+                resultados[indice] = e
+
+        chat_ids = {hora.chat_id for _, hora, *_ in validos}
+        trabajadores = {t.chat_id: t for t in db.query(Trabajador).filter(Trabajador.chat_id.in_(chat_ids))} if chat_ids else {}
+        ids_partida = {hora.id_partida for _, hora, *_ in validos if hora.id_partida is not None}
+        partidas = {p.id_partida: p for p in db.query(Partida).filter(Partida.id_partida.in_(ids_partida))} if ids_partida else {}
+
+        # Registros existentes de todos los (trabajador, día) del grupo, en una sola consulta
+        indice_tramos = IndiceTramos.cargar(
+            db, ((hora.chat_id, hora.fecha) for _, hora, *_ in validos if not hora.es_regularizacion)
+        )
+
+        nuevas = []
+        for indice, hora, usuario, hora_inicio_obj, hora_fin_obj in validos:
+            try:
+                trabajador = trabajadores.get(hora.chat_id)
+                if not trabajador:
+                    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Trabajador no encontrado")
+                # Los registros aceptados antes en el mismo grupo cuentan como existentes
+                _comprobar_solapamiento(hora, hora_inicio_obj, hora_fin_obj, indice_tramos)
+                partida = partidas.get(hora.id_partida)
+                if not partida:
+                    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Partida no encontrada")
+            except HTTPException as e:
+                resultados[indice] = e
+                continue
+
+            db_hora = _nueva_hora(hora, hora_inicio_obj, hora_fin_obj, trabajador, partida)
+            db.add(db_hora)
+            nuevas.append((indice, db_hora))
+            if not hora.es_regularizacion and hora_inicio_obj and hora_fin_obj:
+                indice_tramos.añadir(hora.chat_id, hora.fecha, hora_inicio_obj, hora_fin_obj, (None, hora_inicio_obj, hora_fin_obj))
+
+        if nuevas:
+            horas_nuevas = [db_hora for _, db_hora in nuevas]
+            try:
+                db.flush()
+                publicar_evento_horas(db, ACCION_CREADO, horas_nuevas)
+                # Cada registro se audita con el usuario que lo envió
+                por_usuario = {}
+                for indice, db_hora in nuevas:
+                    usuario = pendientes[indice][1]
+                    por_usuario.setdefault(usuario.id, (usuario, []))[1].append(db_hora)
+                for usuario, horas_usuario in por_usuario.values():
+                    registrar_auditoria(db, ACCION_CREADO, horas_usuario, usuario)
+                incrementar_versiones(db, claves_afectadas(horas_nuevas))
+                # Una sola consulta para recargar todos los registros (en lugar de un refresh por registro),
+                # antes del commit para guardar las respuestas idempotentes en la misma transacción
+                ids = [db_hora.id_movimiento for db_hora in horas_nuevas]
+                recargadas = {
+                    h.id_movimiento: HoraSchema.model_validate(h)
+                    for h in db.query(Hora).filter(Hora.id_movimiento.in_(ids)).populate_existing()
+                }
+                guardadas = []
+                for indice, db_hora in nuevas:
+                    idempotencia = pendientes[indice][2]
+                    if idempotencia is not None:
+                        respuesta = _respuesta_json(_hora_adapter, recargadas[db_hora.id_movimiento])
+                        guardar_en_transaccion(db, idempotencia, respuesta)
+                        guardadas.append((idempotencia, respuesta))
+                db.commit()
+                for idempotencia, respuesta in guardadas:
+                    idempotencia["respuesta"] = respuesta
+            except Exception as e:
+                # Si falla el grupo, cada registro se crea por separado para que el error sea solo del que lo provoca
+                db.rollback()
+                logger.warning(f"Group commit de {len(nuevas)} registros fallido, se crean por separado: {e}")
+                for indice, _ in nuevas:
+                    hora, usuario, idempotencia = pendientes[indice]
+                    try:
+                        with sesion_idempotente(db, idempotencia):
+                            resultados[indice] = HoraSchema.model_validate(_crear_hora(db, hora, usuario))
+                    except Exception as error:
+                        db.rollback()
+                        resultados[indice] = error
+                return resultados
+
+            for indice, db_hora in nuevas:
+                resultados[indice] = recargadas[db_hora.id_movimiento]
+        return resultados
+    finally:
+        db.close()
+
+# Agrupador de creaciones individuales (solo se usa con HORAS_GROUP_COMMIT activado)
+_agrupador_horas = AgrupadorEscrituras(
+    _crear_horas_agrupadas,
+    ventana_ms=HORAS_GROUP_COMMIT_VENTANA_MS,
+    max_lote=HORAS_GROUP_COMMIT_MAX_LOTE,
+    nombre="horas"
+)
+
+async def _crear_hora_respuesta(db: Session, hora: HoraCreate, current_user: Usuario) -> Response:
+    """Crea el registro (agrupado con otros si el group commit está activo) y devuelve el JSON ya serializado"""
+    if HORAS_GROUP_COMMIT:
+        return _respuesta_json(
+            _hora_adapter, await _agrupador_horas.enviar((hora, current_user, idempotencia_en_curso(db)))
+        )
+    return _respuesta_json(_hora_adapter, _crear_hora(db, hora, current_user))
+
+@router.post("", response_model=HoraSchema)
+async def create_hora(
+    hora: HoraCreate,
+    idempotency_key: Optional[str] = Header(None, alias=CABECERA_IDEMPOTENCIA),
+    db: Session = Depends(get_db),
+    current_user: Usuario = Depends(get_current_trabajador_user)
+):
+    """
+    Crear un nuevo registro de horas
+    - Si es un trabajador, solo puede crear registros para sí mismo
+    - Si es secretaria o admin, puede crear registros para cualquier trabajador
+    - Si es regularización, solo admin/secretaria pueden crearlo.
+    - Con la cabecera Idempotency-Key, los reintentos devuelven la respuesta guardada sin volver a crear nada
+    """
+    if idempotency_key:
+        return await ejecutar_idempotente(
+            db, current_user, idempotency_key, "POST /horas", hora.model_dump(mode="json"),
+            lambda: _crear_hora_respuesta(db, hora, current_user)
+        )
+    return await _crear_hora_respuesta(db, hora, current_user)
+
 @router.put("/{movimiento_id}", response_model=HoraSchema)
 async def update_hora(
     movimiento_id: int,
@@ -568,42 +1176,29 @@ async def update_hora(
     hora_inicio_actualizada_obj: Optional[time] = db_hora.hora_inicio
     hora_fin_actualizada_obj: Optional[time] = db_hora.hora_fin
     
-    # Verificar solapamiento si se modifica horario o fecha
-    if (hora.horario or hora.fecha) and hora.horario != db_hora.horario:
-        horario_a_verificar = hora.horario if hora.horario else db_hora.horario
-        fecha_a_verificar = hora.fecha if hora.fecha else db_hora.fecha
-        
-        # Convertir fecha a string para comparación consistente
-        fecha_str = fecha_a_verificar.isoformat() if isinstance(fecha_a_verificar, date) else fecha_a_verificar
-        
-        try:
-            primer_tramo_a_verificar = horario_a_verificar.split(',')[0]
-            horario_inicio, horario_fin = primer_tramo_a_verificar.split("-")
-        except ValueError:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Formato de horario '{primer_tramo_a_verificar}' inválido. Use HH:MM-HH:MM."
-            )
-        
-        print(f"DEBUG: Verificando solapamiento para actualización - trabajador: {db_hora.chat_id}, fecha: {fecha_str}")
+    # Verificar solapamiento si se modifica el tramo (hora_inicio, hora_fin u horario) o la fecha
+    if any(valor is not None for valor in (hora.hora_inicio, hora.hora_fin, hora.horario, hora.fecha)):
+        if hora.horario:
+            try:
+                primer_tramo_a_verificar = hora.horario.split(',')[0]
+                horario_inicio, horario_fin = primer_tramo_a_verificar.split("-")
+            except ValueError:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Formato de horario '{primer_tramo_a_verificar}' inválido. Use HH:MM-HH:MM."
+                )
         
         # VALIDACIÓN DE SOLAPAMIENTO HORARIO PARA UPDATE
         fecha_actualizada: date = hora.fecha if hora.fecha else db_hora.fecha # Usar nueva fecha o la original
+        print(f"DEBUG: Verificando solapamiento para actualización - trabajador: {db_hora.chat_id}, fecha: {fecha_actualizada.isoformat()}")
 
-        # Determinar si los tiempos se están actualizando y obtener los nuevos valores
-        nuevos_tiempos_provistos = False
-        if hora.hora_inicio is not None and hora.hora_fin is not None:
-            nuevos_tiempos_provistos = True
-            if isinstance(hora.hora_inicio, str):
-                try: hora.hora_inicio = datetime.strptime(hora.hora_inicio, '%H:%M:%S').time()
-                except ValueError: hora.hora_inicio = datetime.strptime(hora.hora_inicio, '%H:%M').time()
-            if isinstance(hora.hora_fin, str):
-                try: hora.hora_fin = datetime.strptime(hora.hora_fin, '%H:%M:%S').time()
-                except ValueError: hora.hora_fin = datetime.strptime(hora.hora_fin, '%H:%M').time()
-            hora_inicio_actualizada_obj = hora.hora_inicio
-            hora_fin_actualizada_obj = hora.hora_fin
+        # Obtener los nuevos tiempos: los explícitos tienen prioridad y el que no se envíe se mantiene
+        if hora.hora_inicio is not None or hora.hora_fin is not None:
+            if hora.hora_inicio is not None:
+                hora_inicio_actualizada_obj = hora.hora_inicio
+            if hora.hora_fin is not None:
+                hora_fin_actualizada_obj = hora.hora_fin
         elif hora.horario:
-            nuevos_tiempos_provistos = True
             try:
                 inicio_str, fin_str = hora.horario.split('-')
                 hora_inicio_actualizada_obj = datetime.strptime(inicio_str.strip(), '%H:%M').time()
@@ -611,37 +1206,22 @@ async def update_hora(
             except ValueError:
                 if not db_hora.es_regularizacion: # Si es reg, el horario puede ser solo total horas
                     raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Formato de horario '{hora.horario}' inválido para actualización. Usar HH:MM-HH:MM o proveer hora_inicio/hora_fin.")
-        else: # No se proporcionaron nuevos tiempos explícitos, usar los existentes del registro si los hay
-            if db_hora.hora_inicio and db_hora.hora_fin:
-                 hora_inicio_actualizada_obj = db_hora.hora_inicio
-                 hora_fin_actualizada_obj = db_hora.hora_fin
+        # Si no se envían tiempos, se validan los existentes del registro en la nueva fecha
 
         if hora_inicio_actualizada_obj and hora_fin_actualizada_obj and hora_inicio_actualizada_obj >= hora_fin_actualizada_obj:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"La hora de inicio ({hora_inicio_actualizada_obj}) no puede ser posterior o igual a la hora de fin ({hora_fin_actualizada_obj}).")
 
         # Solo realizar validación de solapamiento si no es regularización y tenemos tiempos válidos
         if not db_hora.es_regularizacion and hora_inicio_actualizada_obj and hora_fin_actualizada_obj:
-            current_start_dt = datetime.combine(fecha_actualizada, hora_inicio_actualizada_obj)
-            current_end_dt = datetime.combine(fecha_actualizada, hora_fin_actualizada_obj)
-
-            existing_horas_for_overlap = db.query(Hora).filter(
-                Hora.id_movimiento != movimiento_id,  # Excluir el propio registro
-                Hora.chat_id == db_hora.chat_id,
-                Hora.fecha == fecha_actualizada,
-                Hora.es_regularizacion == False,
-                Hora.hora_inicio != None,
-                Hora.hora_fin != None
-            ).all()
-
-            for record in existing_horas_for_overlap:
-                if record.hora_inicio and record.hora_fin: # Doble chequeo por si acaso
-                    record_start_dt = datetime.combine(record.fecha, record.hora_inicio)
-                    record_end_dt = datetime.combine(record.fecha, record.hora_fin)
-                    if (current_start_dt < record_end_dt and record_start_dt < current_end_dt):
-                        raise HTTPException(
-                            status_code=status.HTTP_409_CONFLICT,
-                            detail=f"Solapamiento detectado al actualizar: El tramo {hora_inicio_actualizada_obj.strftime('%H:%M')}-{hora_fin_actualizada_obj.strftime('%H:%M')} en {fecha_actualizada.strftime('%Y-%m-%d')} se solapa con el registro existente {record.hora_inicio.strftime('%H:%M')}-{record.hora_fin.strftime('%H:%M')} (ID: {record.id_movimiento})"
-                        )
+            # Excluir el propio registro
+            indice_tramos = IndiceTramos.cargar(db, [(db_hora.chat_id, fecha_actualizada)], excluir_id=movimiento_id)
+            solapado = indice_tramos.solapa(db_hora.chat_id, fecha_actualizada, hora_inicio_actualizada_obj, hora_fin_actualizada_obj)
+            if solapado is not None:
+                id_existente, inicio_existente, fin_existente = solapado[2]
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail=f"Solapamiento detectado al actualizar: El tramo {hora_inicio_actualizada_obj.strftime('%H:%M')}-{hora_fin_actualizada_obj.strftime('%H:%M')} en {fecha_actualizada.strftime('%Y-%m-%d')} se solapa con el registro existente {inicio_existente.strftime('%H:%M')}-{fin_existente.strftime('%H:%M')} (ID: {id_existente})"
+                )
     
     # --- INICIO SECCIÓN DE ACTUALIZACIÓN DE CAMPOS ---
 
@@ -693,9 +1273,16 @@ async def update_hora(
             update_dict["nombre_partida"] = None
     
     # 4. Aplicar todos los cambios consolidados en update_dict a db_hora
+    #    (guardando antes el mes/obra originales para invalidar también sus informes)
+    claves_versiones = claves_afectadas([db_hora])
+    antes = instantanea(db_hora)
     for key, value in update_dict.items():
         setattr(db_hora, key, value)
     
+    db.flush()
+    publicar_evento_horas(db, ACCION_ACTUALIZADO, [db_hora])
+    registrar_auditoria(db, ACCION_ACTUALIZADO, [db_hora], current_user, antes=[antes])
+    incrementar_versiones(db, claves_versiones + claves_afectadas([db_hora]))
     db.commit()
     db.refresh(db_hora)
     return db_hora
@@ -736,6 +1323,9 @@ async def delete_hora(
                 detail="Solo puedes eliminar registros de hoy o ayer"
             )
     
+    publicar_evento_horas(db, ACCION_ELIMINADO, [db_hora])
+    registrar_auditoria(db, ACCION_ELIMINADO, [db_hora], current_user)
+    incrementar_versiones(db, claves_afectadas([db_hora]))
     db.delete(db_hora)
     db.commit()
     return
@@ -0,0 +1,165 @@
+import asyncio
+from datetime import date
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.db.database import get_db, get_db_lectura
+from app.models.vistas import RefrescoVista
+from app.schemas.informes import TotalesObraMes, TotalesPartidaMes, UmbralesAnomalias, ResultadoAnomalias
+from app.schemas.trabajos import Trabajo as TrabajoSchema
+from app.core.permissions import get_current_secretaria_user
+from app.core.vistas_materializadas import VISTA_OBRAS_MES, VISTA_PARTIDAS_MES, encolar_refresco
+from app.core.anomalias import TIPOS_ANOMALIA, detectar_anomalias
+from app.core.trabajos import encolar_trabajo
+from app.api.endpoints.nominas import periodo
+from app.models.usuarios import Usuario
+
+router = APIRouter()
+
+def _refrescado(db: Session, vista: str):
+    refresco = db.query(RefrescoVista).filter(RefrescoVista.vista == vista).first()
+    return refresco.refrescado if refresco else None
+
+def _filtros_periodo(id_obra: Optional[int], año_desde: Optional[int], año_hasta: Optional[int]):
+    condiciones = []
+    parametros = {}
+    if id_obra is not None:
+        condiciones.append("id_obra = :id_obra")
+        parametros["id_obra"] = id_obra
+    if año_desde is not None:
+        condiciones.append("año >= :año_desde")
+        parametros["año_desde"] = año_desde
+    if año_hasta is not None:
+        condiciones.append("año <= :año_hasta")
+        parametros["año_hasta"] = año_hasta
+    where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+    return where, parametros
+
+def _sin_cero(fila: dict, *columnas):
+    # En las vistas, 0 significa "sin obra/partida"
+    for columna in columnas:
+        if fila[columna] == 0:
+            fila[columna] = None
+    return fila
+
+@router.get("/obras-mes", response_model=TotalesObraMes)
+async def read_totales_obras_mes(
+    id_obra: Optional[int] = Query(None, description="Filtrar por obra (0 = horas sin obra)"),
+    año_desde: Optional[int] = Query(None, description="Año inicial"),
+    año_hasta: Optional[int] = Query(None, description="Año final"),
+    db: Session = Depends(get_db_lectura),
+    current_user: Usuario = Depends(get_current_secretaria_user)
+):
+    """
+    Obtener los totales de horas por obra y mes desde la vista materializada (requiere rol secretaria o admin)
+    - Incluye la fecha del último refresco para saber lo recientes que son los datos
+    """
+    where, parametros = _filtros_periodo(id_obra, año_desde, año_hasta)
+    filas = db.execute(
+        text(f"SELECT * FROM {VISTA_OBRAS_MES} {where} ORDER BY año, mes, id_obra"),
+        parametros
+    ).mappings().all()
+    
+    return TotalesObraMes(
+        refrescado=_refrescado(db, VISTA_OBRAS_MES),
+        filas=[_sin_cero(dict(fila), "id_obra") for fila in filas]
+    )
+
+@router.get("/partidas-mes", response_model=TotalesPartidaMes)
+async def read_totales_partidas_mes(
+    id_obra: Optional[int] = Query(None, description="Filtrar por obra (0 = horas sin obra)"),
+    id_partida: Optional[int] = Query(None, description="Filtrar por partida (0 = horas sin partida)"),
+    año_desde: Optional[int] = Query(None, description="Año inicial"),
+    año_hasta: Optional[int] = Query(None, description="Año final"),
+    db: Session = Depends(get_db_lectura),
+    current_user: Usuario = Depends(get_current_secretaria_user)
+):
+    """
+    Obtener los totales de horas por partida y mes desde la vista materializada (requiere rol secretaria o admin)
+    - Incluye la fecha del último refresco para saber lo recientes que son los datos
+    """
+    where, parametros = _filtros_periodo(id_obra, año_desde, año_hasta)
+    if id_partida is not None:
+        where = f"{where} AND id_partida = :id_partida" if where else "WHERE id_partida = :id_partida"
+        parametros["id_partida"] = id_partida
+    filas = db.execute(
+        text(f"SELECT * FROM {VISTA_PARTIDAS_MES} {where} ORDER BY año, mes, id_obra, id_partida"),
+        parametros
+    ).mappings().all()
+    
+    return TotalesPartidaMes(
+        refrescado=_refrescado(db, VISTA_PARTIDAS_MES),
+        filas=[_sin_cero(dict(fila), "id_obra", "id_partida") for fila in filas]
+    )
+
+@router.post("/refrescar", response_model=TrabajoSchema, status_code=status.HTTP_202_ACCEPTED)
+async def refrescar_totales(
+    db: Session = Depends(get_db),
+    current_user: Usuario = Depends(get_current_secretaria_user)
+):
+    """
+    Encolar un refresco de las vistas materializadas de totales (requiere rol secretaria o admin)
+    - Si ya hay un refresco pendiente o en curso, se devuelve ese mismo trabajo
+    """
+    return encolar_refresco(db, current_user)
+
+def _parametros_anomalias(
+    año: Optional[int] = Query(None, description="Año (ej: 2024)"),
+    mes: Optional[int] = Query(None, ge=1, le=12, description="Mes (1-12)"),
+    desde: Optional[date] = Query(None, description="Inicio del periodo (si no se indica año y mes)"),
+    hasta: Optional[date] = Query(None, description="Fin del periodo (incluido)"),
+    chat_id: Optional[List[str]] = Query(None, description="Limitar la revisión a estos trabajadores"),
+    tipo: Optional[List[str]] = Query(None, description=f"Tipos de anomalía: {', '.join(TIPOS_ANOMALIA)}"),
+    max_horas_dia: Optional[float] = Query(None, gt=0, description="Horas por encima de las cuales un día es excesivo"),
+    min_horas_dia: Optional[float] = Query(None, ge=0, description="Horas por debajo de las cuales un día con registros es corto"),
+    tolerancia_minutos: Optional[float] = Query(None, ge=0, description="Diferencia admitida entre horas_totales y el horario"),
+    festivo: Optional[List[date]] = Query(None, description="Días festivos (se puede repetir)")
+) -> dict:
+    """Parámetros comunes de la consulta y del trabajo de anomalías"""
+    inicio, fin = periodo(año, mes, desde, hasta)
+    desconocidos = set(tipo or []) - set(TIPOS_ANOMALIA)
+    if desconocidos:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Tipos de anomalía desconocidos: {', '.join(sorted(desconocidos))}"
+        )
+    cambios = {
+        "max_horas_dia": max_horas_dia, "min_horas_dia": min_horas_dia,
+        "tolerancia_minutos": tolerancia_minutos, "festivos": festivo,
+    }
+    return {
+        "desde": inicio,
+        "hasta": fin,
+        "umbrales": UmbralesAnomalias(**{clave: valor for clave, valor in cambios.items() if valor is not None}),
+        "chat_ids": chat_id,
+        "tipos": tipo,
+    }
+
+@router.get("/anomalias", response_model=ResultadoAnomalias)
+async def read_anomalias(
+    limit: Optional[int] = Query(5000, ge=1, le=100000, description="Máximo de anomalías devueltas (el recuento es siempre completo)"),
+    parametros: dict = Depends(_parametros_anomalias),
+    db: Session = Depends(get_db_lectura),
+    current_user: Usuario = Depends(get_current_secretaria_user)
+):
+    """
+    Detectar anomalías en los registros de horas de un periodo (requiere rol secretaria o admin)
+    - Días laborables sin horas, días por encima (o por debajo) de los umbrales, registros sin horas,
+      horas_totales que no cuadran con el horario y registros en partidas acabadas
+    - Una sola consulta por periodo; los umbrales por defecto vienen del entorno (ANOMALIAS_*)
+    """
+    return await asyncio.to_thread(detectar_anomalias, db, limite=limit, **parametros)
+
+@router.post("/anomalias/trabajo", response_model=TrabajoSchema, status_code=status.HTTP_202_ACCEPTED)
+async def create_anomalias_trabajo(
+    parametros: dict = Depends(_parametros_anomalias),
+    db: Session = Depends(get_db),
+    current_user: Usuario = Depends(get_current_secretaria_user)
+):
+    """
+    Encolar la detección de anomalías como trabajo en segundo plano (periodos largos)
+    Devuelve 202 con el trabajo; el resultado se obtiene en /trabajos/{id}/resultado
+    """
+    return encolar_trabajo(db, "anomalias", {**parametros, "umbrales": parametros["umbrales"].model_dump()}, current_user)
@@ -0,0 +1,17 @@
+from typing import Dict
+from fastapi import APIRouter, Depends
+
+from app.core.metricas import obtener_metricas
+from app.core.permissions import get_current_admin_user
+from app.models.usuarios import Usuario
+
+router = APIRouter()
+
+@router.get("", response_model=Dict[str, float])
+async def read_metricas(
+    current_user: Usuario = Depends(get_current_admin_user)
+):
+    """
+    Obtener los contadores y medidores internos de este proceso (requiere rol admin)
+    """
+    return obtener_metricas()
@@ -0,0 +1,66 @@
+import asyncio
+import calendar
+from datetime import date, time
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+
+from app.db.database import get_db_lectura
+from app.schemas.nominas import ReglasNomina, ResultadoNomina
+from app.core.permissions import get_current_secretaria_user
+from app.core.nominas import calcular_nomina
+from app.models.usuarios import Usuario
+
+router = APIRouter()
+
+MAX_DIAS_PERIODO = 366
+
+def periodo(año: Optional[int], mes: Optional[int], desde: Optional[date], hasta: Optional[date]):
+    """Periodo a partir de año y mes, o de desde y hasta"""
+    if año is not None and mes is not None:
+        return date(año, mes, 1), date(año, mes, calendar.monthrange(año, mes)[1])
+    if desde is None or hasta is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Indica año y mes, o desde y hasta"
+        )
+    if hasta < desde or (hasta - desde).days >= MAX_DIAS_PERIODO:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"El periodo debe tener entre 1 y {MAX_DIAS_PERIODO} días"
+        )
+    return desde, hasta
+
+@router.get("", response_model=ResultadoNomina)
+async def read_nomina(
+    año: Optional[int] = Query(None, description="Año (ej: 2024)"),
+    mes: Optional[int] = Query(None, ge=1, le=12, description="Mes (1-12)"),
+    desde: Optional[date] = Query(None, description="Inicio del periodo (si no se indica año y mes)"),
+    hasta: Optional[date] = Query(None, description="Fin del periodo (incluido)"),
+    chat_id: Optional[List[str]] = Query(None, description="Limitar el cálculo a estos trabajadores"),
+    umbral_diario: Optional[float] = Query(None, ge=0, description="Horas ordinarias máximas por día"),
+    umbral_semanal: Optional[float] = Query(None, ge=0, description="Horas ordinarias máximas por semana"),
+    noche_inicio: Optional[time] = Query(None, description="Inicio de la franja nocturna (HH:MM)"),
+    noche_fin: Optional[time] = Query(None, description="Fin de la franja nocturna (HH:MM)"),
+    prima_extra: Optional[float] = Query(None, ge=0, description="Recargo de las horas extra"),
+    prima_nocturna: Optional[float] = Query(None, ge=0, description="Recargo de las horas nocturnas"),
+    prima_fin_de_semana: Optional[float] = Query(None, ge=0, description="Recargo de las horas en fin de semana o festivo"),
+    festivo: Optional[List[date]] = Query(None, description="Días festivos (se puede repetir)"),
+    db: Session = Depends(get_db_lectura),
+    current_user: Usuario = Depends(get_current_secretaria_user)
+):
+    """
+    Calcular la nómina de horas de un periodo (requiere rol secretaria o admin)
+    - Por trabajador: horas ordinarias, extra diarias y semanales, nocturnas, de fin de semana y ponderadas
+    - Las reglas por defecto vienen del entorno (NOMINA_*) y se pueden cambiar con los parámetros
+    """
+    inicio, fin = periodo(año, mes, desde, hasta)
+    cambios = {
+        "umbral_diario": umbral_diario, "umbral_semanal": umbral_semanal,
+        "noche_inicio": noche_inicio, "noche_fin": noche_fin,
+        "prima_extra": prima_extra, "prima_nocturna": prima_nocturna,
+        "prima_fin_de_semana": prima_fin_de_semana, "festivos": festivo,
+    }
+    reglas = ReglasNomina(**{clave: valor for clave, valor in cambios.items() if valor is not None})
+    # El cálculo es CPU (NumPy): fuera del bucle de eventos
+    return await asyncio.to_thread(calcular_nomina, db, inicio, fin, reglas, chat_id)
@@ -1,38 +1,63 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import List, Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Response, Request, Query
 from sqlalchemy.orm import Session
 
-from app.db.database import get_db
+from app.db.database import get_db, get_db_lectura
 from app.models.obras import Obra
 from app.schemas.obras import (
     Obra as ObraSchema,
     ObraCreate,
     ObraUpdate,
-    ObraWithPartidas
+    ObraWithPartidas,
+    ObraCarga
 )
+from app.schemas.carga import ResumenCarga
+from app.schemas.busqueda import PaginaBusqueda
 from app.core.permissions import get_current_secretaria_user, get_current_trabajador_user
 from app.models.usuarios import Usuario
+from app.core.propagacion import encolar_propagacion
+from app.core.carga_maestros import leer_elementos, cargar_obras
+from app.core.busqueda import buscar
+from app.core.listados import paginar, filtrar_prefijo
 
 router = APIRouter()
 
+# Columnas por las que se puede ordenar el listado de obras
+_ORDEN_OBRAS = {
+    "id_obra": Obra.id_obra,
+    "nombre_obra": Obra.nombre_obra,
+}
+
 @router.get("", response_model=List[ObraSchema])
 async def read_obras(
-    skip: int = 0,
-    limit: int = 100,
-    db: Session = Depends(get_db),
+    response: Response,
+    prefijo: Optional[str] = Query(None, max_length=100, description="El nombre de la obra empieza por"),
+    orden: str = Query("id_obra", description="id_obra o nombre_obra; con '-' delante, descendente"),
+    cursor: Optional[str] = Query(None, description="Valor de X-Siguiente-Cursor de la página anterior"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(1000, ge=1, le=1000),
+    total: Optional[Literal["exacto", "estimado"]] = Query(None, description="Devolver el total en X-Total-Count"),
+    db: Session = Depends(get_db_lectura),
     current_user: Usuario = Depends(get_current_trabajador_user)
 ):
     """
-    Obtener todas las obras
+    Obtener las obras, filtradas y ordenadas en el servidor
+    - Paginación por clave con cursor (cabecera X-Siguiente-Cursor) o con skip/limit
+    - total=exacto|estimado añade la cabecera X-Total-Count
     """
-    obras = db.query(Obra).offset(skip).limit(limit).all()
-    return obras
+    consulta = filtrar_prefijo(db.query(Obra), Obra.nombre_obra, prefijo)
+    return paginar(consulta, response, _ORDEN_OBRAS, Obra.id_obra, orden, cursor, skip, limit, total)
 
 @router.get("/activas", response_model=List[ObraSchema])
 async def read_obras_activas(
-    skip: int = 0,
-    limit: int = 100,
-    db: Session = Depends(get_db),
+    response: Response,
+    prefijo: Optional[str] = Query(None, max_length=100, description="El nombre de la obra empieza por"),
+    orden: str = Query("id_obra", description="id_obra o nombre_obra; con '-' delante, descendente"),
+    cursor: Optional[str] = Query(None, description="Valor de X-Siguiente-Cursor de la página anterior"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(1000, ge=1, le=1000),
+    total: Optional[Literal["exacto", "estimado"]] = Query(None, description="Devolver el total en X-Total-Count"),
+    db: Session = Depends(get_db_lectura),
     current_user: Usuario = Depends(get_current_trabajador_user)
 ):
     """
@@ -42,16 +67,33 @@ async def read_obras_activas(
     from app.models.partidas import Partida
     from sqlalchemy import and_, exists
     
-    obras = db.query(Obra).filter(
+    consulta = db.query(Obra).filter(
         exists().where(
             and_(
                 Partida.id_obra == Obra.id_obra,
                 Partida.acabada == False
             )
         )
-    ).offset(skip).limit(limit).all()
-    
-    return obras
+    )
+    consulta = filtrar_prefijo(consulta, Obra.nombre_obra, prefijo)
+    return paginar(consulta, response, _ORDEN_OBRAS, Obra.id_obra, orden, cursor, skip, limit, total)
+
+@router.get("/buscar", response_model=PaginaBusqueda[ObraSchema])
+async def buscar_obras(
+    q: str = Query(..., min_length=2, max_length=100, description="Texto a buscar en el nombre o la dirección"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db_lectura),
+    current_user: Usuario = Depends(get_current_trabajador_user)
+):
+    """
+    Buscar obras por nombre o dirección (índices de trigramas, admite erratas)
+    - Resultados ordenados por relevancia y paginados con skip/limit
+    """
+    total, obras = buscar(
+        db.query(Obra), [Obra.nombre_obra, Obra.direccion_obra], [Obra.nombre_obra, Obra.id_obra], q, skip, limit
+    )
+    return PaginaBusqueda[ObraSchema](total=total, skip=skip, limit=limit, resultados=obras)
 
 @router.get("/{obra_id}", response_model=ObraWithPartidas)
 async def read_obra(
@@ -85,10 +127,26 @@ async def create_obra(
     db.refresh(db_obra)
     return db_obra
 
+@router.post("/lote", response_model=ResumenCarga)
+async def create_obras_lote(
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: Usuario = Depends(get_current_secretaria_user)
+):
+    """
+    Alta o actualización masiva de obras (requiere rol secretaria o admin)
+    - Cuerpo: array JSON de {id_obra?, nombre_obra, direccion_obra?} o CSV con cabecera (Content-Type: text/csv)
+    - Con id_obra se actualiza esa obra; sin él se busca por nombre y, si no existe, se crea
+    - Todo en una sentencia y una transacción; devuelve el resultado de cada elemento
+    """
+    elementos, errores = await leer_elementos(request, ObraCarga)
+    return cargar_obras(db, elementos, errores, current_user)
+
 @router.put("/{obra_id}", response_model=ObraSchema)
 async def update_obra(
     obra_id: int,
     obra: ObraUpdate,
+    response: Response,
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(get_current_secretaria_user)
 ):
@@ -103,12 +161,22 @@ async def update_obra(
         )
     
     update_data = obra.model_dump(exclude_unset=True)
+    nombre_anterior = db_obra.nombre_obra
     
     for key, value in update_data.items():
         setattr(db_obra, key, value)
     
+    # Propagar el nuevo nombre a partidas.nombre_obra en segundo plano y por lotes. El trabajo se
+    # encola en la misma transacción que el cambio de nombre: o se confirman los dos o ninguno
+    tarea_id = None
+    if update_data.get("nombre_obra") and db_obra.nombre_obra != nombre_anterior:
+        tarea_id = encolar_propagacion(db, "obra", obra_id, db_obra.nombre_obra, current_user, confirmar=False)
+    
     db.commit()
     db.refresh(db_obra)
+    if tarea_id is not None:
+        response.headers["X-Propagacion-Id"] = str(tarea_id)
+    
     return db_obra
 
 @router.delete("/{obra_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -1,66 +1,165 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import List, Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Response, Request, Query
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 
-from app.db.database import get_db
+from app.db.database import get_db, get_db_lectura
 from app.models.partidas import Partida
 from app.models.horas import Hora
 from app.schemas.partidas import (
     Partida as PartidaSchema,
     PartidaCreate,
     PartidaUpdate,
-    PartidaWithHoras
+    PartidaWithHoras,
+    PartidaConTotales,
+    PartidaCarga
 )
+from app.schemas.carga import ResumenCarga
+from app.schemas.busqueda import PaginaBusqueda
 from app.core.permissions import get_current_secretaria_user, get_current_trabajador_user
 from app.models.usuarios import Usuario
+from app.core.propagacion import encolar_propagacion
+from app.core.carga_maestros import leer_elementos, cargar_partidas
+from app.core.busqueda import buscar
+from app.core.listados import paginar, filtrar_prefijo
 
 router = APIRouter()
 
-@router.get("/", response_model=List[PartidaSchema])
+# Columnas por las que se puede ordenar el listado de partidas
+_ORDEN_PARTIDAS = {
+    "id_partida": Partida.id_partida,
+    "nombre_partida": Partida.nombre_partida,
+    "nombre_obra": Partida.nombre_obra,
+}
+
+def _totales_horas(db: Session, partidas: List[Partida]) -> List[PartidaConTotales]:
+    """
+    Añade a cada partida sus horas totales, horas extra y fecha del último registro,
+    con una sola consulta agrupada para toda la página (índice cubriente ix_horas_id_partida)
+    """
+    ids = [p.id_partida for p in partidas]
+    totales = {}
+    if ids:
+        totales = {
+            fila.id_partida: fila
+            for fila in db.query(
+                Hora.id_partida,
+                func.coalesce(func.sum(Hora.horas_totales), 0).label("horas_totales"),
+                func.coalesce(func.sum(Hora.horas_totales).filter(Hora.es_extra == True), 0).label("horas_extra"),
+                func.max(Hora.fecha).label("ultima_actividad")
+            ).filter(Hora.id_partida.in_(ids)).group_by(Hora.id_partida)
+        }
+    resultado = []
+    for partida in partidas:
+        fila = totales.get(partida.id_partida)
+        resultado.append(PartidaConTotales(
+            **PartidaSchema.model_validate(partida).model_dump(),
+            horas_totales=float(fila.horas_totales) if fila else 0.0,
+            horas_extra=float(fila.horas_extra) if fila else 0.0,
+            ultima_actividad=fila.ultima_actividad if fila else None
+        ))
+    return resultado
+
+def _listar_partidas(
+    db: Session, consulta, response: Response, acabada: Optional[bool], prefijo: Optional[str],
+    orden: str, cursor: Optional[str], skip: int, limit: int, total: Optional[str], con_horas: bool
+):
+    if acabada is not None:
+        consulta = consulta.filter(Partida.acabada == acabada)
+    consulta = filtrar_prefijo(consulta, Partida.nombre_partida, prefijo)
+    partidas = paginar(consulta, response, _ORDEN_PARTIDAS, Partida.id_partida, orden, cursor, skip, limit, total)
+    return _totales_horas(db, partidas) if con_horas else partidas
+
+@router.get("/", response_model=List[PartidaConTotales], response_model_exclude_unset=True)
 async def read_partidas(
-    skip: int = 0,
-    limit: int = 1000,
-    db: Session = Depends(get_db),
+    response: Response,
+    id_obra: Optional[int] = Query(None, description="Solo las partidas de esta obra"),
+    acabada: Optional[bool] = Query(None, description="Filtrar por partidas acabadas o activas"),
+    prefijo: Optional[str] = Query(None, max_length=100, description="El nombre de la partida empieza por"),
+    orden: str = Query("id_partida", description="id_partida, nombre_partida o nombre_obra; con '-' delante, descendente"),
+    cursor: Optional[str] = Query(None, description="Valor de X-Siguiente-Cursor de la página anterior"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(1000, ge=1, le=1000),
+    total: Optional[Literal["exacto", "estimado"]] = Query(None, description="Devolver el total en X-Total-Count"),
+    con_horas: bool = Query(False, description="Incluir horas_totales, horas_extra y ultima_actividad de cada partida"),
+    db: Session = Depends(get_db_lectura),
     current_user: Usuario = Depends(get_current_trabajador_user)
 ):
     """
-    Obtener todas las partidas
+    Obtener las partidas, filtradas y ordenadas en el servidor
+    - Paginación por clave con cursor (cabecera X-Siguiente-Cursor) o con skip/limit
+    - total=exacto|estimado añade la cabecera X-Total-Count
+    - con_horas=true añade los totales de horas de cada partida (una consulta agrupada por página)
     """
-    partidas = db.query(Partida).offset(skip).limit(limit).all()
-    return partidas
+    consulta = db.query(Partida)
+    if id_obra is not None:
+        consulta = consulta.filter(Partida.id_obra == id_obra)
+    return _listar_partidas(db, consulta, response, acabada, prefijo, orden, cursor, skip, limit, total, con_horas)
 
-@router.get("/obra/{obra_id}", response_model=List[PartidaSchema])
+@router.get("/obra/{obra_id}", response_model=List[PartidaConTotales], response_model_exclude_unset=True)
 async def read_partidas_by_obra(
     obra_id: int,
-    skip: int = 0,
-    limit: int = 1000,
-    db: Session = Depends(get_db),
+    response: Response,
+    acabada: Optional[bool] = Query(None, description="Filtrar por partidas acabadas o activas"),
+    prefijo: Optional[str] = Query(None, max_length=100, description="El nombre de la partida empieza por"),
+    orden: str = Query("id_partida", description="id_partida, nombre_partida o nombre_obra; con '-' delante, descendente"),
+    cursor: Optional[str] = Query(None, description="Valor de X-Siguiente-Cursor de la página anterior"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(1000, ge=1, le=1000),
+    total: Optional[Literal["exacto", "estimado"]] = Query(None, description="Devolver el total en X-Total-Count"),
+    con_horas: bool = Query(False, description="Incluir horas_totales, horas_extra y ultima_actividad de cada partida"),
+    db: Session = Depends(get_db_lectura),
     current_user: Usuario = Depends(get_current_trabajador_user)
 ):
     """
-    Obtener todas las partidas de una obra
+    Obtener todas las partidas de una obra (mismos filtros, orden y paginación que /partidas)
     """
-    partidas = db.query(Partida).filter(Partida.id_obra == obra_id).offset(skip).limit(limit).all()
-    return partidas
+    consulta = db.query(Partida).filter(Partida.id_obra == obra_id)
+    return _listar_partidas(db, consulta, response, acabada, prefijo, orden, cursor, skip, limit, total, con_horas)
 
-@router.get("/obra/{obra_id}/activas", response_model=List[PartidaSchema])
+@router.get("/obra/{obra_id}/activas", response_model=List[PartidaConTotales], response_model_exclude_unset=True)
 async def read_partidas_activas_by_obra(
     obra_id: int,
-    skip: int = 0,
-    limit: int = 1000,
-    db: Session = Depends(get_db),
+    response: Response,
+    prefijo: Optional[str] = Query(None, max_length=100, description="El nombre de la partida empieza por"),
+    orden: str = Query("id_partida", description="id_partida, nombre_partida o nombre_obra; con '-' delante, descendente"),
+    cursor: Optional[str] = Query(None, description="Valor de X-Siguiente-Cursor de la página anterior"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(1000, ge=1, le=1000),
+    total: Optional[Literal["exacto", "estimado"]] = Query(None, description="Devolver el total en X-Total-Count"),
+    con_horas: bool = Query(False, description="Incluir horas_totales, horas_extra y ultima_actividad de cada partida"),
+    db: Session = Depends(get_db_lectura),
     current_user: Usuario = Depends(get_current_trabajador_user)
 ):
     """
     Obtener partidas activas (no acabadas) de una obra
     """
-    partidas = db.query(Partida).filter(
-        Partida.id_obra == obra_id,
-        Partida.acabada == False
-    ).offset(skip).limit(limit).all()
-    
-    return partidas
+    consulta = db.query(Partida).filter(Partida.id_obra == obra_id)
+    return _listar_partidas(db, consulta, response, False, prefijo, orden, cursor, skip, limit, total, con_horas)
+
+@router.get("/buscar", response_model=PaginaBusqueda[PartidaSchema])
+async def buscar_partidas(
+    q: str = Query(..., min_length=2, max_length=100, description="Texto a buscar en el nombre de la partida o de la obra"),
+    id_obra: Optional[int] = Query(None, description="Limitar la búsqueda a una obra"),
+    acabada: Optional[bool] = Query(None, description="Filtrar por partidas acabadas o activas"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db_lectura),
+    current_user: Usuario = Depends(get_current_trabajador_user)
+):
+    """
+    Buscar partidas por su nombre o el de su obra (índices de trigramas, admite erratas)
+    - Resultados ordenados por relevancia y paginados con skip/limit
+    """
+    consulta = db.query(Partida)
+    if id_obra is not None:
+        consulta = consulta.filter(Partida.id_obra == id_obra)
+    if acabada is not None:
+        consulta = consulta.filter(Partida.acabada == acabada)
+    total, partidas = buscar(
+        consulta, [Partida.nombre_partida, Partida.nombre_obra], [Partida.nombre_partida, Partida.id_partida], q, skip, limit
+    )
+    return PaginaBusqueda[PartidaSchema](total=total, skip=skip, limit=limit, resultados=partidas)
 
 @router.get("/{partida_id}", response_model=PartidaWithHoras)
 async def read_partida(
@@ -126,10 +225,26 @@ async def create_partida(
     db.refresh(db_partida)
     return db_partida
 
+@router.post("/lote", response_model=ResumenCarga)
+async def create_partidas_lote(
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: Usuario = Depends(get_current_secretaria_user)
+):
+    """
+    Alta o actualización masiva de partidas (requiere rol secretaria o admin)
+    - Cuerpo: array JSON de {id_partida?, id_obra, nombre_partida, acabada?} o CSV con cabecera (Content-Type: text/csv)
+    - Con id_partida se actualiza esa partida; sin él se busca por obra y nombre y, si no existe, se crea
+    - nombre_obra se toma de la obra con un join en la misma sentencia; todo en una transacción
+    """
+    elementos, errores = await leer_elementos(request, PartidaCarga)
+    return cargar_partidas(db, elementos, errores, current_user)
+
 @router.put("/{partida_id}", response_model=PartidaSchema)
 async def update_partida(
     partida_id: int,
     partida: PartidaUpdate,
+    response: Response,
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(get_current_secretaria_user)
 ):
@@ -144,14 +259,22 @@ async def update_partida(
         )
     
     update_data = partida.model_dump(exclude_unset=True)
-    
-    # Si se intenta cambiar el nombre_partida, verificar que no exista un trigger que lo bloquee
+    nombre_anterior = db_partida.nombre_partida
     
     for key, value in update_data.items():
         setattr(db_partida, key, value)
     
+    # Propagar el nuevo nombre a horas.nombre_partida en segundo plano y por lotes. El trabajo se
+    # encola en la misma transacción que el cambio de nombre: o se confirman los dos o ninguno
+    tarea_id = None
+    if update_data.get("nombre_partida") and db_partida.nombre_partida != nombre_anterior:
+        tarea_id = encolar_propagacion(db, "partida", partida_id, db_partida.nombre_partida, current_user, confirmar=False)
+    
     db.commit()
     db.refresh(db_partida)
+    if tarea_id is not None:
+        response.headers["X-Propagacion-Id"] = str(tarea_id)
+    
     return db_partida
 
 @router.delete("/{partida_id}", status_code=status.HTTP_204_NO_CONTENT)
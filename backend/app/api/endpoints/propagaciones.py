@@ -0,0 +1,39 @@
+from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+
+from app.db.database import get_db
+from app.core.propagacion import obtener_tarea_propagacion, listar_tareas_propagacion
+from app.schemas.propagaciones import PropagacionEstado
+from app.core.permissions import get_current_secretaria_user
+from app.models.usuarios import Usuario
+
+router = APIRouter()
+
+@router.get("/", response_model=List[PropagacionEstado])
+async def read_propagaciones(
+    limite: int = Query(100, ge=1, le=1000, description="Número máximo de propagaciones"),
+    db: Session = Depends(get_db),
+    current_user: Usuario = Depends(get_current_secretaria_user)
+):
+    """
+    Obtener el estado de las últimas propagaciones de nombres, las más recientes primero (requiere rol secretaria o admin)
+    """
+    return listar_tareas_propagacion(db, limite)
+
+@router.get("/{tarea_id}", response_model=PropagacionEstado)
+async def read_propagacion(
+    tarea_id: int,
+    db: Session = Depends(get_db),
+    current_user: Usuario = Depends(get_current_secretaria_user)
+):
+    """
+    Obtener el progreso de una propagación de nombre (requiere rol secretaria o admin)
+    """
+    tarea = obtener_tarea_propagacion(db, tarea_id)
+    if not tarea:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Propagación no encontrada"
+        )
+    return tarea
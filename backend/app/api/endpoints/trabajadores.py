@@ -1,16 +1,22 @@
 from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Response, Request, Query
 from sqlalchemy.orm import Session
 
-from app.db.database import get_db
+from app.db.database import get_db, get_db_lectura
 from app.models.trabajadores import Trabajador
 from app.schemas.trabajadores import (
     Trabajador as TrabajadorSchema,
     TrabajadorCreate,
     TrabajadorUpdate
 )
+from app.schemas.carga import ResumenCarga
+from app.schemas.busqueda import PaginaBusqueda
 from app.core.permissions import get_current_secretaria_user, get_current_trabajador_user
 from app.models.usuarios import Usuario
+from app.core.propagacion import encolar_propagacion
+from app.core.cache_informes import incrementar_versiones, CLAVE_TRABAJADORES
+from app.core.carga_maestros import leer_elementos, cargar_trabajadores
+from app.core.busqueda import buscar
 
 router = APIRouter()
 
@@ -18,7 +24,7 @@ router = APIRouter()
 async def read_trabajadores(
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_db_lectura),
     current_user: Usuario = Depends(get_current_secretaria_user)
 ):
     """
@@ -27,6 +33,23 @@ async def read_trabajadores(
     trabajadores = db.query(Trabajador).offset(skip).limit(limit).all()
     return trabajadores
 
+@router.get("/buscar", response_model=PaginaBusqueda[TrabajadorSchema])
+async def buscar_trabajadores(
+    q: str = Query(..., min_length=2, max_length=100, description="Texto a buscar en el nombre"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db_lectura),
+    current_user: Usuario = Depends(get_current_secretaria_user)
+):
+    """
+    Buscar trabajadores por nombre (requiere rol secretaria o admin)
+    - Índices de trigramas, admite erratas; resultados por relevancia y paginados con skip/limit
+    """
+    total, trabajadores = buscar(
+        db.query(Trabajador), [Trabajador.nombre], [Trabajador.nombre, Trabajador.chat_id], q, skip, limit
+    )
+    return PaginaBusqueda[TrabajadorSchema](total=total, skip=skip, limit=limit, resultados=trabajadores)
+
 @router.get("/{chat_id}", response_model=TrabajadorSchema)
 async def read_trabajador(
     chat_id: str,
@@ -73,14 +96,31 @@ async def create_trabajador(
     # Crear el trabajador
     db_trabajador = Trabajador(**trabajador.model_dump())
     db.add(db_trabajador)
+    incrementar_versiones(db, [CLAVE_TRABAJADORES])
     db.commit()
     db.refresh(db_trabajador)
     return db_trabajador
 
+@router.post("/lote", response_model=ResumenCarga)
+async def create_trabajadores_lote(
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: Usuario = Depends(get_current_secretaria_user)
+):
+    """
+    Alta o actualización masiva de trabajadores (requiere rol secretaria o admin)
+    - Cuerpo: array JSON de {chat_id, nombre} o CSV con cabecera (Content-Type: text/csv)
+    - Los existentes (mismo chat_id) se actualizan; todo en una sentencia y una transacción
+    - Devuelve el resultado de cada elemento (creado, actualizado, sin_cambios o error)
+    """
+    elementos, errores = await leer_elementos(request, TrabajadorCreate)
+    return cargar_trabajadores(db, elementos, errores, current_user)
+
 @router.put("/{chat_id}", response_model=TrabajadorSchema)
 async def update_trabajador(
     chat_id: str,
     trabajador: TrabajadorUpdate,
+    response: Response,
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(get_current_secretaria_user)
 ):
@@ -97,12 +137,22 @@ async def update_trabajador(
     
     # Actualizar solo los campos proporcionados
     update_data = trabajador.model_dump(exclude_unset=True)
+    nombre_anterior = db_trabajador.nombre
     
     for key, value in update_data.items():
         setattr(db_trabajador, key, value)
     
+    # Propagar el nuevo nombre a horas.nombre_trabajador en segundo plano y por lotes. El trabajo se
+    # encola en la misma transacción que el cambio de nombre: o se confirman los dos o ninguno
+    tarea_id = None
+    if update_data.get("nombre") and db_trabajador.nombre != nombre_anterior:
+        tarea_id = encolar_propagacion(db, "trabajador", chat_id, db_trabajador.nombre, current_user, confirmar=False)
+    
     db.commit()
     db.refresh(db_trabajador)
+    if tarea_id is not None:
+        response.headers["X-Propagacion-Id"] = str(tarea_id)
+    
     return db_trabajador
 
 @router.delete("/{chat_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -124,5 +174,6 @@ async def delete_trabajador(
     
     # Eliminar el trabajador
     db.delete(db_trabajador)
+    incrementar_versiones(db, [CLAVE_TRABAJADORES])
     db.commit()
     return 
\ No newline at end of file
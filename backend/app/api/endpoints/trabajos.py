@@ -0,0 +1,63 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+
+from app.db.database import get_db
+from app.models.trabajos import Trabajo
+from app.schemas.trabajos import Trabajo as TrabajoSchema, TrabajoResultado
+from app.core.permissions import get_current_trabajador_user
+from app.core.trabajos import ESTADO_COMPLETADO, ESTADO_ERROR
+from app.models.usuarios import Usuario
+
+router = APIRouter()
+
+def _get_trabajo(db: Session, trabajo_id: int, current_user: Usuario) -> Trabajo:
+    trabajo = db.query(Trabajo).filter(Trabajo.id == trabajo_id).first()
+    if not trabajo:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Trabajo no encontrado"
+        )
+    
+    # Verificar permisos (trabajador solo puede ver sus propios trabajos)
+    if current_user.rol == "trabajador" and trabajo.id_usuario != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="No tienes permisos para ver este trabajo"
+        )
+    return trabajo
+
+@router.get("/{trabajo_id}", response_model=TrabajoSchema)
+async def read_trabajo(
+    trabajo_id: int,
+    db: Session = Depends(get_db),
+    current_user: Usuario = Depends(get_current_trabajador_user)
+):
+    """
+    Obtener el estado de un trabajo en segundo plano
+    - Si es un trabajador, solo puede consultar los trabajos que ha lanzado
+    """
+    return _get_trabajo(db, trabajo_id, current_user)
+
+@router.get("/{trabajo_id}/resultado", response_model=TrabajoResultado)
+async def read_trabajo_resultado(
+    trabajo_id: int,
+    db: Session = Depends(get_db),
+    current_user: Usuario = Depends(get_current_trabajador_user)
+):
+    """
+    Obtener el resultado de un trabajo completado
+    - 409 si el trabajo todavía no ha terminado, 422 si terminó con error
+    """
+    trabajo = _get_trabajo(db, trabajo_id, current_user)
+    
+    if trabajo.estado == ESTADO_ERROR:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"El trabajo terminó con error: {trabajo.error}"
+        )
+    if trabajo.estado != ESTADO_COMPLETADO:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"El trabajo todavía no ha terminado (estado: {trabajo.estado})"
+        )
+    return trabajo
@@ -0,0 +1,246 @@
+import asyncio
+import json
+import logging
+import math
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+from jose import JWTError, jwt
+from starlette.datastructures import Headers, QueryParams
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core.environment import (
+    API_V1_STR, SECRET_KEY, ALGORITHM,
+    ADMISION_LECTURAS_POR_MINUTO, ADMISION_LECTURAS_RAFAGA,
+    ADMISION_ESCRITURAS_POR_MINUTO, ADMISION_ESCRITURAS_RAFAGA,
+    ADMISION_INFORMES_POR_MINUTO, ADMISION_INFORMES_RAFAGA,
+    ADMISION_LOGIN_POR_MINUTO, ADMISION_LOGIN_RAFAGA,
+    ADMISION_FACTOR_SECRETARIA,
+    ADMISION_INFORMES_CONCURRENCIA, ADMISION_INFORMES_ESPERA_SEGUNDOS
+)
+from app.core.metricas import incrementar, registrar_medidor
+
+logger = logging.getLogger(__name__)
+
+LECTURAS = "lecturas"
+ESCRITURAS = "escrituras"
+INFORMES = "informes"
+LOGIN = "login"
+
+# (tokens por segundo, capacidad) de cada tipo de ruta
+LIMITES = {
+    LECTURAS: (ADMISION_LECTURAS_POR_MINUTO / 60, ADMISION_LECTURAS_RAFAGA),
+    ESCRITURAS: (ADMISION_ESCRITURAS_POR_MINUTO / 60, ADMISION_ESCRITURAS_RAFAGA),
+    INFORMES: (ADMISION_INFORMES_POR_MINUTO / 60, ADMISION_INFORMES_RAFAGA),
+    LOGIN: (ADMISION_LOGIN_POR_MINUTO / 60, ADMISION_LOGIN_RAFAGA),
+}
+
+FACTORES_ROL = {"admin": ADMISION_FACTOR_SECRETARIA, "secretaria": ADMISION_FACTOR_SECRETARIA}
+
+# Rutas (bajo API_V1_STR) que no pasan por el control: health checks y métricas
+_EXENTAS = ("/health", "/metricas")
+_RUTAS_LOGIN = ("/auth/login", "/auth/register")
+# Informes costosos: además del bucket, tienen un límite global de ejecuciones simultáneas
+_RUTAS_INFORMES = ("/horas/resumen-mensual", "/horas/calendario/equipo", "/horas/auditoria", "/informes/", "/nominas")
+# Escrituras masivas que cuentan como informes (mucho trabajo por petición)
+_RUTAS_ESCRITURAS_PESADAS = ("/horas/import",)
+
+MAX_BUCKETS = 50000
+# Tamaño máximo del cuerpo de login que se lee para sacar el nombre de usuario
+MAX_CUERPO_LOGIN = 4096
+
+def clasificar(metodo: str, ruta: str) -> Optional[str]:
+    """Tipo de ruta para el control de admisión (None si la ruta no se controla)"""
+    if not ruta.startswith(API_V1_STR):
+        return None
+    ruta = ruta[len(API_V1_STR):]
+    if ruta.startswith(_EXENTAS) or metodo in ("OPTIONS", "HEAD"):
+        return None
+    if ruta.startswith(_RUTAS_LOGIN):
+        return LOGIN
+    if ruta.startswith(_RUTAS_INFORMES) or ruta.startswith(_RUTAS_ESCRITURAS_PESADAS):
+        return INFORMES
+    if metodo in ("POST", "PUT", "PATCH", "DELETE"):
+        return ESCRITURAS
+    return LECTURAS
+
+def es_informe_costoso(metodo: str, ruta: str) -> bool:
+    """Las peticiones que limita el semáforo global (las que lanzan la consulta pesada, no las que encolan un trabajo)"""
+    ruta = ruta[len(API_V1_STR):]
+    return metodo == "GET" and ruta.startswith(_RUTAS_INFORMES)
+
+def identificar(scope: Scope) -> Tuple[str, Optional[str]]:
+    """
+    Clave del bucket y rol. Se lee el JWT sin ir a la base de datos (solo firma y caducidad):
+    la autenticación real la sigue haciendo cada endpoint. Sin token válido, se usa la IP.
+    """
+    cabeceras = Headers(scope=scope)
+    token = None
+    autorizacion = cabeceras.get("authorization", "")
+    if autorizacion[:7].lower() == "bearer ":
+        token = autorizacion[7:].strip()
+    else:
+        # El stream SSE manda el token por query (EventSource no admite cabeceras)
+        token = QueryParams(scope.get("query_string", b"")).get("token")
+    if token:
+        try:
+            datos = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            if datos.get("id") is not None:
+                return f"usuario:{datos['id']}", datos.get("rol")
+        except JWTError:
+            pass
+    cliente = scope.get("client")
+    return f"ip:{cliente[0] if cliente else 'desconocida'}", None
+
+def usuario_login(cabeceras: Headers, cuerpo: bytes) -> Optional[str]:
+    """Nombre de usuario de un login (formulario OAuth2 o JSON), o None si no se puede leer"""
+    try:
+        if cabeceras.get("content-type", "").startswith("application/json"):
+            datos = json.loads(cuerpo)
+            username = datos.get("username") if isinstance(datos, dict) else None
+        else:
+            username = parse_qs(cuerpo.decode("latin-1")).get("username", [None])[0]
+    except ValueError:
+        return None
+    if not isinstance(username, str) or not username.strip():
+        return None
+    return username.strip().lower()[:150]
+
+async def _leer_cuerpo(receive: Receive) -> Tuple[bytes, List[dict]]:
+    """Lee el cuerpo (hasta MAX_CUERPO_LOGIN) guardando los mensajes para repetirlos a la aplicación"""
+    mensajes, cuerpo = [], b""
+    while len(cuerpo) <= MAX_CUERPO_LOGIN:
+        mensaje = await receive()
+        mensajes.append(mensaje)
+        if mensaje["type"] != "http.request":
+            break
+        cuerpo += mensaje.get("body", b"")
+        if not mensaje.get("more_body", False):
+            break
+    return cuerpo, mensajes
+
+class TokenBuckets:
+    """Buckets de tokens por (clave, tipo de ruta); se recargan de forma continua según el tiempo transcurrido"""
+
+    def __init__(self, limites: Dict[str, Tuple[float, int]], max_buckets: int = MAX_BUCKETS):
+        self.limites = limites
+        self.max_buckets = max_buckets
+        self._buckets: Dict[Tuple[str, str], Tuple[float, float, float, float]] = {}  # (tokens, último uso, tasa, capacidad)
+        self._lock = threading.Lock()
+        registrar_medidor("admision_buckets", lambda: len(self._buckets))
+
+    def consumir(self, clave: str, clase: str, factor: float = 1.0) -> float:
+        """Consume un token. Devuelve 0 si se admite, o los segundos hasta que haya un token disponible"""
+        tasa, capacidad = self.limites[clase]
+        tasa, capacidad = tasa * factor, capacidad * factor
+        ahora = time.monotonic()
+        with self._lock:
+            tokens, ultimo, _, _ = self._buckets.get((clave, clase), (capacidad, ahora, tasa, capacidad))
+            tokens = min(capacidad, tokens + (ahora - ultimo) * tasa)
+            if tokens >= 1:
+                self._buckets[(clave, clase)] = (tokens - 1, ahora, tasa, capacidad)
+                if len(self._buckets) > self.max_buckets:
+                    self._purgar(ahora)
+                return 0.0
+            self._buckets[(clave, clase)] = (tokens, ahora, tasa, capacidad)
+        return (1 - tokens) / tasa if tasa > 0 else 60.0
+
+    def _purgar(self, ahora: float):
+        """Olvida los buckets que ya estarían llenos (equivalen a uno nuevo)"""
+        for clave, (tokens, ultimo, tasa, capacidad) in list(self._buckets.items()):
+            if tokens + (ahora - ultimo) * tasa >= capacidad:
+                del self._buckets[clave]
+        incrementar("admision_purgas")
+
+class ControlAdmision:
+    """
+    Middleware ASGI de control de admisión:
+    - Token bucket por usuario (o IP si no hay token) y tipo de ruta: lecturas, escrituras, informes y login
+      (el login, por IP y por IP y nombre de usuario)
+    - admin y secretaria tienen ADMISION_FACTOR_SECRETARIA veces la tasa y la ráfaga (registran por otros)
+    - Los informes costosos tienen además un máximo de ejecuciones simultáneas por proceso, para que
+      una tormenta de informes no agote el pool de conexiones y el registro de horas siga siendo rápido
+    Al superar un límite responde 429 con Retry-After. Los límites son por proceso (por worker de Gunicorn).
+    """
+
+    def __init__(self, app: ASGIApp, activo: bool = True):
+        self.app = app
+        self.activo = activo
+        self.buckets = TokenBuckets(LIMITES)
+        self.concurrencia_informes = max(ADMISION_INFORMES_CONCURRENCIA, 1)
+        self._semaforo: Optional[asyncio.Semaphore] = None
+        self._informes_en_curso = 0
+        registrar_medidor("admision_informes_en_curso", lambda: self._informes_en_curso)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if not self.activo or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        metodo, ruta = scope["method"], scope["path"]
+        clase = clasificar(metodo, ruta)
+        if clase is None:
+            await self.app(scope, receive, send)
+            return
+
+        clave, rol = identificar(scope)
+        if clase == LOGIN:
+            # El login se limita por IP aunque traiga un token y, además, por IP y nombre de usuario.
+            # No hay un límite solo por usuario: cualquiera podría agotarlo y dejar a otro sin poder entrar
+            cliente = scope.get("client")
+            cuerpo, mensajes = await _leer_cuerpo(receive)
+            receive = _repetir(mensajes, receive)
+            ip = cliente[0] if cliente else "desconocida"
+            espera = self.buckets.consumir(f"ip:{ip}", clase)
+            username = usuario_login(Headers(scope=scope), cuerpo)
+            if espera == 0 and username:
+                espera = self.buckets.consumir(f"login:{ip}:{username}", clase)
+        else:
+            espera = self.buckets.consumir(clave, clase, FACTORES_ROL.get(rol, 1.0))
+        if espera > 0:
+            incrementar(f"admision_rechazadas_{clase}")
+            await _rechazar(send, espera, "Demasiadas peticiones, vuelve a intentarlo más tarde")
+            return
+        incrementar(f"admision_admitidas_{clase}")
+
+        if not es_informe_costoso(metodo, ruta):
+            await self.app(scope, receive, send)
+            return
+
+        if self._semaforo is None:
+            self._semaforo = asyncio.Semaphore(self.concurrencia_informes)
+        try:
+            await asyncio.wait_for(self._semaforo.acquire(), ADMISION_INFORMES_ESPERA_SEGUNDOS)
+        except asyncio.TimeoutError:
+            incrementar("admision_rechazadas_concurrencia_informes")
+            await _rechazar(send, ADMISION_INFORMES_ESPERA_SEGUNDOS, "Hay demasiados informes en curso, vuelve a intentarlo en unos segundos")
+            return
+        self._informes_en_curso += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self._informes_en_curso -= 1
+            self._semaforo.release()
+
+def _repetir(mensajes: List[dict], receive: Receive) -> Receive:
+    """receive que entrega primero los mensajes ya leídos y después sigue con el original"""
+    async def recibir():
+        if mensajes:
+            return mensajes.pop(0)
+        return await receive()
+    return recibir
+
+async def _rechazar(send: Send, espera: float, detalle: str):
+    cuerpo = json.dumps({"detail": detalle}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": 429,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(cuerpo)).encode()),
+            (b"retry-after", str(max(1, math.ceil(espera))).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": cuerpo})
@@ -0,0 +1,76 @@
+import asyncio
+import logging
+from typing import Any, Callable, List, Optional, Sequence
+
+from app.core.metricas import incrementar, registrar_medidor
+
+logger = logging.getLogger(__name__)
+
+class AgrupadorEscrituras:
+    """
+    Group commit: junta las escrituras individuales que llegan con pocos milisegundos de diferencia
+    y las procesa juntas (una validación y una transacción por grupo, en un hilo).
+    - enviar() encola el elemento y espera su resultado; cada llamada recibe su propio resultado o excepción
+    - El grupo se cierra al pasar la ventana desde el primer elemento o al llegar a max_lote
+    - procesar recibe la lista en orden de llegada y devuelve una lista del mismo tamaño con el
+      resultado de cada elemento (o la excepción que debe recibir quien lo envió)
+    Los grupos se procesan de uno en uno por proceso, así el orden de llegada decide los conflictos.
+    """
+
+    def __init__(self, procesar: Callable[[List[Any]], Sequence[Any]], ventana_ms: float, max_lote: int, nombre: str):
+        self.procesar = procesar
+        self.ventana = ventana_ms / 1000
+        self.max_lote = max(max_lote, 1)
+        self.nombre = nombre
+        self._cola: Optional[asyncio.Queue] = None
+        self._tarea: Optional[asyncio.Task] = None
+        registrar_medidor(f"group_commit_{nombre}_en_cola", lambda: self._cola.qsize() if self._cola else 0)
+
+    async def enviar(self, elemento: Any) -> Any:
+        if self._tarea is None or self._tarea.done():
+            # Se crea al primer uso para quedar ligada al bucle de eventos del worker
+            self._cola = asyncio.Queue()
+            self._tarea = asyncio.create_task(self._recolectar())
+        futuro = asyncio.get_running_loop().create_future()
+        await self._cola.put((elemento, futuro))
+        return await futuro
+
+    async def _recolectar(self):
+        bucle = asyncio.get_running_loop()
+        while True:
+            grupo = [await self._cola.get()]
+            limite = bucle.time() + self.ventana
+            while len(grupo) < self.max_lote:
+                # Lo que ya está en cola entra sin esperar; después, solo hasta agotar la ventana
+                try:
+                    grupo.append(self._cola.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                restante = limite - bucle.time()
+                if restante <= 0:
+                    break
+                try:
+                    grupo.append(await asyncio.wait_for(self._cola.get(), restante))
+                except asyncio.TimeoutError:
+                    break
+
+            # Quien ya no espera (cliente desconectado) no entra en el grupo
+            grupo = [(elemento, futuro) for elemento, futuro in grupo if not futuro.done()]
+            if not grupo:
+                continue
+            incrementar(f"group_commit_{self.nombre}_grupos")
+            incrementar(f"group_commit_{self.nombre}_elementos", len(grupo))
+            try:
+                resultados = await asyncio.to_thread(self.procesar, [elemento for elemento, _ in grupo])
+            except Exception as e:
+                logger.error(f"Error procesando un grupo de {len(grupo)} escrituras ({self.nombre}): {e}")
+                resultados = [e] * len(grupo)
+
+            for (_, futuro), resultado in zip(grupo, resultados):
+                if futuro.done():
+                    continue
+                if isinstance(resultado, BaseException):
+                    futuro.set_exception(resultado)
+                else:
+                    futuro.set_result(resultado)
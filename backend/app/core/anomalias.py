@@ -0,0 +1,168 @@
+import asyncio
+import logging
+import time
+from collections import Counter
+from datetime import date, timedelta
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.environment import ANOMALIAS_REVISION_HORAS, ANOMALIAS_REVISION_DIAS
+from app.core.metricas import incrementar
+from app.core.trabajos import registrar_trabajo, encolar_trabajo, ESTADO_PENDIENTE, ESTADO_EN_CURSO
+from app.db.database import SessionLocal
+from app.models.trabajos import Trabajo
+from app.schemas.informes import Anomalia, ResultadoAnomalias, UmbralesAnomalias
+
+logger = logging.getLogger(__name__)
+
+TIPOS_ANOMALIA = ["dia_sin_horas", "dia_excesivo", "dia_corto", "horas_cero", "horas_incoherentes", "partida_acabada"]
+
+# Una sola consulta por periodo: los registros del periodo se leen una vez (CTE materializada) y
+# cada tipo de anomalía es una rama del UNION ALL sobre ese conjunto. Los días sin horas salen de
+# cruzar los días laborables (generate_series, de lunes a viernes sin festivos y sin pasar de hoy)
+# con la tabla trabajadores (o solo los chat_ids pedidos), así también aparecen los trabajadores
+# que no han registrado nada en todo el periodo.
+# Las regularizaciones cuentan como día con registro, pero no suman horas ni se revisan una a una.
+_SQL_ANOMALIAS = """
+    WITH h AS MATERIALIZED (
+        SELECT h.id_movimiento, h.chat_id, h.fecha, h.id_partida, h.hora_inicio, h.hora_fin,
+               h.horas_totales, COALESCE(h.es_regularizacion, FALSE) AS es_regularizacion,
+               COALESCE(p.acabada, FALSE) AS partida_acabada
+        FROM horas h
+        LEFT JOIN partidas p ON p.id_partida = h.id_partida
+        WHERE h.fecha BETWEEN :desde AND :hasta
+          AND (CAST(:chat_ids AS citext[]) IS NULL OR h.chat_id = ANY(CAST(:chat_ids AS citext[])))
+    ),
+    por_dia AS (
+        SELECT chat_id, fecha,
+               COALESCE(SUM(horas_totales) FILTER (WHERE NOT es_regularizacion), 0) AS horas,
+               COUNT(*) FILTER (WHERE NOT es_regularizacion) AS registros
+        FROM h
+        GROUP BY chat_id, fecha
+    ),
+    laborables AS (
+        SELECT d::date AS fecha
+        FROM generate_series(CAST(:desde AS date), LEAST(CAST(:hasta AS date), CURRENT_DATE), INTERVAL '1 day') AS d
+        WHERE EXTRACT(ISODOW FROM d) < 6
+          AND NOT (d::date = ANY(CAST(:festivos AS date[])))
+    ),
+    anomalias AS (
+        SELECT 'dia_sin_horas' AS tipo, t.chat_id, l.fecha, NULL::integer AS id_movimiento,
+               NULL::integer AS id_partida, NULL::numeric AS valor, NULL::numeric AS esperado
+        FROM trabajadores t
+        CROSS JOIN laborables l
+        WHERE (CAST(:chat_ids AS citext[]) IS NULL OR t.chat_id = ANY(CAST(:chat_ids AS citext[])))
+          AND NOT EXISTS (SELECT 1 FROM por_dia p WHERE p.chat_id = t.chat_id AND p.fecha = l.fecha)
+        UNION ALL
+        SELECT 'dia_excesivo', chat_id, fecha, NULL, NULL, horas, CAST(:max_horas_dia AS numeric)
+        FROM por_dia
+        WHERE horas > :max_horas_dia
+        UNION ALL
+        SELECT 'dia_corto', chat_id, fecha, NULL, NULL, horas, CAST(:min_horas_dia AS numeric)
+        FROM por_dia
+        WHERE registros > 0 AND horas < :min_horas_dia
+        UNION ALL
+        SELECT 'horas_cero', chat_id, fecha, id_movimiento, id_partida, horas_totales, NULL
+        FROM h
+        WHERE NOT es_regularizacion AND COALESCE(horas_totales, 0) <= 0
+        UNION ALL
+        SELECT 'horas_incoherentes', chat_id, fecha, id_movimiento, id_partida, horas_totales,
+               ROUND(EXTRACT(EPOCH FROM hora_fin - hora_inicio)::numeric / 3600, 2)
+        FROM h
+        WHERE NOT es_regularizacion
+          AND hora_inicio IS NOT NULL AND hora_fin IS NOT NULL AND horas_totales > 0
+          AND ABS(horas_totales * 60 - EXTRACT(EPOCH FROM hora_fin - hora_inicio)::numeric / 60) > :tolerancia_minutos
+        UNION ALL
+        SELECT 'partida_acabada', chat_id, fecha, id_movimiento, id_partida, horas_totales, NULL
+        FROM h
+        WHERE partida_acabada AND NOT es_regularizacion
+    )
+    SELECT a.tipo, a.chat_id::text AS chat_id, t.nombre::text AS nombre, a.fecha, a.id_movimiento,
+           a.id_partida, p.nombre_partida::text AS nombre_partida, a.valor, a.esperado
+    FROM anomalias a
+    LEFT JOIN trabajadores t ON t.chat_id = a.chat_id
+    LEFT JOIN partidas p ON p.id_partida = a.id_partida
+    WHERE a.tipo = ANY(CAST(:tipos AS text[]))
+    ORDER BY a.fecha, a.chat_id, a.tipo, a.id_movimiento
+"""
+
+def detectar_anomalias(
+    db: Session,
+    desde: date,
+    hasta: date,
+    umbrales: UmbralesAnomalias,
+    chat_ids: Optional[List[str]] = None,
+    tipos: Optional[List[str]] = None,
+    limite: Optional[int] = None
+) -> ResultadoAnomalias:
+    """
+    Busca en un periodo, con una sola consulta, los días laborables sin horas de cada trabajador,
+    los días por encima o por debajo de los umbrales, los registros sin horas, los registros cuyo
+    horas_totales no cuadra con hora_fin - hora_inicio y los registros en partidas acabadas
+    """
+    inicio = time.perf_counter()
+    filas = db.execute(text(_SQL_ANOMALIAS), {
+        "desde": desde,
+        "hasta": hasta,
+        "chat_ids": list(chat_ids) if chat_ids else None,
+        "festivos": list(umbrales.festivos),
+        "max_horas_dia": umbrales.max_horas_dia,
+        "min_horas_dia": umbrales.min_horas_dia,
+        "tolerancia_minutos": umbrales.tolerancia_minutos,
+        "tipos": list(tipos) if tipos else TIPOS_ANOMALIA,
+    }).mappings().all()
+    duracion = time.perf_counter() - inicio
+    logger.info(f"Anomalías {desde}..{hasta}: {len(filas)} encontradas en {duracion:.3f}s")
+
+    return ResultadoAnomalias(
+        desde=desde,
+        hasta=hasta,
+        umbrales=umbrales,
+        total=len(filas),
+        por_tipo=dict(Counter(fila["tipo"] for fila in filas)),
+        anomalias=[Anomalia(**fila) for fila in (filas[:limite] if limite is not None else filas)],
+        duracion_segundos=round(duracion, 4)
+    )
+
+@registrar_trabajo("anomalias", max_concurrencia=1)
+def _trabajo_anomalias(db: Session, parametros: dict, usuario):
+    resultado = detectar_anomalias(
+        db,
+        date.fromisoformat(parametros["desde"]),
+        date.fromisoformat(parametros["hasta"]),
+        UmbralesAnomalias(**parametros.get("umbrales", {})),
+        chat_ids=parametros.get("chat_ids"),
+        tipos=parametros.get("tipos")
+    )
+    for tipo, cantidad in resultado.por_tipo.items():
+        incrementar(f"anomalias_{tipo}", cantidad)
+    return resultado
+
+def encolar_revision(db: Session, usuario=None) -> Trabajo:
+    """Encola la revisión de los últimos ANOMALIAS_REVISION_DIAS días salvo que ya haya una pendiente o en curso"""
+    existente = db.query(Trabajo).filter(
+        Trabajo.tipo == "anomalias",
+        Trabajo.id_usuario.is_(None),
+        Trabajo.estado.in_([ESTADO_PENDIENTE, ESTADO_EN_CURSO])
+    ).first()
+    if existente:
+        return existente
+    hasta = date.today() - timedelta(days=1)
+    desde = hasta - timedelta(days=max(ANOMALIAS_REVISION_DIAS, 1) - 1)
+    return encolar_trabajo(db, "anomalias", {"desde": desde, "hasta": hasta}, usuario, max_intentos=2)
+
+async def programar_revision_anomalias():
+    """Encola una revisión de anomalías cada ANOMALIAS_REVISION_HORAS horas (la ejecuta la cola de trabajos)"""
+    if ANOMALIAS_REVISION_HORAS <= 0:
+        return
+    while True:
+        await asyncio.sleep(ANOMALIAS_REVISION_HORAS * 3600)
+        db = SessionLocal()
+        try:
+            await asyncio.to_thread(encolar_revision, db)
+        except Exception as e:
+            logger.error(f"No se pudo programar la revisión de anomalías: {e}")
+        finally:
+            db.close()
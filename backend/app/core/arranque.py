@@ -0,0 +1,168 @@
+import hashlib
+import logging
+import os
+import time
+from typing import List
+
+from sqlalchemy import CheckConstraint, ForeignKeyConstraint, Table, text
+
+from app.core.auth import get_password_hash
+from app.core.environment import INICIALIZAR_ESQUEMA
+from app.core.vistas_materializadas import asegurar_vistas, DDL_VISTAS
+from app.core.importacion_horas import asegurar_tabla_importacion, DDL_IMPORTACION
+from app.core.busqueda import asegurar_indices_busqueda, DDL_BUSQUEDA
+from app.core.listados import asegurar_indices_listados, DDL_LISTADOS
+from app.core.auditoria import asegurar_auditoria, DDL_AUDITORIA
+from app.db.database import engine, Base, SessionLocal
+from app.models.usuarios import Usuario
+from app.models.trabajadores import Trabajador
+
+logger = logging.getLogger(__name__)
+
+# Clave del advisory lock que serializa el arranque entre todos los workers/contenedores
+_CLAVE_BLOQUEO_ARRANQUE = 703400
+
+def _describir_tabla(tabla: Table) -> List[str]:
+    """Columnas (tipo, nulabilidad, valor por defecto), índices y restricciones de una tabla, en orden estable"""
+    partes = []
+    for columna in tabla.columns:
+        por_defecto = getattr(columna.server_default, "arg", None)
+        partes.append(f"{tabla.name}.{columna.name}:{columna.type!r}:{columna.nullable}:{por_defecto}")
+    for indice in sorted(tabla.indexes, key=lambda i: str(i.name)):
+        opciones = sorted((clave, str(valor)) for clave, valor in indice.dialect_kwargs.items())
+        expresiones = ",".join(str(expresion) for expresion in indice.expressions)
+        partes.append(f"{tabla.name} indice {indice.name}:{indice.unique}:{expresiones}:{opciones}")
+    for restriccion in sorted(tabla.constraints, key=lambda r: (type(r).__name__, str(r.name))):
+        detalle = ",".join(columna.name for columna in restriccion.columns)
+        if isinstance(restriccion, ForeignKeyConstraint):
+            detalle += "->" + ",".join(e.target_fullname for e in restriccion.elements) + f":{restriccion.ondelete}"
+        elif isinstance(restriccion, CheckConstraint):
+            detalle += f":{restriccion.sqltext}"
+        partes.append(f"{tabla.name} {type(restriccion).__name__} {restriccion.name}:{detalle}")
+    return partes
+
+def huella_esquema() -> str:
+    """
+    Huella de los modelos (columnas, índices y restricciones) y del DDL adicional: si no cambia, no
+    hace falta volver a reflejar el esquema. Que cambie solo hace que se vuelva a ejecutar create_all
+    y los asegurar_*: create_all crea tablas nuevas con sus índices, pero no modifica las tablas que
+    ya existen; los cambios sobre ellas tienen que ir en el DDL idempotente o en el script SQL.
+    """
+    partes = []
+    for tabla in sorted(Base.metadata.tables.values(), key=lambda t: t.name):
+        partes.extend(_describir_tabla(tabla))
+    partes.extend(DDL_VISTAS)
+    partes.extend(DDL_IMPORTACION)
+    partes.extend(DDL_BUSQUEDA)
+    partes.extend(DDL_LISTADOS)
+    partes.extend(DDL_AUDITORIA)
+    return hashlib.sha1("\n".join(partes).encode()).hexdigest()[:16]
+
+def _esquema_al_dia(huella: str) -> bool:
+    with engine.connect() as conexion:
+        if conexion.execute(text("SELECT to_regclass('versiones_datos')")).scalar() is None:
+            return False
+        return conexion.execute(
+            text("SELECT 1 FROM versiones_datos WHERE clave = :clave"),
+            {"clave": f"esquema:{huella}"}
+        ).first() is not None
+
+def _crear_esquema(huella: str):
+    Base.metadata.create_all(bind=engine)
+    asegurar_vistas(engine)
+    asegurar_tabla_importacion(engine)
+    asegurar_indices_busqueda(engine)
+    asegurar_indices_listados(engine)
+    asegurar_auditoria(engine)
+    with engine.begin() as conexion:
+        conexion.execute(
+            text("INSERT INTO versiones_datos (clave, version) VALUES (:clave, 1) ON CONFLICT (clave) DO NOTHING"),
+            {"clave": f"esquema:{huella}"}
+        )
+
+def crear_admin_por_defecto():
+    """Crea el superadmin (y su trabajador) si no existe ningún administrador"""
+    db = SessionLocal()
+    try:
+        admin_exists = db.query(Usuario).filter(Usuario.rol == "admin").first() is not None
+
+        if not admin_exists:
+            logger.info("No hay administrador, creando uno por defecto...")
+
+            # Datos del superadmin (lee de variables de entorno o usa valores por defecto)
+            admin_username = os.getenv("ADMIN_USERNAME", "admin")
+            admin_password = os.getenv("ADMIN_PASSWORD", "admin123")
+            admin_chat_id = os.getenv("ADMIN_CHAT_ID", "admin_id")
+            admin_nombre = os.getenv("ADMIN_NOMBRE", "Administrador")
+
+            # Comprobar si existe el trabajador
+            trabajador = db.query(Trabajador).filter(Trabajador.chat_id == admin_chat_id).first()
+            if not trabajador:
+                trabajador = Trabajador(
+                    chat_id=admin_chat_id,
+                    nombre=admin_nombre
+                )
+                db.add(trabajador)
+                db.commit()
+                logger.info(f"Trabajador '{admin_nombre}' creado con chat_id: {admin_chat_id}")
+
+            # Crear el superadmin
+            password_hash = get_password_hash(admin_password)
+            new_admin = Usuario(
+                username=admin_username,
+                password_hash=password_hash,
+                chat_id=admin_chat_id,
+                rol="admin",
+                activo=True
+            )
+            db.add(new_admin)
+            db.commit()
+            logger.info(f"Superadmin '{admin_username}' creado correctamente")
+        else:
+            logger.info("Ya existe un administrador, no se creará uno por defecto")
+
+    except Exception as e:
+        logger.error(f"Error al crear el superadmin: {e}")
+    finally:
+        db.close()
+
+def inicializar_base_de_datos():
+    """
+    Inicialización de la base de datos al arrancar, segura con varios workers:
+    - Se ejecuta bajo un advisory lock de Postgres, así que solo un proceso a la vez la hace
+      y el resto encuentra el trabajo ya hecho
+    - INICIALIZAR_ESQUEMA=auto solo ejecuta create_all si la huella de los modelos ha cambiado,
+      'siempre' lo ejecuta en cada arranque y 'nunca' lo omite (esquema gestionado con el script SQL)
+    - El administrador por defecto solo se comprueba cuando se crea o actualiza el esquema (primer
+      arranque de una base nueva), no en cada worker y arranque; con 'nunca', usar create_admin_from_env.py
+    - Registra en el log cuánto tarda cada fase
+    """
+    inicio = time.perf_counter()
+    with engine.connect() as conexion:
+        conexion.execute(text("SELECT pg_advisory_lock(:clave)"), {"clave": _CLAVE_BLOQUEO_ARRANQUE})
+        conexion.commit()
+        espera = time.perf_counter() - inicio
+        try:
+            fase = time.perf_counter()
+            tiempo_admin = 0.0
+            if INICIALIZAR_ESQUEMA == "nunca":
+                logger.info("Inicialización del esquema desactivada (INICIALIZAR_ESQUEMA=nunca)")
+            else:
+                huella = huella_esquema()
+                if INICIALIZAR_ESQUEMA == "siempre" or not _esquema_al_dia(huella):
+                    _crear_esquema(huella)
+                    logger.info(f"Esquema creado/actualizado (huella {huella})")
+                    fase_admin = time.perf_counter()
+                    crear_admin_por_defecto()
+                    tiempo_admin = time.perf_counter() - fase_admin
+                else:
+                    logger.info(f"Esquema al día (huella {huella}), se omiten create_all y el administrador por defecto")
+            tiempo_esquema = time.perf_counter() - fase - tiempo_admin
+        finally:
+            conexion.execute(text("SELECT pg_advisory_unlock(:clave)"), {"clave": _CLAVE_BLOQUEO_ARRANQUE})
+            conexion.commit()
+
+    logger.info(
+        f"Inicialización de la base de datos en {time.perf_counter() - inicio:.3f}s "
+        f"(espera del bloqueo {espera:.3f}s, esquema {tiempo_esquema:.3f}s, admin {tiempo_admin:.3f}s)"
+    )
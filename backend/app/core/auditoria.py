@@ -0,0 +1,99 @@
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy import insert, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.core.environment import HORAS_AUDITORIA
+from app.core.eventos_horas import ACCION_ACTUALIZADO, ACCION_ELIMINADO
+from app.db.database import engine
+from app.models.auditoria import HoraAudit
+from app.models.horas import Hora
+from app.models.usuarios import Usuario
+
+# Columnas de horas que se guardan en el historial (las generadas y el timestamp de alta no aportan)
+COLUMNAS_AUDITADAS = [
+    columna.key for columna in Hora.__table__.columns
+    if columna.key not in ("año", "mes", "timestamp")
+]
+# Lo mismo para las inserciones hechas en SQL (importación CSV): to_jsonb de la fila sin esas columnas
+SQL_INSTANTANEA = "to_jsonb({alias}) - 'año' - 'mes' - 'timestamp'"
+
+# La tabla es de solo inserción: cualquier UPDATE, DELETE o TRUNCATE falla
+DDL_AUDITORIA = [
+    """
+    CREATE OR REPLACE FUNCTION horas_audit_solo_insercion() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        RAISE EXCEPTION 'horas_audit es de solo inserción';
+    END
+    $$
+    """,
+    "DROP TRIGGER IF EXISTS tr_horas_audit_solo_insercion ON horas_audit",
+    """
+    CREATE TRIGGER tr_horas_audit_solo_insercion
+    BEFORE UPDATE OR DELETE OR TRUNCATE ON horas_audit
+    FOR EACH STATEMENT EXECUTE FUNCTION horas_audit_solo_insercion()
+    """,
+]
+
+def asegurar_auditoria(bind: Engine = engine):
+    """Crea el trigger que impide modificar o borrar el historial"""
+    with bind.begin() as conexion:
+        for sentencia in DDL_AUDITORIA:
+            conexion.execute(text(sentencia))
+
+def _valor_json(valor: Any) -> Any:
+    if isinstance(valor, Decimal):
+        return float(valor)
+    if isinstance(valor, (date, time, datetime)):
+        return valor.isoformat()
+    return valor
+
+def instantanea(hora: Hora) -> Dict[str, Any]:
+    """Valores auditados de un registro, serializables en JSON"""
+    return {columna: _valor_json(getattr(hora, columna)) for columna in COLUMNAS_AUDITADAS}
+
+def registrar_auditoria(
+    db: Session,
+    accion: str,
+    horas: Sequence[Hora],
+    usuario: Optional[Usuario],
+    antes: Optional[Sequence[Dict[str, Any]]] = None
+):
+    """
+    Añade al historial los cambios de una lista de registros con un solo INSERT.
+    Debe llamarse dentro de la transacción de la escritura (después del flush y antes del commit),
+    para que el historial y el cambio se confirmen o se deshagan juntos.
+    - creado: despues con el registro completo
+    - actualizado: antes y despues solo con los campos que cambian (antes[i] es la instantánea de horas[i]
+      tomada antes de modificarlo); si no cambia nada no se registra
+    - eliminado: antes con el registro completo
+    """
+    if not HORAS_AUDITORIA or not horas:
+        return
+    filas: List[dict] = []
+    for i, hora in enumerate(horas):
+        previo = antes[i] if antes is not None else None
+        actual = instantanea(hora) if accion != ACCION_ELIMINADO else None
+        if accion == ACCION_ACTUALIZADO:
+            cambiados = [campo for campo in COLUMNAS_AUDITADAS if previo.get(campo) != actual.get(campo)]
+            if not cambiados:
+                continue
+            previo = {campo: previo.get(campo) for campo in cambiados}
+            actual = {campo: actual.get(campo) for campo in cambiados}
+        elif accion == ACCION_ELIMINADO:
+            previo = previo or instantanea(hora)
+        filas.append({
+            "accion": accion,
+            "id_movimiento": hora.id_movimiento,
+            "chat_id": hora.chat_id,
+            "fecha": hora.fecha,
+            "id_usuario": usuario.id if usuario else None,
+            "actor": usuario.username if usuario else None,
+            "antes": previo,
+            "despues": actual,
+        })
+    if filas:
+        db.execute(insert(HoraAudit), filas)
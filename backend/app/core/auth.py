@@ -2,12 +2,12 @@ from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, status, Query
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 
 from app.core.environment import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
-from app.db.database import get_db
+from app.db.database import get_db, SessionLocal
 from app.models.usuarios import Usuario
 from app.schemas.usuarios import TokenData
 
@@ -16,6 +16,8 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 # Configuración para OAuth2
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
+# Variante sin error automático, para endpoints que aceptan el token también por query
+oauth2_scheme_opcional = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login", auto_error=False)
 
 def verify_password(plain_password, hashed_password):
     """Verifica si la contraseña corresponde al hash"""
@@ -75,4 +77,19 @@ def get_current_active_user(current_user: Usuario = Depends(get_current_user)):
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Usuario inactivo"
         )
-    return current_user 
\ No newline at end of file
+    return current_user
+
+async def get_current_user_stream(
+    token: Optional[str] = Query(None, description="Token JWT (EventSource no permite enviar cabeceras)"),
+    token_cabecera: Optional[str] = Depends(oauth2_scheme_opcional)
+):
+    """
+    Obtiene el usuario actual para conexiones de larga duración (SSE).
+    Usa una sesión propia que se cierra al validar, para no retener una conexión del pool
+    mientras dure el stream.
+    """
+    db = SessionLocal()
+    try:
+        return await get_current_user(token or token_cabecera or "", db)
+    finally:
+        db.close()
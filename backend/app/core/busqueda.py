@@ -0,0 +1,65 @@
+import logging
+from typing import List, Sequence, Tuple
+
+from sqlalchemy import Text, case, cast, func, literal, or_, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Query
+
+from app.db.database import engine
+
+logger = logging.getLogger(__name__)
+
+# Índices GIN de trigramas sobre las columnas de nombre. Las columnas son CITEXT y los operadores de
+# pg_trgm son de text, así que el índice es sobre la expresión (columna::text) y las consultas usan el
+# mismo cast. Sirven tanto para ILIKE '%texto%' como para la similitud por palabras (<%).
+DDL_BUSQUEDA = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_obras_nombre_obra_trgm ON obras USING gin ((nombre_obra::text) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_obras_direccion_obra_trgm ON obras USING gin ((direccion_obra::text) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_partidas_nombre_partida_trgm ON partidas USING gin ((nombre_partida::text) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_partidas_nombre_obra_trgm ON partidas USING gin ((nombre_obra::text) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_trabajadores_nombre_trgm ON trabajadores USING gin ((nombre::text) gin_trgm_ops)",
+]
+
+def asegurar_indices_busqueda(bind: Engine = engine):
+    """Crea la extensión pg_trgm y los índices de búsqueda si no existen"""
+    with bind.begin() as conexion:
+        for sentencia in DDL_BUSQUEDA:
+            conexion.execute(text(sentencia))
+
+def _escapar_like(texto: str) -> str:
+    return texto.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def buscar(consulta: Query, columnas: Sequence, orden_desempate: Sequence, q: str, skip: int, limit: int) -> Tuple[int, List]:
+    """
+    Búsqueda por nombre con los índices de trigramas:
+    - Coincide si alguna columna contiene el texto (ILIKE) o tiene una palabra parecida (word_similarity, admite erratas)
+    - Orden: primero las que empiezan por el texto, después por similitud y por último orden_desempate
+    - El total sale de la misma consulta (count(*) OVER ()), sin una segunda pasada
+    Devuelve (total, objetos de la página).
+    """
+    q = q.strip()
+    textos = [cast(columna, Text) for columna in columnas]
+    contiene = f"%{_escapar_like(q)}%"
+    prefijo = f"{_escapar_like(q)}%"
+
+    condicion = or_(
+        *[t.ilike(contiene) for t in textos],
+        *[literal(q).op("<%")(t) for t in textos]
+    )
+    similitud = func.greatest(*[func.coalesce(func.word_similarity(q, t), 0) for t in textos])
+    empieza = case((or_(*[t.ilike(prefijo) for t in textos]), 1), else_=0)
+
+    filas = (
+        consulta.add_columns(func.count().over().label("total"))
+        .filter(condicion)
+        .order_by(empieza.desc(), similitud.desc(), *orden_desempate)
+        .offset(skip)
+        .limit(limit)
+        .all()
+    )
+    if filas:
+        return filas[0].total, [fila[0] for fila in filas]
+    # Página fuera de rango: el total hay que contarlo aparte
+    total = consulta.filter(condicion).order_by(None).count() if skip else 0
+    return total, []
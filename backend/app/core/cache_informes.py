@@ -0,0 +1,147 @@
+import json
+import threading
+from collections import OrderedDict
+from datetime import date
+from typing import Callable, Dict, Iterable, List, Optional
+
+from fastapi import Response
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.environment import CACHE_INFORMES_MAX_BYTES, CACHE_INFORMES_MAX_MESES
+from app.core.metricas import incrementar, registrar_medidor
+from app.models.usuarios import Usuario
+
+# Clave de versión que cambia cuando se propagan nombres desnormalizados (afecta a todos los informes)
+CLAVE_NOMBRES = "nombres"
+# Clave de versión que cambia al dar de alta o de baja trabajadores (informes que listan a todos)
+CLAVE_TRABAJADORES = "trabajadores"
+
+def clave_mes(año: int, mes: int) -> str:
+    return f"mes:{año:04d}-{mes:02d}"
+
+def clave_obra(id_obra: int) -> str:
+    return f"obra:{id_obra}"
+
+def claves_meses_rango(fecha_inicio: date, fecha_fin: date) -> Optional[List[str]]:
+    """Claves de versión de todos los meses de un rango, o None si el rango es demasiado largo para cachear"""
+    claves = []
+    año, mes = fecha_inicio.year, fecha_inicio.month
+    while (año, mes) <= (fecha_fin.year, fecha_fin.month):
+        claves.append(clave_mes(año, mes))
+        if len(claves) > CACHE_INFORMES_MAX_MESES:
+            return None
+        año, mes = (año + 1, 1) if mes == 12 else (año, mes + 1)
+    return claves
+
+def claves_afectadas(horas: Iterable) -> List[str]:
+    """Claves de versión afectadas por una lista de registros de horas (mes y obra de cada uno)"""
+    claves = set()
+    for hora in horas:
+        if hora.fecha:
+            claves.add(clave_mes(hora.fecha.year, hora.fecha.month))
+        if hora.id_obra:
+            claves.add(clave_obra(hora.id_obra))
+    return sorted(claves)
+
+def incrementar_versiones(db: Session, claves: Iterable[str]):
+    """
+    Incrementa la versión de las claves dentro de la transacción de la escritura.
+    Las claves se ordenan para que escrituras concurrentes bloqueen las filas en el mismo orden.
+    """
+    claves = sorted(set(claves))
+    if not claves:
+        return
+    db.execute(text("""
+        INSERT INTO versiones_datos (clave, version)
+        SELECT clave, 1 FROM unnest(CAST(:claves AS varchar[])) AS clave
+        ON CONFLICT (clave) DO UPDATE SET version = versiones_datos.version + 1
+    """), {"claves": claves})
+
+def leer_versiones(db: Session, claves: Iterable[str]) -> Dict[str, int]:
+    """Lee la versión actual de las claves (0 si nunca se han modificado)"""
+    claves = sorted(set(claves))
+    filas = db.execute(
+        text("SELECT clave, version FROM versiones_datos WHERE clave = ANY(CAST(:claves AS varchar[]))"),
+        {"claves": claves}
+    ).all()
+    versiones = {clave: 0 for clave in claves}
+    versiones.update({fila.clave: fila.version for fila in filas})
+    return versiones
+
+def ambito_usuario(usuario: Usuario) -> str:
+    """Ámbito de visibilidad: un trabajador solo ve lo suyo, secretaria y admin ven lo mismo"""
+    if usuario.rol == "trabajador":
+        return f"trabajador:{usuario.chat_id}"
+    return "oficina"
+
+class CacheInformes:
+    """Caché LRU en memoria de cuerpos JSON ya serializados, limitada por tamaño en bytes"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entradas: "OrderedDict[str, bytes]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def obtener(self, clave: str) -> Optional[bytes]:
+        with self._lock:
+            cuerpo = self._entradas.get(clave)
+            if cuerpo is not None:
+                self._entradas.move_to_end(clave)
+        incrementar("cache_informes_aciertos" if cuerpo is not None else "cache_informes_fallos")
+        return cuerpo
+
+    def guardar(self, clave: str, cuerpo: bytes):
+        if len(cuerpo) > self.max_bytes:
+            return
+        with self._lock:
+            anterior = self._entradas.pop(clave, None)
+            if anterior is not None:
+                self._bytes -= len(anterior)
+            self._entradas[clave] = cuerpo
+            self._bytes += len(cuerpo)
+            while self._bytes > self.max_bytes:
+                _, expulsado = self._entradas.popitem(last=False)
+                self._bytes -= len(expulsado)
+                incrementar("cache_informes_expulsiones")
+
+    @property
+    def entradas(self) -> int:
+        return len(self._entradas)
+
+    @property
+    def bytes(self) -> int:
+        return self._bytes
+
+cache_informes = CacheInformes(CACHE_INFORMES_MAX_BYTES)
+registrar_medidor("cache_informes_entradas", lambda: cache_informes.entradas)
+registrar_medidor("cache_informes_bytes", lambda: cache_informes.bytes)
+
+def responder_con_cache(
+    db: Session,
+    endpoint: str,
+    parametros: dict,
+    usuario: Usuario,
+    dependencias: List[str],
+    generar: Callable[[], Response]
+) -> Response:
+    """
+    Devuelve la respuesta cacheada si las versiones de sus dependencias no han cambiado;
+    si no, la genera y la guarda. Las versiones se leen antes de calcular, de modo que una
+    escritura concurrente solo puede provocar un fallo de caché, nunca un dato obsoleto.
+    """
+    versiones = leer_versiones(db, dependencias + [CLAVE_NOMBRES])
+    clave = json.dumps(
+        [endpoint, sorted((k, str(v)) for k, v in parametros.items() if v is not None), ambito_usuario(usuario), sorted(versiones.items())],
+        separators=(",", ":")
+    )
+
+    cuerpo = cache_informes.obtener(clave)
+    if cuerpo is not None:
+        return Response(content=cuerpo, media_type="application/json")
+
+    respuesta = generar()
+    if respuesta.status_code == 200:
+        cache_informes.guardar(clave, bytes(respuesta.body))
+    return respuesta
@@ -0,0 +1,108 @@
+import base64
+import calendar
+from datetime import date
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+# Tipo de los arrays binarios del calendario de equipo (float32 little-endian, como Float32Array en el navegador)
+TIPO_MATRIZ = "float32"
+_DTYPE_MATRIZ = np.dtype("<f4")
+
+# Una fila por día con registros: total, extra y la obra con más horas del día
+_SQL_CALENDARIO = """
+    WITH por_obra AS (
+        SELECT fecha, id_obra,
+               COALESCE(SUM(horas_totales), 0) AS horas,
+               COALESCE(SUM(horas_totales) FILTER (WHERE es_extra), 0) AS extra
+        FROM horas
+        WHERE chat_id = :chat_id AND fecha BETWEEN :desde AND :hasta
+        GROUP BY fecha, id_obra
+    )
+    SELECT fecha - CAST(:desde AS date) AS dia,
+           SUM(horas)::float8 AS horas,
+           SUM(extra)::float8 AS extra,
+           (array_agg(id_obra ORDER BY horas DESC, id_obra) FILTER (WHERE id_obra IS NOT NULL))[1] AS id_obra
+    FROM por_obra
+    GROUP BY fecha
+"""
+
+# Una fila por trabajador y día con registros
+_SQL_CALENDARIO_EQUIPO = """
+    SELECT h.chat_id::text AS chat_id, t.nombre::text AS nombre,
+           h.fecha - CAST(:desde AS date) AS dia,
+           COALESCE(SUM(h.horas_totales), 0)::float8 AS horas,
+           COALESCE(SUM(h.horas_totales) FILTER (WHERE h.es_extra), 0)::float8 AS extra
+    FROM horas h
+    LEFT JOIN trabajadores t ON t.chat_id = h.chat_id
+    WHERE h.fecha BETWEEN :desde AND :hasta
+      AND (CAST(:id_obra AS integer) IS NULL OR h.id_obra = :id_obra)
+    GROUP BY h.chat_id, t.nombre, h.fecha
+"""
+
+def limites_año(año: int):
+    return date(año, 1, 1), date(año, 12, 31), 366 if calendar.isleap(año) else 365
+
+def _base64(matriz: np.ndarray) -> str:
+    return base64.b64encode(matriz.astype(_DTYPE_MATRIZ).tobytes()).decode("ascii")
+
+def calendario_trabajador(db: Session, chat_id: str, año: int, con_extra: bool = False, con_obras: bool = False) -> dict:
+    """
+    Calendario de un trabajador en un año: arrays de longitud fija (365/366, posición 0 = 1 de enero)
+    con las horas de cada día y, opcionalmente, las horas extra y la obra principal (0 = sin obra)
+    """
+    desde, hasta, dias = limites_año(año)
+    horas = np.zeros(dias)
+    extra = np.zeros(dias)
+    obras = np.zeros(dias, dtype=np.int64)
+    for fila in db.execute(text(_SQL_CALENDARIO), {"chat_id": chat_id, "desde": desde, "hasta": hasta}):
+        horas[fila.dia] = fila.horas
+        extra[fila.dia] = fila.extra
+        obras[fila.dia] = fila.id_obra or 0
+
+    return {
+        "chat_id": chat_id,
+        "año": año,
+        "primer_dia": desde,
+        "dias": dias,
+        "horas": np.round(horas, 2).tolist(),
+        "extra": np.round(extra, 2).tolist() if con_extra else None,
+        "obras": obras.tolist() if con_obras else None,
+    }
+
+def calendario_equipo(db: Session, año: int, id_obra: Optional[int] = None, con_extra: bool = False) -> dict:
+    """
+    Calendario de todos los trabajadores con horas en el año: matriz trabajador x día codificada en
+    base64 (float32 little-endian, fila a fila), con el orden de las filas en `trabajadores`
+    """
+    desde, hasta, dias = limites_año(año)
+    filas = db.execute(
+        text(_SQL_CALENDARIO_EQUIPO), {"desde": desde, "hasta": hasta, "id_obra": id_obra}
+    ).all()
+
+    nombres = {}
+    for fila in filas:
+        nombres.setdefault(fila.chat_id, fila.nombre)
+    trabajadores = sorted(nombres)
+    posicion = {chat_id: i for i, chat_id in enumerate(trabajadores)}
+
+    horas = np.zeros((len(trabajadores), dias), dtype=_DTYPE_MATRIZ)
+    extra = np.zeros((len(trabajadores), dias), dtype=_DTYPE_MATRIZ)
+    if filas:
+        filas_matriz = np.fromiter((posicion[fila.chat_id] for fila in filas), dtype=np.int64, count=len(filas))
+        columnas = np.fromiter((fila.dia for fila in filas), dtype=np.int64, count=len(filas))
+        horas[filas_matriz, columnas] = [fila.horas for fila in filas]
+        extra[filas_matriz, columnas] = [fila.extra for fila in filas]
+
+    return {
+        "año": año,
+        "primer_dia": desde,
+        "dias": dias,
+        "trabajadores": trabajadores,
+        "nombres": [nombres[chat_id] for chat_id in trabajadores],
+        "tipo": TIPO_MATRIZ,
+        "horas": _base64(horas),
+        "extra": _base64(extra) if con_extra else None,
+    }
@@ -0,0 +1,285 @@
+import csv
+import io
+import json
+from typing import List, Tuple, Type
+
+from fastapi import HTTPException, Request, status
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+from app.core.environment import CARGA_MAESTROS_MAX_ELEMENTOS
+from app.core.propagacion import encolar_propagacion
+from app.core.cache_informes import incrementar_versiones, CLAVE_TRABAJADORES
+
+RESULTADO_CREADO = "creado"
+RESULTADO_ACTUALIZADO = "actualizado"
+RESULTADO_SIN_CAMBIOS = "sin_cambios"
+RESULTADO_ERROR = "error"
+
+# --- Lectura de la petición (JSON o CSV) ---
+
+def _filas_csv(contenido: bytes) -> List[dict]:
+    try:
+        texto = contenido.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="El CSV debe estar codificado en UTF-8")
+    lineas = texto.splitlines()
+    if not lineas:
+        return []
+    # Excel en español exporta con ';'
+    delimitador = ";" if lineas[0].count(";") > lineas[0].count(",") else ","
+    lector = csv.DictReader(io.StringIO(texto), delimiter=delimitador)
+    lector.fieldnames = [c.strip().lower() for c in lector.fieldnames or []]
+    # Las celdas vacías son campos no informados
+    return [{k: v.strip() for k, v in fila.items() if k and v is not None and v.strip() != ""} for fila in lector]
+
+async def leer_elementos(request: Request, modelo: Type[BaseModel]) -> Tuple[List[Tuple[int, BaseModel]], List[dict]]:
+    """
+    Lee la carga como un array JSON (application/json) o como CSV con cabecera (text/csv)
+    y valida cada elemento por separado. Devuelve los válidos con su posición y los errores.
+    """
+    contenido = await request.body()
+    tipo = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if tipo in ("text/csv", "application/csv"):
+        filas = _filas_csv(contenido)
+    else:
+        try:
+            filas = json.loads(contenido or b"[]")
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="El cuerpo debe ser un array JSON o un CSV (Content-Type: text/csv)")
+        if not isinstance(filas, list):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="El cuerpo JSON debe ser un array de elementos")
+
+    if len(filas) > CARGA_MAESTROS_MAX_ELEMENTOS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"La carga supera el máximo de {CARGA_MAESTROS_MAX_ELEMENTOS} elementos"
+        )
+
+    validos, errores = [], []
+    for posicion, fila in enumerate(filas):
+        try:
+            if not isinstance(fila, dict):
+                raise ValueError("el elemento debe ser un objeto")
+            validos.append((posicion, modelo(**fila)))
+        except (ValidationError, ValueError) as e:
+            mensaje = "; ".join(
+                f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors()
+            ) if isinstance(e, ValidationError) else str(e)
+            errores.append(_resultado(posicion, None, RESULTADO_ERROR, mensaje))
+    return validos, errores
+
+def _resultado(posicion: int, clave, resultado: str, error: str = None, propagacion_id: int = None) -> dict:
+    return {
+        "posicion": posicion,
+        "clave": None if clave is None else str(clave),
+        "resultado": resultado,
+        "error": error,
+        "propagacion_id": propagacion_id,
+    }
+
+def _resumen(resultados: List[dict]) -> dict:
+    resultados = sorted(resultados, key=lambda r: r["posicion"])
+    conteo = {r: 0 for r in (RESULTADO_CREADO, RESULTADO_ACTUALIZADO, RESULTADO_SIN_CAMBIOS, RESULTADO_ERROR)}
+    for r in resultados:
+        conteo[r["resultado"]] += 1
+    return {
+        "creados": conteo[RESULTADO_CREADO],
+        "actualizados": conteo[RESULTADO_ACTUALIZADO],
+        "sin_cambios": conteo[RESULTADO_SIN_CAMBIOS],
+        "errores": conteo[RESULTADO_ERROR],
+        "resultados": resultados,
+    }
+
+def _ejecutar(db: Session, sentencia: str, elementos: List[Tuple[int, BaseModel]], clave_altas: str = None):
+    """
+    Ejecuta la sentencia de carga sin confirmarla (ver _confirmar); si hay altas y se indica clave_altas,
+    incrementa su versión en la misma transacción
+    """
+    datos = json.dumps([dict(e.model_dump(), pos=pos) for pos, e in elementos])
+    try:
+        filas = db.execute(text(sentencia), {"datos": datos}).all()
+        if clave_altas and any(fila.insertado for fila in filas):
+            incrementar_versiones(db, [clave_altas])
+    except DBAPIError as e:
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"No se pudo aplicar la carga: {e.orig}")
+    return filas
+
+def _confirmar(db: Session):
+    """Confirma la carga junto con las propagaciones encoladas: o se guardan todas o ninguna"""
+    try:
+        db.commit()
+    except DBAPIError as e:
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"No se pudo aplicar la carga: {e.orig}")
+
+def _resultado_fila(fila, clave) -> dict:
+    """Resultado de un elemento a partir de la fila devuelta por la sentencia de carga"""
+    if fila.error:
+        return _resultado(fila.pos, clave, RESULTADO_ERROR, fila.error)
+    if fila.insertado is None:
+        return _resultado(fila.pos, clave, RESULTADO_SIN_CAMBIOS)
+    return _resultado(fila.pos, clave, RESULTADO_CREADO if fila.insertado else RESULTADO_ACTUALIZADO)
+
+def _propagar(db: Session, resultado: dict, fila, tipo: str, id_entidad, nuevo_nombre: str, usuario):
+    """Si un elemento actualizado cambió de nombre, encolar la propagación de la copia desnormalizada como en los PUT"""
+    if resultado["resultado"] == RESULTADO_ACTUALIZADO and fila.nombre_anterior != nuevo_nombre:
+        resultado["propagacion_id"] = encolar_propagacion(db, tipo, id_entidad, nuevo_nombre, usuario, confirmar=False)
+
+# --- Sentencias de carga ---
+# Un único INSERT ... ON CONFLICT por carga. Los CTE comparten la foto previa a la sentencia, así que
+# el LEFT JOIN de 'datos' ve los valores anteriores a la escritura. ON CONFLICT no permite tocar dos
+# veces la misma fila: de los elementos repetidos solo se escribe el primero ('primera') y el resto
+# se marcan como error.
+
+_SQL_TRABAJADORES = """
+    WITH datos AS (
+        SELECT d.pos, d.chat_id, d.nombre, t.chat_id IS NOT NULL AS existe, t.nombre AS nombre_anterior,
+               min(d.pos) OVER (PARTITION BY d.chat_id) AS primera
+        FROM jsonb_to_recordset(CAST(:datos AS jsonb)) AS d(pos integer, chat_id citext, nombre citext)
+        LEFT JOIN trabajadores t ON t.chat_id = d.chat_id
+    ),
+    escritos AS (
+        INSERT INTO trabajadores (chat_id, nombre)
+        SELECT chat_id, nombre FROM datos WHERE pos = primera ORDER BY chat_id
+        ON CONFLICT (chat_id) DO UPDATE SET nombre = EXCLUDED.nombre
+        WHERE trabajadores.nombre IS DISTINCT FROM EXCLUDED.nombre
+        RETURNING chat_id, (xmax = 0) AS insertado
+    )
+    SELECT d.pos, d.chat_id, d.nombre, d.nombre_anterior, e.insertado,
+           CASE WHEN d.pos <> d.primera THEN 'chat_id repetido en la carga (posición ' || d.primera || ')' END AS error
+    FROM datos d
+    LEFT JOIN escritos e ON e.chat_id = d.chat_id AND d.pos = d.primera
+    ORDER BY d.pos
+"""
+
+_SQL_OBRAS = """
+    WITH entrada AS MATERIALIZED (
+        SELECT d.pos, d.id_obra AS id_indicado, d.nombre_obra, d.direccion_obra,
+               (d.id_obra IS NULL AND coincidente.id_obra IS NULL) AS nueva,
+               -- Sin id se busca por nombre; si no existe se reserva un id nuevo de la secuencia
+               COALESCE(d.id_obra, coincidente.id_obra, nextval(pg_get_serial_sequence('obras', 'id_obra'))) AS id_obra
+        FROM jsonb_to_recordset(CAST(:datos AS jsonb)) AS d(pos integer, id_obra integer, nombre_obra citext, direccion_obra citext)
+        LEFT JOIN LATERAL (
+            SELECT o.id_obra FROM obras o
+            WHERE d.id_obra IS NULL AND o.nombre_obra = d.nombre_obra
+            ORDER BY o.id_obra LIMIT 1
+        ) coincidente ON TRUE
+    ),
+    datos AS (
+        SELECT e.*, o.id_obra IS NOT NULL AS existe, o.nombre_obra AS nombre_anterior,
+               COALESCE(e.direccion_obra, o.direccion_obra) AS direccion_final,
+               -- Las obras nuevas se agrupan por nombre para no crear dos iguales en la misma carga
+               min(e.pos) OVER (
+                   PARTITION BY e.nueva, CASE WHEN e.nueva THEN e.nombre_obra END, CASE WHEN NOT e.nueva THEN e.id_obra END
+               ) AS primera
+        FROM entrada e
+        LEFT JOIN obras o ON o.id_obra = e.id_obra
+    ),
+    escritas AS (
+        INSERT INTO obras (id_obra, nombre_obra, direccion_obra)
+        SELECT id_obra, nombre_obra, direccion_final FROM datos
+        WHERE pos = primera AND (existe OR nueva)
+        ORDER BY id_obra
+        ON CONFLICT (id_obra) DO UPDATE SET nombre_obra = EXCLUDED.nombre_obra, direccion_obra = EXCLUDED.direccion_obra
+        WHERE (obras.nombre_obra, obras.direccion_obra) IS DISTINCT FROM (EXCLUDED.nombre_obra, EXCLUDED.direccion_obra)
+        RETURNING id_obra, (xmax = 0) AS insertado
+    )
+    SELECT d.pos, d.id_obra, d.nombre_obra, d.nombre_anterior, e.insertado,
+           CASE
+               WHEN NOT d.existe AND NOT d.nueva THEN 'Obra ' || d.id_indicado || ' no encontrada'
+               WHEN d.pos <> d.primera THEN 'obra repetida en la carga (posición ' || d.primera || ')'
+           END AS error
+    FROM datos d
+    LEFT JOIN escritas e ON e.id_obra = d.id_obra AND d.pos = d.primera
+    ORDER BY d.pos
+"""
+
+_SQL_PARTIDAS = """
+    WITH entrada AS MATERIALIZED (
+        SELECT d.pos, d.id_partida AS id_indicado, d.id_obra, d.nombre_partida, d.acabada,
+               (d.id_partida IS NULL AND coincidente.id_partida IS NULL) AS nueva,
+               -- Sin id se busca por obra y nombre; si no existe se reserva un id nuevo de la secuencia
+               COALESCE(d.id_partida, coincidente.id_partida, nextval(pg_get_serial_sequence('partidas', 'id_partida'))) AS id_partida
+        FROM jsonb_to_recordset(CAST(:datos AS jsonb)) AS d(pos integer, id_partida integer, id_obra integer, nombre_partida citext, acabada boolean)
+        LEFT JOIN LATERAL (
+            SELECT p.id_partida FROM partidas p
+            WHERE d.id_partida IS NULL AND p.id_obra = d.id_obra AND p.nombre_partida = d.nombre_partida
+            ORDER BY p.id_partida LIMIT 1
+        ) coincidente ON TRUE
+    ),
+    datos AS (
+        SELECT e.*, p.id_partida IS NOT NULL AS existe, p.nombre_partida AS nombre_anterior,
+               p.id_obra AS id_obra_anterior, o.nombre_obra,
+               COALESCE(e.acabada, p.acabada, FALSE) AS acabada_final,
+               min(e.pos) OVER (
+                   PARTITION BY e.nueva, CASE WHEN e.nueva THEN e.id_obra END,
+                       CASE WHEN e.nueva THEN e.nombre_partida END, CASE WHEN NOT e.nueva THEN e.id_partida END
+               ) AS primera
+        FROM entrada e
+        LEFT JOIN partidas p ON p.id_partida = e.id_partida
+        -- nombre_obra se resuelve con este join, sin consultas por elemento
+        LEFT JOIN obras o ON o.id_obra = e.id_obra
+    ),
+    escritas AS (
+        INSERT INTO partidas (id_partida, id_obra, nombre_partida, nombre_obra, acabada)
+        SELECT id_partida, id_obra, nombre_partida, nombre_obra, acabada_final FROM datos
+        WHERE pos = primera AND (existe OR nueva) AND nombre_obra IS NOT NULL
+          AND (NOT existe OR id_obra_anterior = id_obra)
+        ORDER BY id_partida
+        ON CONFLICT (id_partida) DO UPDATE
+            SET nombre_partida = EXCLUDED.nombre_partida, nombre_obra = EXCLUDED.nombre_obra, acabada = EXCLUDED.acabada
+        WHERE (partidas.nombre_partida, partidas.nombre_obra, partidas.acabada)
+              IS DISTINCT FROM (EXCLUDED.nombre_partida, EXCLUDED.nombre_obra, EXCLUDED.acabada)
+        RETURNING id_partida, (xmax = 0) AS insertado
+    )
+    SELECT d.pos, d.id_partida, d.nombre_partida, d.nombre_anterior, e.insertado,
+           CASE
+               WHEN d.nombre_obra IS NULL THEN 'La obra ' || d.id_obra || ' no existe'
+               WHEN NOT d.existe AND NOT d.nueva THEN 'Partida ' || d.id_indicado || ' no encontrada'
+               WHEN d.existe AND d.id_obra_anterior <> d.id_obra
+                   THEN 'La partida ' || d.id_partida || ' pertenece a la obra ' || d.id_obra_anterior
+               WHEN d.pos <> d.primera THEN 'partida repetida en la carga (posición ' || d.primera || ')'
+           END AS error
+    FROM datos d
+    LEFT JOIN escritas e ON e.id_partida = d.id_partida AND d.pos = d.primera
+    ORDER BY d.pos
+"""
+
+# --- Cargas ---
+
+def cargar_trabajadores(db: Session, elementos, errores: List[dict], usuario=None) -> dict:
+    """Alta o actualización de trabajadores por chat_id en una sola sentencia y transacción"""
+    resultados = list(errores)
+    if elementos:
+        for fila in _ejecutar(db, _SQL_TRABAJADORES, elementos, CLAVE_TRABAJADORES):
+            resultado = _resultado_fila(fila, fila.chat_id)
+            _propagar(db, resultado, fila, "trabajador", fila.chat_id, fila.nombre, usuario)
+            resultados.append(resultado)
+        _confirmar(db)
+    return _resumen(resultados)
+
+def cargar_obras(db: Session, elementos, errores: List[dict], usuario=None) -> dict:
+    """Alta o actualización de obras (por id_obra o, si no se indica, por nombre) en una sola sentencia"""
+    resultados = list(errores)
+    if elementos:
+        for fila in _ejecutar(db, _SQL_OBRAS, elementos):
+            resultado = _resultado_fila(fila, fila.id_obra if not fila.error else None)
+            _propagar(db, resultado, fila, "obra", fila.id_obra, fila.nombre_obra, usuario)
+            resultados.append(resultado)
+        _confirmar(db)
+    return _resumen(resultados)
+
+def cargar_partidas(db: Session, elementos, errores: List[dict], usuario=None) -> dict:
+    """Alta o actualización de partidas (por id_partida o por obra y nombre) en una sola sentencia"""
+    resultados = list(errores)
+    if elementos:
+        for fila in _ejecutar(db, _SQL_PARTIDAS, elementos):
+            resultado = _resultado_fila(fila, fila.id_partida if not fila.error else None)
+            _propagar(db, resultado, fila, "partida", fila.id_partida, fila.nombre_partida, usuario)
+            resultados.append(resultado)
+        _confirmar(db)
+    return _resumen(resultados)
@@ -0,0 +1,68 @@
+from datetime import date, time, datetime
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Sequence
+
+from fastapi.responses import JSONResponse
+
+# Valor del parámetro ?format= que activa la respuesta columnar
+FORMATO_COLUMNAR = "columnar"
+
+def _valor_json(valor: Any) -> Any:
+    """Convierte un valor de columna a un tipo serializable en JSON"""
+    if valor is None:
+        return None
+    if isinstance(valor, Decimal):
+        return float(valor)
+    if isinstance(valor, (date, time, datetime)):
+        return valor.isoformat()
+    return valor
+
+def codificar_columnar(
+    filas: Iterable[Any],
+    columnas: Sequence[str],
+    columnas_diccionario: Sequence[str] = ()
+) -> Dict[str, Any]:
+    """
+    Convierte una lista de filas (objetos u dicts) en un payload columnar.
+    - Cada columna se devuelve como un array con un valor por fila
+    - Las columnas de `columnas_diccionario` se codifican como índices sobre
+      un diccionario de valores únicos (útil para nombres repetidos)
+    """
+    datos: Dict[str, List[Any]] = {columna: [] for columna in columnas}
+    diccionarios: Dict[str, List[Any]] = {columna: [] for columna in columnas_diccionario}
+    indices: Dict[str, Dict[Any, int]] = {columna: {} for columna in columnas_diccionario}
+
+    total = 0
+    for fila in filas:
+        total += 1
+        for columna in columnas:
+            valor = fila[columna] if isinstance(fila, dict) else getattr(fila, columna, None)
+            valor = _valor_json(valor)
+
+            if columna in indices:
+                if valor is None:
+                    datos[columna].append(None)
+                    continue
+                indice = indices[columna].get(valor)
+                if indice is None:
+                    indice = len(diccionarios[columna])
+                    indices[columna][valor] = indice
+                    diccionarios[columna].append(valor)
+                datos[columna].append(indice)
+            else:
+                datos[columna].append(valor)
+
+    return {
+        "formato": FORMATO_COLUMNAR,
+        "total": total,
+        "columnas": datos,
+        "diccionarios": diccionarios
+    }
+
+def respuesta_columnar(
+    filas: Iterable[Any],
+    columnas: Sequence[str],
+    columnas_diccionario: Sequence[str] = ()
+) -> JSONResponse:
+    """Devuelve directamente un JSONResponse con el payload columnar (sin pasar por response_model)"""
+    return JSONResponse(content=codificar_columnar(filas, columnas, columnas_diccionario))
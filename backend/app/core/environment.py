@@ -27,6 +27,16 @@ DB_NAME = os.getenv("DB_NAME", "gestion_horas")
 # URL de la base de datos
 DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
+# Réplica de lectura opcional (streaming replication). Si no se define DB_REPLICA_HOST, todo va al primario
+DB_REPLICA_HOST = os.getenv("DB_REPLICA_HOST")
+DB_REPLICA_PORT = os.getenv("DB_REPLICA_PORT", DB_PORT)
+DATABASE_REPLICA_URL = (
+    f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_REPLICA_HOST}:{DB_REPLICA_PORT}/{DB_NAME}"
+    if DB_REPLICA_HOST else None
+)
+REPLICA_MAX_LAG_SEGUNDOS = float(os.getenv("REPLICA_MAX_LAG_SEGUNDOS", "5"))  # Con más retraso se lee del primario
+LECTURA_PRIMARIA_TRAS_ESCRITURA_SEGUNDOS = int(os.getenv("LECTURA_PRIMARIA_TRAS_ESCRITURA_SEGUNDOS", "10"))
+
 # Configuración de seguridad
 SECRET_KEY = os.getenv("SECRET_KEY", "supersecretkey123456789")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
@@ -34,4 +44,96 @@ ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "1440
 
 # Configuración de la aplicación
 DEBUG = os.getenv("DEBUG", "True").lower() == "true"
-API_V1_STR = "/api/v1" 
\ No newline at end of file
+API_V1_STR = "/api/v1" 
+# Propagación de nombres desnormalizados (horas.nombre_trabajador, horas.nombre_partida, partidas.nombre_obra)
+PROPAGACION_TAMANO_LOTE = int(os.getenv("PROPAGACION_TAMANO_LOTE", "1000"))
+PROPAGACION_PAUSA_MS = int(os.getenv("PROPAGACION_PAUSA_MS", "50"))
+
+# Cola de trabajos en segundo plano
+# Ejecutar el runner dentro de la API (con varios workers, solo en uno de ellos, elegido con un advisory lock)
+TRABAJOS_EN_PROCESO = os.getenv("TRABAJOS_EN_PROCESO", "True").lower() == "true"
+TRABAJOS_CONCURRENCIA = int(os.getenv("TRABAJOS_CONCURRENCIA", "2"))
+TRABAJOS_INTERVALO_SEGUNDOS = float(os.getenv("TRABAJOS_INTERVALO_SEGUNDOS", "1"))
+TRABAJOS_BLOQUEO_SEGUNDOS = int(os.getenv("TRABAJOS_BLOQUEO_SEGUNDOS", "600"))
+
+# Caché de informes (por proceso)
+CACHE_INFORMES_MAX_BYTES = int(os.getenv("CACHE_INFORMES_MAX_BYTES", str(64 * 1024 * 1024)))
+CACHE_INFORMES_MAX_MESES = int(os.getenv("CACHE_INFORMES_MAX_MESES", "36"))
+
+# Vistas materializadas de totales por obra/partida y mes
+VISTAS_REFRESCO_MINUTOS = int(os.getenv("VISTAS_REFRESCO_MINUTOS", "15"))  # 0 desactiva el refresco programado
+
+# Arranque: auto (create_all solo si cambian los modelos), siempre o nunca
+INICIALIZAR_ESQUEMA = os.getenv("INICIALIZAR_ESQUEMA", "auto").lower()
+
+# Pool de conexiones por proceso (con varios workers, el total es workers * (tamaño + desbordamiento))
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+# Ficheros estáticos de la SPA servidos por la API
+ESTATICOS_DIRECTORIO = os.getenv("ESTATICOS_DIRECTORIO", "/app/static")
+ESTATICOS_MAX_BYTES_MEMORIA = int(os.getenv("ESTATICOS_MAX_BYTES_MEMORIA", str(32 * 1024 * 1024)))
+ESTATICOS_MAX_BYTES_FICHERO = int(os.getenv("ESTATICOS_MAX_BYTES_FICHERO", str(2 * 1024 * 1024)))
+
+# Importación masiva de horas desde CSV (COPY a tabla de staging)
+IMPORTACION_MAX_FILAS = int(os.getenv("IMPORTACION_MAX_FILAS", "1000000"))
+
+# Carga masiva de trabajadores, obras y partidas (POST .../lote)
+CARGA_MAESTROS_MAX_ELEMENTOS = int(os.getenv("CARGA_MAESTROS_MAX_ELEMENTOS", "10000"))
+
+# Idempotency-Key en POST /horas y /horas/lote
+IDEMPOTENCIA_TTL_HORAS = int(os.getenv("IDEMPOTENCIA_TTL_HORAS", "24"))
+IDEMPOTENCIA_EN_CURSO_SEGUNDOS = int(os.getenv("IDEMPOTENCIA_EN_CURSO_SEGUNDOS", "60"))  # Tras esto, una reserva sin respuesta se considera abandonada
+
+# Group commit de POST /horas: agrupa las creaciones individuales que llegan a la vez en una transacción
+HORAS_GROUP_COMMIT = os.getenv("HORAS_GROUP_COMMIT", "False").lower() == "true"
+HORAS_GROUP_COMMIT_VENTANA_MS = float(os.getenv("HORAS_GROUP_COMMIT_VENTANA_MS", "5"))  # Espera máxima para juntar un grupo
+HORAS_GROUP_COMMIT_MAX_LOTE = int(os.getenv("HORAS_GROUP_COMMIT_MAX_LOTE", "200"))
+
+# Historial de cambios en horas (horas_audit), escrito en la misma transacción que cada cambio
+HORAS_AUDITORIA = os.getenv("HORAS_AUDITORIA", "True").lower() == "true"
+
+# IPs de los proxies cuyas cabeceras X-Forwarded-* se aceptan (separadas por comas). Por defecto "*",
+# como detrás de Traefik, cuya IP no es fija; si la API es accesible sin pasar por el proxy, conviene
+# indicar sus IPs para que nadie pueda falsear la suya con X-Forwarded-For. Lo lee también gunicorn_conf.py
+PROXY_IPS_CONFIABLES = os.getenv("PROXY_IPS_CONFIABLES", "*")
+
+# Control de admisión (token buckets por usuario y tipo de ruta, por proceso). Desactivado por
+# defecto: con varios workers o sin restringir PROXY_IPS_CONFIABLES los límites por IP no son fiables
+ADMISION_ACTIVA = os.getenv("ADMISION_ACTIVA", "False").lower() == "true"
+ADMISION_LECTURAS_POR_MINUTO = float(os.getenv("ADMISION_LECTURAS_POR_MINUTO", "600"))
+ADMISION_LECTURAS_RAFAGA = int(os.getenv("ADMISION_LECTURAS_RAFAGA", "120"))
+ADMISION_ESCRITURAS_POR_MINUTO = float(os.getenv("ADMISION_ESCRITURAS_POR_MINUTO", "120"))
+ADMISION_ESCRITURAS_RAFAGA = int(os.getenv("ADMISION_ESCRITURAS_RAFAGA", "40"))
+ADMISION_INFORMES_POR_MINUTO = float(os.getenv("ADMISION_INFORMES_POR_MINUTO", "20"))
+ADMISION_INFORMES_RAFAGA = int(os.getenv("ADMISION_INFORMES_RAFAGA", "5"))
+ADMISION_LOGIN_POR_MINUTO = float(os.getenv("ADMISION_LOGIN_POR_MINUTO", "10"))  # Por IP y por nombre de usuario
+ADMISION_LOGIN_RAFAGA = int(os.getenv("ADMISION_LOGIN_RAFAGA", "10"))
+ADMISION_FACTOR_SECRETARIA = float(os.getenv("ADMISION_FACTOR_SECRETARIA", "3"))  # Multiplica tasa y ráfaga de admin/secretaria
+# Informes costosos (resumen-mensual, /informes) en ejecución a la vez, en todo el proceso
+ADMISION_INFORMES_CONCURRENCIA = int(os.getenv("ADMISION_INFORMES_CONCURRENCIA", "2"))
+ADMISION_INFORMES_ESPERA_SEGUNDOS = float(os.getenv("ADMISION_INFORMES_ESPERA_SEGUNDOS", "5"))
+
+# Plazo de cada petición por tipo de ruta (statement_timeout de sus transacciones; 0 = sin límite)
+PLAZO_LECTURAS_MS = int(os.getenv("PLAZO_LECTURAS_MS", "10000"))
+PLAZO_ESCRITURAS_MS = int(os.getenv("PLAZO_ESCRITURAS_MS", "15000"))
+PLAZO_INFORMES_MS = int(os.getenv("PLAZO_INFORMES_MS", "120000"))
+PLAZO_LOGIN_MS = int(os.getenv("PLAZO_LOGIN_MS", "5000"))
+
+# Cálculo de nómina: reglas por defecto de horas extra y primas (se pueden cambiar por petición)
+NOMINA_UMBRAL_DIARIO = float(os.getenv("NOMINA_UMBRAL_DIARIO", "8"))  # Horas ordinarias máximas por día
+NOMINA_UMBRAL_SEMANAL = float(os.getenv("NOMINA_UMBRAL_SEMANAL", "40"))  # Horas ordinarias máximas por semana (lunes a domingo)
+NOMINA_NOCHE_INICIO = os.getenv("NOMINA_NOCHE_INICIO", "22:00")
+NOMINA_NOCHE_FIN = os.getenv("NOMINA_NOCHE_FIN", "06:00")
+NOMINA_PRIMA_EXTRA = float(os.getenv("NOMINA_PRIMA_EXTRA", "0.75"))  # Recargo sobre la hora ordinaria
+NOMINA_PRIMA_NOCTURNA = float(os.getenv("NOMINA_PRIMA_NOCTURNA", "0.25"))
+NOMINA_PRIMA_FIN_DE_SEMANA = float(os.getenv("NOMINA_PRIMA_FIN_DE_SEMANA", "0.5"))
+
+# Detección de anomalías en los registros de horas (/informes/anomalias y revisión programada)
+ANOMALIAS_MAX_HORAS_DIA = float(os.getenv("ANOMALIAS_MAX_HORAS_DIA", "12"))  # Días con más horas se marcan como excesivos
+ANOMALIAS_MIN_HORAS_DIA = float(os.getenv("ANOMALIAS_MIN_HORAS_DIA", "0"))  # Días con registros y menos horas (0 = no se comprueba)
+ANOMALIAS_TOLERANCIA_MINUTOS = float(os.getenv("ANOMALIAS_TOLERANCIA_MINUTOS", "5"))  # Diferencia admitida entre horas_totales y hora_fin - hora_inicio
+ANOMALIAS_REVISION_HORAS = int(os.getenv("ANOMALIAS_REVISION_HORAS", "24"))  # 0 desactiva la revisión programada
+ANOMALIAS_REVISION_DIAS = int(os.getenv("ANOMALIAS_REVISION_DIAS", "7"))  # Días hacia atrás que revisa cada ejecución
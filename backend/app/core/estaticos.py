@@ -0,0 +1,256 @@
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+import threading
+from collections import OrderedDict
+from email.utils import formatdate
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, PlainTextResponse, Response
+from starlette.types import Receive, Scope, Send
+
+from app.core.metricas import incrementar, registrar_medidor
+
+logger = logging.getLogger(__name__)
+
+# Nombres con hash de contenido que genera el build de React (main.3f2a1b9c.js, 453.a1b2c3d4.chunk.css...)
+_PATRON_HASH = re.compile(r"\.[0-9a-f]{8,}\.")
+
+CACHE_INMUTABLE = "public, max-age=31536000, immutable"
+CACHE_REVALIDAR = "no-cache"
+
+# Variantes precomprimidas por orden de preferencia: (codificación, extensión del fichero hermano)
+_VARIANTES = (("br", ".br"), ("gzip", ".gz"))
+
+_TIPOS_COMPRIMIBLES = (
+    "text/", "application/javascript", "application/json", "application/xml",
+    "image/svg+xml", "application/manifest+json",
+)
+
+class _Fichero:
+    """Metadatos de un fichero estático (y de sus variantes comprimidas)"""
+
+    __slots__ = ("ruta", "tamano", "mtime", "etag", "tipo", "cache_control")
+
+    def __init__(self, ruta: Path, cache_control: str):
+        estado = ruta.stat()
+        self.ruta = ruta
+        self.tamano = estado.st_size
+        self.mtime = estado.st_mtime
+        self.etag = '"' + hashlib.md5(f"{ruta.name}-{estado.st_size}-{estado.st_mtime_ns}".encode()).hexdigest() + '"'
+        self.tipo = mimetypes.guess_type(str(ruta))[0] or "application/octet-stream"
+        self.cache_control = cache_control
+
+def _acepta(accept_encoding: str, codificacion: str) -> bool:
+    for parte in accept_encoding.split(","):
+        nombre, _, parametros = parte.strip().partition(";")
+        if nombre.strip().lower() == codificacion:
+            return parametros.replace(" ", "") not in ("q=0", "q=0.0")
+    return False
+
+class EstaticosSPA:
+    """
+    App ASGI para servir el build de la SPA desde el mismo proceso de la API:
+    - Sirve el hermano .br/.gz del fichero si existe y el cliente lo acepta (Vary: Accept-Encoding)
+    - Los ficheros con hash en el nombre llevan caché 'immutable' de un año; el resto (index.html) se revalida
+    - ETag/If-None-Match con 304, y los ficheros pequeños se guardan en memoria (LRU limitada en bytes)
+    - Los ficheros grandes se envían con sendfile si el servidor ofrece la extensión ASGI
+      'http.response.zerocopysend'; si no, en trozos desde un hilo (FileResponse)
+    Mantiene la semántica de StaticFiles(html=True): directorio -> index.html y 404.html si existe.
+    """
+
+    def __init__(self, directorio: str, max_bytes_memoria: int, max_bytes_fichero: int):
+        self.directorio = Path(directorio).resolve()
+        self.max_bytes_memoria = max_bytes_memoria
+        self.max_bytes_fichero = max_bytes_fichero
+        self._ficheros: Dict[str, Tuple[_Fichero, Dict[str, _Fichero]]] = {}
+        self._memoria: "OrderedDict[Path, Tuple[float, bytes]]" = OrderedDict()
+        self._bytes_memoria = 0
+        self._lock = threading.Lock()
+        registrar_medidor("estaticos_bytes_memoria", lambda: self._bytes_memoria)
+
+    # --- Resolución de rutas ---
+
+    def _resolver(self, ruta_url: str) -> Optional[Path]:
+        relativa = ruta_url.lstrip("/")
+        candidata = (self.directorio / relativa).resolve()
+        # Evitar salir del directorio con '..'
+        if candidata != self.directorio and self.directorio not in candidata.parents:
+            return None
+        if candidata.is_dir():
+            candidata = candidata / "index.html"
+        return candidata if candidata.is_file() else None
+
+    def _cache_control(self, ruta: Path) -> str:
+        return CACHE_INMUTABLE if _PATRON_HASH.search(ruta.name) else CACHE_REVALIDAR
+
+    def _buscar(self, ruta_url: str):
+        """Fichero y variantes comprimidas de una ruta; el resultado se recuerda (el build no cambia en caliente)"""
+        entrada = self._ficheros.get(ruta_url)
+        if entrada is not None:
+            return entrada
+
+        ruta = self._resolver(ruta_url)
+        entrada = None
+        if ruta is not None:
+            cache_control = self._cache_control(ruta)
+            fichero = _Fichero(ruta, cache_control)
+            variantes = {}
+            for codificacion, extension in _VARIANTES:
+                hermano = ruta.with_name(ruta.name + extension)
+                if hermano.is_file():
+                    variante = _Fichero(hermano, cache_control)
+                    variante.tipo = fichero.tipo
+                    variante.etag = fichero.etag[:-1] + f'-{codificacion}"'
+                    variantes[codificacion] = variante
+            entrada = (fichero, variantes)
+
+            # Solo se recuerdan las rutas existentes: las rutas inventadas no deben hacer crecer el índice
+            with self._lock:
+                self._ficheros[ruta_url] = entrada
+        return entrada
+
+    # --- Caché en memoria ---
+
+    def _leer(self, fichero: _Fichero) -> Optional[bytes]:
+        if fichero.tamano > self.max_bytes_fichero:
+            return None
+        with self._lock:
+            guardado = self._memoria.get(fichero.ruta)
+            if guardado is not None and guardado[0] == fichero.mtime:
+                self._memoria.move_to_end(fichero.ruta)
+                incrementar("estaticos_memoria_aciertos")
+                return guardado[1]
+
+        contenido = fichero.ruta.read_bytes()
+        incrementar("estaticos_memoria_fallos")
+        with self._lock:
+            anterior = self._memoria.pop(fichero.ruta, None)
+            if anterior is not None:
+                self._bytes_memoria -= len(anterior[1])
+            self._memoria[fichero.ruta] = (fichero.mtime, contenido)
+            self._bytes_memoria += len(contenido)
+            while self._bytes_memoria > self.max_bytes_memoria and self._memoria:
+                _, (_, expulsado) = self._memoria.popitem(last=False)
+                self._bytes_memoria -= len(expulsado)
+        return contenido
+
+    # --- ASGI ---
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            raise RuntimeError("EstaticosSPA solo atiende peticiones HTTP")
+
+        if scope["method"] not in ("GET", "HEAD"):
+            await PlainTextResponse("Method Not Allowed", status_code=405)(scope, receive, send)
+            return
+
+        entrada = self._buscar(scope["path"])
+        estado = 200
+        if entrada is None:
+            entrada = self._buscar("/404.html")
+            estado = 404
+            if entrada is None:
+                await PlainTextResponse("Not Found", status_code=404)(scope, receive, send)
+                return
+
+        fichero, variantes = entrada
+        cabeceras_peticion = Headers(scope=scope)
+        accept_encoding = cabeceras_peticion.get("accept-encoding", "")
+
+        servido, codificacion = fichero, None
+        for nombre, _ in _VARIANTES:
+            if nombre in variantes and _acepta(accept_encoding, nombre):
+                servido, codificacion = variantes[nombre], nombre
+                break
+
+        cabeceras = {
+            "cache-control": servido.cache_control if estado == 200 else CACHE_REVALIDAR,
+            "etag": servido.etag,
+            "last-modified": formatdate(fichero.mtime, usegmt=True),
+        }
+        if variantes:
+            cabeceras["vary"] = "Accept-Encoding"
+        if codificacion:
+            cabeceras["content-encoding"] = codificacion
+            incrementar(f"estaticos_servidos_{codificacion}")
+
+        if estado == 200 and servido.etag in (
+            etag.strip() for etag in cabeceras_peticion.get("if-none-match", "").split(",")
+        ):
+            incrementar("estaticos_no_modificados")
+            await Response(status_code=304, headers=cabeceras)(scope, receive, send)
+            return
+
+        contenido = self._leer(servido)
+        if contenido is not None:
+            cabeceras["content-length"] = str(len(contenido))
+            respuesta = Response(
+                content=b"" if scope["method"] == "HEAD" else contenido,
+                status_code=estado, headers=cabeceras, media_type=servido.tipo
+            )
+            await respuesta(scope, receive, send)
+            return
+
+        if scope["method"] == "GET" and "http.response.zerocopysend" in scope.get("extensions", {}):
+            await self._enviar_sendfile(servido, estado, cabeceras, send)
+            return
+
+        await FileResponse(
+            servido.ruta, status_code=estado, headers=cabeceras, media_type=servido.tipo,
+            stat_result=os.stat(servido.ruta), method=scope["method"]
+        )(scope, receive, send)
+
+    async def _enviar_sendfile(self, fichero: _Fichero, estado: int, cabeceras: dict, send: Send):
+        """Envía el fichero con la extensión ASGI de copia cero (sendfile en el servidor)"""
+        tipo = fichero.tipo + ("; charset=utf-8" if fichero.tipo.startswith("text/") else "")
+        cabeceras = dict(cabeceras, **{"content-type": tipo, "content-length": str(fichero.tamano)})
+        await send({
+            "type": "http.response.start",
+            "status": estado,
+            "headers": [(k.encode("latin-1"), v.encode("latin-1")) for k, v in cabeceras.items()],
+        })
+        descriptor = os.open(fichero.ruta, os.O_RDONLY)
+        try:
+            await send({"type": "http.response.zerocopysend", "file": descriptor, "count": fichero.tamano})
+        finally:
+            os.close(descriptor)
+        incrementar("estaticos_sendfile")
+
+def es_comprimible(ruta: Path) -> bool:
+    tipo = mimetypes.guess_type(str(ruta))[0] or ""
+    return tipo.startswith(_TIPOS_COMPRIMIBLES)
+
+def precomprimir_directorio(directorio: str, tamano_minimo: int = 1024) -> int:
+    """
+    Genera los hermanos .gz (y .br si está instalado el paquete brotli) de los ficheros
+    comprimibles del build. Pensado para ejecutarse una vez al construir la imagen.
+    """
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+
+    generados = 0
+    for ruta in Path(directorio).rglob("*"):
+        if not ruta.is_file() or ruta.suffix in (".gz", ".br") or not es_comprimible(ruta):
+            continue
+        contenido = ruta.read_bytes()
+        if len(contenido) < tamano_minimo:
+            continue
+        # mtime=0 para que el .gz sea reproducible entre builds
+        destinos = [(ruta.with_name(ruta.name + ".gz"), gzip.compress(contenido, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            destinos.append((ruta.with_name(ruta.name + ".br"), brotli.compress(contenido, quality=11)))
+        for destino, comprimido in destinos:
+            # Solo merece la pena si la variante es más pequeña
+            if len(comprimido) < len(contenido):
+                destino.write_bytes(comprimido)
+                generados += 1
+    logger.info(f"Precomprimidos {generados} ficheros en {directorio}")
+    return generados
@@ -0,0 +1,162 @@
+import asyncio
+import json
+import logging
+from datetime import date
+from typing import List, Optional, Set
+
+from sqlalchemy import text, func, case
+from sqlalchemy.orm import Session
+
+from app.core.environment import DATABASE_URL
+from app.db.database import SessionLocal
+from app.models.horas import Hora
+from app.schemas.horas import Hora as HoraSchema
+
+logger = logging.getLogger(__name__)
+
+# Canal de Postgres por el que se notifican los cambios en horas (LISTEN/NOTIFY)
+CANAL_HORAS = "horas_eventos"
+# Máximo de IDs por notificación (el payload de NOTIFY está limitado a 8000 bytes y lleva id y chat_id de cada registro)
+MAX_IDS_POR_NOTIFICACION = 200
+
+ACCION_CREADO = "creado"
+ACCION_ACTUALIZADO = "actualizado"
+ACCION_ELIMINADO = "eliminado"
+
+def publicar_evento_horas(db: Session, accion: str, horas: List[Hora]):
+    """
+    Notifica un cambio en horas a todos los procesos mediante pg_notify.
+    Debe llamarse dentro de la transacción de la escritura (después del flush y antes del commit):
+    Postgres solo entrega la notificación si la transacción se confirma.
+    """
+    for inicio in range(0, len(horas), MAX_IDS_POR_NOTIFICACION):
+        bloque = horas[inicio:inicio + MAX_IDS_POR_NOTIFICACION]
+        payload = json.dumps({
+            "accion": accion,
+            "ids": [hora.id_movimiento for hora in bloque],
+            # chat_id de cada id, para filtrar por trabajador también las eliminaciones (ya no hay fila que cargar)
+            "propietarios": [hora.chat_id for hora in bloque],
+            "fechas": sorted({hora.fecha.isoformat() for hora in bloque if hora.fecha}),
+            "chat_ids": sorted({hora.chat_id for hora in bloque if hora.chat_id})
+        })
+        db.execute(text("SELECT pg_notify(:canal, :payload)"), {"canal": CANAL_HORAS, "payload": payload})
+
+def calcular_totales_dia(db: Session, fecha: date) -> dict:
+    """Totales de un día (registros, trabajadores, horas normales y extra) en una sola consulta"""
+    fila = db.query(
+        func.count(Hora.id_movimiento).label("registros"),
+        func.count(func.distinct(Hora.chat_id)).label("trabajadores"),
+        func.coalesce(func.sum(Hora.horas_totales), 0).label("horas_totales"),
+        func.coalesce(func.sum(case((Hora.es_extra == True, Hora.horas_totales), else_=0)), 0).label("horas_extra")
+    ).filter(Hora.fecha == fecha).one()
+
+    horas_totales = float(fila.horas_totales)
+    horas_extra = float(fila.horas_extra)
+    return {
+        "fecha": fecha.isoformat(),
+        "registros": fila.registros,
+        "trabajadores": fila.trabajadores,
+        "horas_totales": horas_totales,
+        "horas_extra": horas_extra,
+        "horas_normales": horas_totales - horas_extra
+    }
+
+class DifusorHoras:
+    """
+    Escucha el canal de Postgres y reparte los eventos a los clientes SSE conectados a este proceso.
+    La escucha se inicia con el primer suscriptor, así que no abre conexiones si nadie mira el Dashboard.
+    """
+
+    def __init__(self):
+        self._suscriptores: Set[asyncio.Queue] = set()
+        self._tarea: Optional[asyncio.Task] = None
+
+    def suscribir(self) -> asyncio.Queue:
+        cola: asyncio.Queue = asyncio.Queue(maxsize=100)
+        self._suscriptores.add(cola)
+        if self._tarea is None or self._tarea.done():
+            self._tarea = asyncio.create_task(self._escuchar())
+        return cola
+
+    def cancelar(self, cola: asyncio.Queue):
+        self._suscriptores.discard(cola)
+
+    def _repartir(self, mensaje: dict):
+        for cola in list(self._suscriptores):
+            try:
+                cola.put_nowait(mensaje)
+            except asyncio.QueueFull:
+                # Cliente demasiado lento: se descarta el evento para él, recibirá los totales del siguiente
+                logger.warning("Cola SSE llena, se descarta un evento de horas")
+
+    async def _escuchar(self):
+        import asyncpg
+
+        espera = 1
+        while self._suscriptores:
+            conexion = None
+            try:
+                conexion = await asyncpg.connect(DATABASE_URL)
+                eventos: asyncio.Queue = asyncio.Queue()
+                await conexion.add_listener(CANAL_HORAS, lambda *args: eventos.put_nowait(args[3]))
+                logger.info(f"Escuchando eventos de horas en el canal '{CANAL_HORAS}'")
+                espera = 1
+                while self._suscriptores:
+                    try:
+                        payload = await asyncio.wait_for(eventos.get(), timeout=30)
+                    except asyncio.TimeoutError:
+                        continue
+                    mensaje = await asyncio.to_thread(_construir_mensaje, json.loads(payload))
+                    self._repartir(mensaje)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error en la escucha de eventos de horas, reintentando en {espera}s: {e}")
+                await asyncio.sleep(espera)
+                espera = min(espera * 2, 30)
+            finally:
+                if conexion is not None:
+                    await conexion.close()
+
+def _construir_mensaje(evento: dict) -> dict:
+    """Carga las filas afectadas y los totales de hoy (una vez por evento, no por cliente)"""
+    db = SessionLocal()
+    try:
+        horas = []
+        if evento["accion"] != ACCION_ELIMINADO:
+            filas = db.query(Hora).filter(Hora.id_movimiento.in_(evento["ids"])).all()
+            horas = [HoraSchema.model_validate(fila).model_dump(mode="json") for fila in filas]
+        return {
+            "accion": evento["accion"],
+            "ids": evento["ids"],
+            "chat_ids": evento.get("chat_ids", []),
+            "propietarios": evento.get("propietarios", []),
+            "horas": horas,
+            "totales": calcular_totales_dia(db, date.today())
+        }
+    finally:
+        db.close()
+
+def filtrar_mensaje_trabajador(mensaje: dict, chat_id: Optional[str]) -> Optional[dict]:
+    """
+    Deja en un evento solo los registros de un trabajador (ids, horas y chat_ids) y sin totales
+    globales; None si no queda ninguno
+    """
+    if not chat_id:
+        return None
+    propio = chat_id.lower()
+    ids = [
+        id_movimiento for id_movimiento, propietario in zip(mensaje["ids"], mensaje.get("propietarios", []))
+        if propietario and propietario.lower() == propio
+    ]
+    if not ids:
+        return None
+    return {
+        "accion": mensaje["accion"],
+        "ids": ids,
+        "chat_ids": [chat_id],
+        "horas": [hora for hora in mensaje["horas"] if (hora.get("chat_id") or "").lower() == propio],
+        "totales": None
+    }
+
+difusor_horas = DifusorHoras()
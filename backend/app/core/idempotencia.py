@@ -0,0 +1,214 @@
+import asyncio
+import hashlib
+import inspect
+import json
+import logging
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Optional, Union
+
+from fastapi import HTTPException, Response, status
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.environment import IDEMPOTENCIA_TTL_HORAS, IDEMPOTENCIA_EN_CURSO_SEGUNDOS
+from app.core.metricas import incrementar
+from app.db.database import SessionLocal
+from app.models.usuarios import Usuario
+
+logger = logging.getLogger(__name__)
+
+CABECERA_IDEMPOTENCIA = "Idempotency-Key"
+CABECERA_REPETIDA = "Idempotency-Replayed"
+MAX_LONGITUD_CLAVE = 100
+# Clave de Session.info con la Idempotency-Key que se está ejecutando en la sesión
+_INFO_IDEMPOTENCIA = "idempotencia"
+
+# Reserva la clave (o la recupera si caducó o quedó abandonada a medias). Si devuelve fila, esta
+# petición es la que debe ejecutarse; si no, ya hay una respuesta guardada o una ejecución en curso.
+_SQL_RESERVAR = """
+    INSERT INTO claves_idempotencia (clave, id_usuario, ruta, huella, creado, expira)
+    VALUES (:clave, :id_usuario, :ruta, :huella, now(), now() + make_interval(hours => :ttl))
+    ON CONFLICT (clave, id_usuario) DO UPDATE SET
+        ruta = EXCLUDED.ruta, huella = EXCLUDED.huella, estado_http = NULL, respuesta = NULL,
+        creado = EXCLUDED.creado, expira = EXCLUDED.expira
+    WHERE claves_idempotencia.expira < now()
+       OR (claves_idempotencia.estado_http IS NULL
+           AND claves_idempotencia.creado < now() - make_interval(secs => :en_curso))
+    RETURNING clave
+"""
+
+def _huella(ruta: str, datos) -> str:
+    return hashlib.sha256(json.dumps([ruta, datos], sort_keys=True, default=str).encode()).hexdigest()
+
+def _actualizar(db: Session, clave: str, id_usuario: int, estado_http: int, cuerpo: bytes):
+    db.execute(
+        text("UPDATE claves_idempotencia SET estado_http = :estado, respuesta = :cuerpo WHERE clave = :clave AND id_usuario = :id_usuario"),
+        {"estado": estado_http, "cuerpo": cuerpo, "clave": clave, "id_usuario": id_usuario}
+    )
+
+def _guardar(db: Session, clave: str, id_usuario: int, estado_http: int, cuerpo: bytes):
+    _actualizar(db, clave, id_usuario, estado_http, cuerpo)
+    db.commit()
+
+def _liberar(db: Session, clave: str, id_usuario: int):
+    """Borra la reserva para que un reintento vuelva a ejecutar la petición (errores no definitivos)"""
+    db.execute(
+        text("DELETE FROM claves_idempotencia WHERE clave = :clave AND id_usuario = :id_usuario AND estado_http IS NULL"),
+        {"clave": clave, "id_usuario": id_usuario}
+    )
+    db.commit()
+
+@contextmanager
+def sesion_idempotente(db: Session, idempotencia: Optional[dict]):
+    """Asocia a la sesión la Idempotency-Key en curso mientras dura el bloque (la usa confirmar_escritura)"""
+    anterior = db.info.get(_INFO_IDEMPOTENCIA)
+    db.info[_INFO_IDEMPOTENCIA] = idempotencia
+    try:
+        yield idempotencia
+    finally:
+        db.info[_INFO_IDEMPOTENCIA] = anterior
+
+def idempotencia_en_curso(db: Session) -> Optional[dict]:
+    """Idempotency-Key que se está ejecutando en la sesión, si la hay"""
+    return db.info.get(_INFO_IDEMPOTENCIA)
+
+def guardar_en_transaccion(db: Session, idempotencia: dict, respuesta: Response):
+    """Guarda la respuesta de la clave sin hacer commit: se confirma con la transacción de la escritura"""
+    _actualizar(db, idempotencia["clave"], idempotencia["id_usuario"], respuesta.status_code, bytes(respuesta.body))
+
+def confirmar_escritura(db: Session, construir_respuesta: Callable[[], Response]):
+    """
+    Hace el commit de una escritura. Si la sesión ejecuta una petición con Idempotency-Key, antes
+    construye la respuesta y la guarda en la misma transacción: el registro y su respuesta guardada
+    se confirman o se deshacen juntos, y un reintento nunca vuelve a ejecutar una escritura confirmada
+    """
+    idempotencia = idempotencia_en_curso(db)
+    if idempotencia is None:
+        db.commit()
+        return
+    respuesta = construir_respuesta()
+    guardar_en_transaccion(db, idempotencia, respuesta)
+    db.commit()
+    idempotencia["respuesta"] = respuesta
+
+async def ejecutar_idempotente(
+    db: Session,
+    usuario: Usuario,
+    clave: str,
+    ruta: str,
+    datos,
+    generar: Callable[[], Union[Response, Awaitable[Response]]]
+) -> Response:
+    """
+    Ejecuta una escritura una sola vez por Idempotency-Key (por usuario):
+    - La primera petición reserva la clave, ejecuta y guarda el estado HTTP y el cuerpo de la respuesta
+    - Los reintentos devuelven la respuesta guardada sin validar ni insertar de nuevo
+    - Reutilizar la clave con otro cuerpo devuelve 422; si la primera sigue en curso, 409
+    Los errores de validación (4xx) también se guardan; los 5xx liberan la clave para poder reintentar.
+    generar puede devolver la respuesta o un awaitable con ella (p. ej. la escritura agrupada por group commit).
+    Las escrituras que confirman con confirmar_escritura guardan la respuesta en su propia transacción;
+    si no, se guarda después con un commit aparte.
+    """
+    if len(clave) > MAX_LONGITUD_CLAVE:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"La cabecera {CABECERA_IDEMPOTENCIA} no puede superar {MAX_LONGITUD_CLAVE} caracteres"
+        )
+
+    huella = _huella(ruta, datos)
+    reservada = db.execute(text(_SQL_RESERVAR), {
+        "clave": clave, "id_usuario": usuario.id, "ruta": ruta, "huella": huella,
+        "ttl": IDEMPOTENCIA_TTL_HORAS, "en_curso": IDEMPOTENCIA_EN_CURSO_SEGUNDOS
+    }).first()
+    db.commit()
+
+    if reservada is None:
+        return _repetir(db, usuario, clave, ruta, huella)
+
+    idempotencia = {"clave": clave, "id_usuario": usuario.id}
+    try:
+        with sesion_idempotente(db, idempotencia):
+            respuesta = generar()
+            if inspect.isawaitable(respuesta):
+                respuesta = await respuesta
+    except HTTPException as e:
+        db.rollback()
+        if "respuesta" in idempotencia:
+            raise
+        if e.status_code < 500:
+            _guardar(db, clave, usuario.id, e.status_code, json.dumps({"detail": e.detail}).encode())
+        else:
+            _liberar(db, clave, usuario.id)
+        raise
+    except Exception:
+        db.rollback()
+        if "respuesta" not in idempotencia:
+            _liberar(db, clave, usuario.id)
+        raise
+
+    if "respuesta" in idempotencia:
+        # Ya guardada junto con la escritura: se devuelve la misma que repetirán los reintentos
+        return idempotencia["respuesta"]
+    _guardar(db, clave, usuario.id, respuesta.status_code, bytes(respuesta.body))
+    return respuesta
+
+def _repetir(db: Session, usuario: Usuario, clave: str, ruta: str, huella: str) -> Response:
+    fila = db.execute(
+        text("SELECT ruta, huella, estado_http, respuesta FROM claves_idempotencia WHERE clave = :clave AND id_usuario = :id_usuario"),
+        {"clave": clave, "id_usuario": usuario.id}
+    ).first()
+    if fila is None:
+        # Se liberó entre la reserva fallida y esta lectura: el cliente puede reintentar ya
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="La petición con esta Idempotency-Key no se completó, vuelve a intentarlo",
+            headers={"Retry-After": "1"}
+        )
+    if fila.ruta != ruta or fila.huella != huella:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="La Idempotency-Key ya se usó con una petición distinta"
+        )
+    if fila.estado_http is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Hay una petición con esta Idempotency-Key en curso",
+            headers={"Retry-After": "1"}
+        )
+
+    incrementar("idempotencia_repeticiones")
+    return Response(
+        content=bytes(fila.respuesta),
+        status_code=fila.estado_http,
+        media_type="application/json",
+        headers={CABECERA_REPETIDA: "true"}
+    )
+
+def limpiar_claves_caducadas(lote: int = 5000) -> int:
+    """Borra las claves caducadas por lotes pequeños (índice por expira)"""
+    db = SessionLocal()
+    try:
+        total = 0
+        while True:
+            borradas = db.execute(text("""
+                DELETE FROM claves_idempotencia WHERE ctid IN (
+                    SELECT ctid FROM claves_idempotencia WHERE expira < now() LIMIT :lote
+                )
+            """), {"lote": lote}).rowcount
+            db.commit()
+            total += borradas
+            if borradas < lote:
+                return total
+    finally:
+        db.close()
+
+async def programar_limpieza_idempotencia(intervalo_segundos: int = 3600):
+    """Borra periódicamente las claves caducadas (las caducadas ya no se reutilizan aunque sigan en la tabla)"""
+    while True:
+        await asyncio.sleep(intervalo_segundos)
+        try:
+            borradas = await asyncio.to_thread(limpiar_claves_caducadas)
+            if borradas:
+                logger.info(f"Borradas {borradas} claves de idempotencia caducadas")
+        except Exception as e:
+            logger.error(f"No se pudieron limpiar las claves de idempotencia: {e}")
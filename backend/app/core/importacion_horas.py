@@ -0,0 +1,392 @@
+import csv
+import io
+import logging
+import time as reloj
+import uuid
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal, InvalidOperation
+from types import SimpleNamespace
+from typing import BinaryIO, Iterator, List, Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.core.cache_informes import incrementar_versiones, clave_mes, clave_obra
+from app.core.environment import IMPORTACION_MAX_FILAS, HORAS_AUDITORIA
+from app.core.auditoria import SQL_INSTANTANEA
+from app.core.eventos_horas import publicar_evento_horas, ACCION_CREADO
+from app.core.metricas import incrementar
+from app.db.database import engine
+from app.models.usuarios import Usuario
+
+logger = logging.getLogger(__name__)
+
+TABLA_IMPORTACION = "horas_importacion"
+
+# Tabla de staging UNLOGGED (no escribe WAL): cada importación usa sus propias filas (id_importacion)
+# y las borra en la misma transacción, así que nunca son visibles para otras sesiones
+DDL_IMPORTACION = [
+    f"""
+    CREATE UNLOGGED TABLE IF NOT EXISTS {TABLA_IMPORTACION} (
+        id_importacion VARCHAR(32) NOT NULL,
+        fila INTEGER NOT NULL,
+        chat_id CITEXT,
+        fecha DATE,
+        hora_inicio TIME,
+        hora_fin TIME,
+        id_obra INTEGER,
+        id_partida INTEGER,
+        horas_totales NUMERIC(4,2),
+        es_extra BOOLEAN NOT NULL DEFAULT FALSE,
+        tipo_extra CITEXT,
+        descripcion_extra TEXT,
+        error_formato TEXT,
+        errores TEXT[],
+        PRIMARY KEY (id_importacion, fila)
+    )
+    """,
+    f"CREATE INDEX IF NOT EXISTS ix_{TABLA_IMPORTACION}_solape ON {TABLA_IMPORTACION} (id_importacion, chat_id, fecha)",
+]
+
+# Columnas del CSV (cabecera obligatoria; el orden da igual y las opcionales pueden faltar)
+COLUMNAS_OBLIGATORIAS = ["chat_id", "fecha", "hora_inicio", "hora_fin"]
+COLUMNAS_OPCIONALES = ["id_obra", "id_partida", "horas_totales", "es_extra", "tipo_extra", "descripcion_extra"]
+_COLUMNAS_COPY = ["id_importacion", "fila"] + COLUMNAS_OBLIGATORIAS + COLUMNAS_OPCIONALES + ["error_formato"]
+
+_VERDADERO = {"true", "1", "si", "sí", "s", "yes", "y", "x"}
+_FALSO = {"false", "0", "no", "n", ""}
+
+def asegurar_tabla_importacion(bind: Engine = engine):
+    """Crea la tabla de staging de importaciones si no existe"""
+    with bind.begin() as conexion:
+        for sentencia in DDL_IMPORTACION:
+            conexion.execute(text(sentencia))
+
+# --- Lectura del CSV ---
+
+def _fecha(valor: str) -> date:
+    if "/" in valor:
+        return datetime.strptime(valor, "%d/%m/%Y").date()
+    return date.fromisoformat(valor)
+
+def _hora(valor: str) -> time:
+    return time.fromisoformat(valor)
+
+def _entero(valor: str) -> Optional[int]:
+    return int(valor) if valor else None
+
+def _horas(valor: str) -> Optional[Decimal]:
+    if not valor:
+        return None
+    horas = Decimal(valor.replace(",", "."))
+    if not Decimal("0") < horas < Decimal("100"):
+        raise ValueError(valor)
+    return horas
+
+def _booleano(valor: str) -> bool:
+    valor = valor.lower()
+    if valor in _VERDADERO:
+        return True
+    if valor in _FALSO:
+        return False
+    raise ValueError(valor)
+
+_CONVERSORES = {
+    "fecha": (_fecha, "fecha inválida (usar YYYY-MM-DD o DD/MM/YYYY)"),
+    "hora_inicio": (_hora, "hora_inicio inválida (usar HH:MM o HH:MM:SS)"),
+    "hora_fin": (_hora, "hora_fin inválida (usar HH:MM o HH:MM:SS)"),
+    "id_obra": (_entero, "id_obra no es un número entero"),
+    "id_partida": (_entero, "id_partida no es un número entero"),
+    "horas_totales": (_horas, "horas_totales no es un número entre 0 y 100"),
+    "es_extra": (_booleano, "es_extra debe ser sí/no, true/false o 1/0"),
+}
+
+def _lector_csv(archivo: BinaryIO) -> csv.DictReader:
+    flujo = io.TextIOWrapper(archivo, encoding="utf-8-sig", newline="")
+    cabecera = flujo.readline()
+    # Excel en español exporta con ';'
+    delimitador = ";" if cabecera.count(";") > cabecera.count(",") else ","
+    columnas = [c.strip().lower() for c in next(csv.reader([cabecera], delimiter=delimitador), [])]
+    faltan = [c for c in COLUMNAS_OBLIGATORIAS if c not in columnas]
+    if faltan:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Faltan columnas obligatorias en la cabecera del CSV: {', '.join(faltan)}"
+        )
+    return csv.DictReader(flujo, fieldnames=columnas, delimiter=delimitador)
+
+def _filas_copy(lector: csv.DictReader, id_importacion: str) -> Iterator[list]:
+    """
+    Convierte cada fila del CSV a las columnas tipadas de la staging. Los errores de formato
+    no detienen la importación: la fila se copia con error_formato y se informa al final.
+    """
+    for fila, registro in enumerate(lector, start=1):
+        if fila > IMPORTACION_MAX_FILAS:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"El CSV supera el máximo de {IMPORTACION_MAX_FILAS} filas por importación"
+            )
+        valores = {"chat_id": (registro.get("chat_id") or "").strip() or None}
+        errores = [] if valores["chat_id"] else ["falta chat_id"]
+        for columna in COLUMNAS_OBLIGATORIAS[1:] + COLUMNAS_OPCIONALES:
+            crudo = (registro.get(columna) or "").strip()
+            if columna in _CONVERSORES:
+                conversor, mensaje = _CONVERSORES[columna]
+                if not crudo and columna in COLUMNAS_OBLIGATORIAS:
+                    errores.append(f"falta {columna}")
+                    valores[columna] = None
+                    continue
+                try:
+                    valores[columna] = conversor(crudo)
+                except (ValueError, InvalidOperation):
+                    errores.append(mensaje)
+                    valores[columna] = None
+            else:
+                valores[columna] = crudo or None
+        if valores.get("es_extra") is None:
+            valores["es_extra"] = False
+
+        yield (
+            [id_importacion, fila]
+            + [valores[c] for c in COLUMNAS_OBLIGATORIAS + COLUMNAS_OPCIONALES]
+            + ["; ".join(errores) or None]
+        )
+
+class _FlujoCopy(io.RawIOBase):
+    """Adapta un generador de filas a un fichero CSV legible por COPY ... FROM STDIN, sin cargarlo entero"""
+
+    def __init__(self, filas: Iterator[list]):
+        self._filas = filas
+        self._buffer = io.StringIO()
+        self._escritor = csv.writer(self._buffer, lineterminator="\n")
+        self._pendiente = b""
+        self.filas = 0
+        # psycopg2 no propaga las excepciones de read(): se guardan y se relanzan tras el COPY
+        self.error: Optional[Exception] = None
+
+    def readable(self):
+        return True
+
+    def read(self, tamano=-1):
+        while tamano < 0 or len(self._pendiente) < tamano:
+            try:
+                fila = next(self._filas, None)
+            except UnicodeDecodeError:
+                self.error = HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="El CSV debe estar codificado en UTF-8")
+                fila = None
+            except HTTPException as e:
+                self.error = e
+                fila = None
+            if fila is None:
+                break
+            # None se escribe como campo vacío sin comillas, que COPY en formato csv interpreta como NULL
+            self._escritor.writerow(fila)
+            self.filas += 1
+            if self._buffer.tell() >= 65536:
+                self._pendiente += self._buffer.getvalue().encode()
+                self._buffer.seek(0)
+                self._buffer.truncate()
+        self._pendiente += self._buffer.getvalue().encode()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        if tamano < 0:
+            datos, self._pendiente = self._pendiente, b""
+        else:
+            datos, self._pendiente = self._pendiente[:tamano], self._pendiente[tamano:]
+        return datos
+
+# --- Validación e inserción en SQL ---
+
+# Una sola pasada sobre la staging: cada CASE aporta un error (o NULL, que se descarta)
+_SQL_VALIDAR = f"""
+    UPDATE {TABLA_IMPORTACION} s SET errores = array_remove(ARRAY[
+        s.error_formato,
+        CASE WHEN s.chat_id IS NOT NULL
+              AND NOT EXISTS (SELECT 1 FROM trabajadores t WHERE t.chat_id = s.chat_id)
+             THEN 'trabajador con chat_id ' || s.chat_id || ' no encontrado' END,
+        CASE WHEN s.id_partida IS NOT NULL
+              AND NOT EXISTS (SELECT 1 FROM partidas p WHERE p.id_partida = s.id_partida)
+             THEN 'partida ' || s.id_partida || ' no encontrada' END,
+        CASE WHEN s.id_obra IS NOT NULL
+              AND NOT EXISTS (SELECT 1 FROM obras o WHERE o.id_obra = s.id_obra)
+             THEN 'obra ' || s.id_obra || ' no encontrada' END,
+        CASE WHEN s.id_obra IS NOT NULL AND s.id_partida IS NOT NULL
+              AND EXISTS (SELECT 1 FROM partidas p WHERE p.id_partida = s.id_partida AND p.id_obra <> s.id_obra)
+             THEN 'la partida ' || s.id_partida || ' no pertenece a la obra ' || s.id_obra END,
+        CASE WHEN s.hora_inicio >= s.hora_fin
+             THEN 'la hora de inicio (' || to_char(s.hora_inicio, 'HH24:MI') || ') no puede ser posterior o igual a la de fin ('
+                  || to_char(s.hora_fin, 'HH24:MI') || ')' END,
+        CASE WHEN s.hora_inicio < s.hora_fin THEN (
+            SELECT 'se solapa con el registro existente ' || to_char(h.hora_inicio, 'HH24:MI') || '-'
+                   || to_char(h.hora_fin, 'HH24:MI') || ' (ID: ' || h.id_movimiento || ')'
+            FROM horas h
+            WHERE h.chat_id = s.chat_id AND h.fecha = s.fecha
+              AND h.es_regularizacion = FALSE
+              AND h.hora_inicio < s.hora_fin AND s.hora_inicio < h.hora_fin
+            ORDER BY h.hora_inicio
+            LIMIT 1
+        ) END,
+        CASE WHEN s.hora_inicio < s.hora_fin THEN (
+            SELECT 'se solapa con la fila ' || o.fila || ' del mismo fichero'
+            FROM {TABLA_IMPORTACION} o
+            WHERE o.id_importacion = s.id_importacion AND o.chat_id = s.chat_id AND o.fecha = s.fecha
+              AND o.fila <> s.fila AND o.error_formato IS NULL AND o.hora_inicio < o.hora_fin
+              AND o.hora_inicio < s.hora_fin AND s.hora_inicio < o.hora_fin
+            ORDER BY o.fila
+            LIMIT 1
+        ) END
+    ], NULL)
+    WHERE s.id_importacion = :id_importacion
+"""
+
+_SQL_CLAVES = f"""
+    SELECT DISTINCT EXTRACT(YEAR FROM s.fecha)::integer AS año, EXTRACT(MONTH FROM s.fecha)::integer AS mes,
+           COALESCE(s.id_obra, p.id_obra) AS id_obra
+    FROM {TABLA_IMPORTACION} s
+    LEFT JOIN partidas p ON p.id_partida = s.id_partida
+    WHERE s.id_importacion = :id_importacion AND cardinality(s.errores) = 0
+"""
+
+_SQL_INSERTAR = f"""
+    WITH insertadas AS (
+        INSERT INTO horas (
+            chat_id, nombre_trabajador, fecha, id_obra, id_partida, nombre_partida, horario,
+            hora_inicio, hora_fin, horas_totales, es_extra, tipo_extra, descripcion_extra, es_regularizacion
+        )
+        SELECT
+            s.chat_id, t.nombre, s.fecha, COALESCE(s.id_obra, p.id_obra), s.id_partida, p.nombre_partida,
+            to_char(s.hora_inicio, 'HH24:MI') || '-' || to_char(s.hora_fin, 'HH24:MI'),
+            s.hora_inicio, s.hora_fin,
+            COALESCE(s.horas_totales, round((EXTRACT(EPOCH FROM s.hora_fin - s.hora_inicio) / 3600)::numeric, 2)),
+            s.es_extra, s.tipo_extra, s.descripcion_extra, FALSE
+        FROM {TABLA_IMPORTACION} s
+        JOIN trabajadores t ON t.chat_id = s.chat_id
+        LEFT JOIN partidas p ON p.id_partida = s.id_partida
+        WHERE s.id_importacion = :id_importacion AND cardinality(s.errores) = 0
+        ORDER BY s.fila
+        RETURNING *
+    ),
+    auditadas AS (
+        INSERT INTO horas_audit (accion, id_movimiento, chat_id, fecha, id_usuario, actor, despues)
+        SELECT '{ACCION_CREADO}', i.id_movimiento, i.chat_id, i.fecha, CAST(:id_usuario AS integer), CAST(:actor AS varchar), {SQL_INSTANTANEA.format(alias="i")}
+        FROM insertadas i
+        WHERE :auditar
+    )
+    SELECT
+        count(*) AS insertadas,
+        COALESCE(
+            json_agg(json_build_object('id_movimiento', id_movimiento, 'fecha', fecha, 'chat_id', chat_id))
+                FILTER (WHERE fecha >= :desde),
+            '[]'
+        ) AS recientes
+    FROM insertadas
+"""
+
+def importar_horas_csv(
+    db: Session,
+    archivo: BinaryIO,
+    solo_validar: bool = False,
+    max_errores: int = 1000,
+    usuario: Optional[Usuario] = None
+) -> dict:
+    """
+    Importa horas desde un CSV:
+    - Las filas se envían en streaming con COPY a la tabla de staging (sin pasar por el ORM)
+    - La validación es una única sentencia sobre todo el lote: trabajador/partida/obra inexistentes,
+      horas invertidas y solapamientos con registros existentes y con otras filas del fichero
+    - Las filas válidas se insertan con un solo INSERT ... SELECT (que también las añade a horas_audit);
+      las erróneas se devuelven en el informe
+    Todo ocurre en una transacción: con solo_validar=True se deshace y no se inserta nada.
+    """
+    inicio = reloj.perf_counter()
+    id_importacion = uuid.uuid4().hex
+    try:
+        lector = _lector_csv(archivo)
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="El CSV debe estar codificado en UTF-8")
+    flujo = _FlujoCopy(_filas_copy(lector, id_importacion))
+
+    try:
+        cursor = db.connection().connection.cursor()
+        try:
+            cursor.copy_expert(
+                f"COPY {TABLA_IMPORTACION} ({', '.join(_COLUMNAS_COPY)}) FROM STDIN WITH (FORMAT csv)",
+                flujo
+            )
+        finally:
+            cursor.close()
+        if flujo.error is not None:
+            raise flujo.error
+        tiempo_copy = reloj.perf_counter() - inicio
+
+        parametros = {"id_importacion": id_importacion}
+        db.execute(text(_SQL_VALIDAR), parametros)
+
+        errores_total = db.execute(
+            text(f"SELECT count(*) FROM {TABLA_IMPORTACION} WHERE id_importacion = :id_importacion AND cardinality(errores) > 0"),
+            parametros
+        ).scalar()
+        errores = db.execute(
+            text(f"""
+                SELECT fila, errores FROM {TABLA_IMPORTACION}
+                WHERE id_importacion = :id_importacion AND cardinality(errores) > 0
+                ORDER BY fila LIMIT :limite
+            """),
+            dict(parametros, limite=max_errores)
+        ).all()
+
+        insertadas = 0
+        if not solo_validar and flujo.filas > errores_total:
+            claves = []
+            for fila in db.execute(text(_SQL_CLAVES), parametros):
+                claves.append(clave_mes(fila.año, fila.mes))
+                if fila.id_obra:
+                    claves.append(clave_obra(fila.id_obra))
+
+            resultado = db.execute(
+                text(_SQL_INSERTAR),
+                dict(
+                    parametros,
+                    desde=date.today() - timedelta(days=1),
+                    auditar=HORAS_AUDITORIA,
+                    id_usuario=usuario.id if usuario else None,
+                    actor=usuario.username if usuario else None
+                )
+            ).one()
+            insertadas = resultado.insertadas
+
+            # El Dashboard en directo solo muestra hoy: no se notifican las horas históricas importadas
+            recientes = [
+                SimpleNamespace(id_movimiento=r["id_movimiento"], fecha=date.fromisoformat(r["fecha"]), chat_id=r["chat_id"])
+                for r in resultado.recientes
+            ]
+            if recientes:
+                publicar_evento_horas(db, ACCION_CREADO, recientes)
+            incrementar_versiones(db, claves)
+
+        if solo_validar:
+            db.rollback()
+        else:
+            db.execute(text(f"DELETE FROM {TABLA_IMPORTACION} WHERE id_importacion = :id_importacion"), parametros)
+            db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    duracion = reloj.perf_counter() - inicio
+    incrementar("importaciones_horas")
+    incrementar("importaciones_horas_filas", insertadas)
+    logger.info(
+        f"Importación {id_importacion}: {flujo.filas} filas, {insertadas} insertadas, {errores_total} con errores "
+        f"en {duracion:.2f}s (COPY {tiempo_copy:.2f}s)"
+    )
+    return {
+        "filas": flujo.filas,
+        "insertadas": insertadas,
+        "errores_total": errores_total,
+        "errores": [{"fila": fila.fila, "errores": list(fila.errores)} for fila in errores],
+        "solo_validar": solo_validar,
+        "duracion_segundos": round(duracion, 3),
+    }
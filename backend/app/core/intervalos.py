@@ -0,0 +1,128 @@
+from bisect import bisect_left, bisect_right, insort
+from datetime import date, time
+from itertools import accumulate
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session
+
+from app.models.horas import Hora
+
+SEGUNDOS_DIA = 24 * 3600
+
+def a_segundos(valor: time) -> int:
+    return valor.hour * 3600 + valor.minute * 60 + valor.second
+
+def a_hora(segundos: int) -> time:
+    # El final del día no existe como time: el último instante representable es 23:59:59
+    segundos = min(segundos, SEGUNDOS_DIA - 1)
+    return time(segundos // 3600, segundos % 3600 // 60, segundos % 60)
+
+class IndiceIntervalos:
+    """
+    Tramos [inicio, fin) de un trabajador en un día, ordenados por inicio y con el máximo acumulado
+    de los fines. Responde si un tramo nuevo se solapa en O(log n) aunque los datos antiguos tengan
+    tramos solapados entre sí, y calcula los huecos libres del día.
+    """
+
+    __slots__ = ("_tramos", "_inicios", "_max_fines")
+
+    def __init__(self, tramos: Iterable[Tuple[int, int, Any]] = ()):
+        self._tramos: List[Tuple[int, int, Any]] = sorted(tramos, key=lambda t: (t[0], t[1]))
+        self._reindexar()
+
+    def _reindexar(self):
+        self._inicios = [t[0] for t in self._tramos]
+        self._max_fines = list(accumulate((t[1] for t in self._tramos), max))
+
+    def __len__(self):
+        return len(self._tramos)
+
+    def tramos(self) -> List[Tuple[int, int, Any]]:
+        return list(self._tramos)
+
+    def añadir(self, inicio: int, fin: int, referencia: Any = None):
+        insort(self._tramos, (inicio, fin, referencia), key=lambda t: (t[0], t[1]))
+        self._reindexar()
+
+    def solapa(self, inicio: int, fin: int) -> Optional[Tuple[int, int, Any]]:
+        """
+        Primer tramo que se solapa con [inicio, fin), o None. Mismo criterio que las escrituras:
+        dos tramos se solapan si cada uno empieza antes de que acabe el otro (tocarse no es solapar).
+        """
+        # Candidatos: los que empiezan antes de fin; alguno solapa si el mayor de sus fines pasa de inicio
+        candidatos = bisect_left(self._inicios, fin)
+        if candidatos == 0 or self._max_fines[candidatos - 1] <= inicio:
+            return None
+        # El primero cuyo máximo acumulado pasa de inicio es un tramo que acaba después de inicio
+        return self._tramos[bisect_right(self._max_fines, inicio, hi=candidatos)]
+
+    def libres(self, desde: int = 0, hasta: int = SEGUNDOS_DIA, minimo: int = 0) -> List[Tuple[int, int]]:
+        """Huecos [inicio, fin) sin tramos entre desde y hasta, de al menos `minimo` segundos"""
+        huecos = []
+        cursor = desde
+        for inicio, fin, _ in self._tramos[:bisect_left(self._inicios, hasta)]:
+            if fin <= cursor:
+                continue
+            if inicio > cursor:
+                huecos.append((cursor, min(inicio, hasta)))
+            cursor = max(cursor, fin)
+        if cursor < hasta:
+            huecos.append((cursor, hasta))
+        return [(i, f) for i, f in huecos if f - i >= max(minimo, 1)]
+
+class IndiceTramos:
+    """
+    Índices de intervalos por (trabajador, día), cargados con una sola consulta. Es la misma
+    comprobación de solapamiento para crear, crear en lote, group commit y actualizar, y la que
+    usa /horas/disponibilidad: solo cuentan los registros con hora de inicio y fin que no son
+    regularizaciones.
+    Las referencias de los tramos cargados son (id_movimiento, hora_inicio, hora_fin).
+    """
+
+    def __init__(self):
+        self._dias: Dict[Tuple[str, date], IndiceIntervalos] = {}
+
+    @classmethod
+    def cargar(
+        cls,
+        db: Session,
+        dias: Iterable[Tuple[str, date]],
+        excluir_id: Optional[int] = None
+    ) -> "IndiceTramos":
+        indice = cls()
+        dias = list(set(dias))
+        if not dias:
+            return indice
+        consulta = db.query(Hora.id_movimiento, Hora.chat_id, Hora.fecha, Hora.hora_inicio, Hora.hora_fin).filter(
+            tuple_(Hora.chat_id, Hora.fecha).in_(dias),
+            Hora.es_regularizacion.isnot(True),
+            Hora.hora_inicio != None,
+            Hora.hora_fin != None
+        )
+        if excluir_id is not None:
+            consulta = consulta.filter(Hora.id_movimiento != excluir_id)
+
+        agrupados: Dict[Tuple[str, date], list] = {dia: [] for dia in dias}
+        for fila in consulta:
+            agrupados.setdefault((fila.chat_id, fila.fecha), []).append(
+                (a_segundos(fila.hora_inicio), a_segundos(fila.hora_fin), (fila.id_movimiento, fila.hora_inicio, fila.hora_fin))
+            )
+        # chat_id es CITEXT: se indexa sin distinguir mayúsculas, igual que compara la base de datos
+        for (chat_id, fecha), tramos in agrupados.items():
+            clave = (chat_id.lower(), fecha)
+            if clave in indice._dias:
+                for tramo in tramos:
+                    indice._dias[clave].añadir(*tramo)
+            else:
+                indice._dias[clave] = IndiceIntervalos(tramos)
+        return indice
+
+    def dia(self, chat_id: str, fecha: date) -> IndiceIntervalos:
+        return self._dias.setdefault((chat_id.lower(), fecha), IndiceIntervalos())
+
+    def solapa(self, chat_id: str, fecha: date, inicio: time, fin: time) -> Optional[Tuple[int, int, Any]]:
+        return self.dia(chat_id, fecha).solapa(a_segundos(inicio), a_segundos(fin))
+
+    def añadir(self, chat_id: str, fecha: date, inicio: time, fin: time, referencia: Any = None):
+        self.dia(chat_id, fecha).añadir(a_segundos(inicio), a_segundos(fin), referencia)
@@ -0,0 +1,115 @@
+import base64
+import json
+import logging
+from typing import Dict, List, Optional
+
+from fastapi import HTTPException, Response, status
+from sqlalchemy import Text, cast, text, tuple_
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Query
+
+from app.db.database import engine
+
+logger = logging.getLogger(__name__)
+
+CABECERA_TOTAL = "X-Total-Count"
+CABECERA_TOTAL_ESTIMADO = "X-Total-Estimado"
+CABECERA_CURSOR = "X-Siguiente-Cursor"
+
+TOTAL_EXACTO = "exacto"
+TOTAL_ESTIMADO = "estimado"
+
+# Índices para recorrer los listados en orden sin ordenar en memoria (paginación por clave)
+DDL_LISTADOS = [
+    "CREATE INDEX IF NOT EXISTS ix_obras_nombre_obra_id ON obras (nombre_obra, id_obra)",
+    "CREATE INDEX IF NOT EXISTS ix_partidas_obra_nombre_id ON partidas (id_obra, nombre_partida, id_partida)",
+    "CREATE INDEX IF NOT EXISTS ix_partidas_nombre_id ON partidas (nombre_partida, id_partida)",
+    # Totales de horas por partida en los listados (con_horas): index-only scan agrupando por partida
+    "CREATE INDEX IF NOT EXISTS ix_horas_id_partida ON horas (id_partida) INCLUDE (fecha, horas_totales, es_extra)",
+]
+
+def asegurar_indices_listados(bind: Engine = engine):
+    """Crea los índices de los listados si no existen"""
+    with bind.begin() as conexion:
+        for sentencia in DDL_LISTADOS:
+            conexion.execute(text(sentencia))
+
+def filtrar_prefijo(consulta: Query, columna, prefijo: Optional[str]) -> Query:
+    """Filtra por nombre que empieza por el prefijo (sin distinguir mayúsculas; usa el índice de trigramas)"""
+    if not prefijo:
+        return consulta
+    escapado = prefijo.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return consulta.filter(cast(columna, Text).ilike(f"{escapado}%"))
+
+def _codificar_cursor(valores: list) -> str:
+    return base64.urlsafe_b64encode(json.dumps(valores, default=str).encode()).decode().rstrip("=")
+
+def _decodificar_cursor(cursor: str, longitud: int) -> list:
+    try:
+        valores = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError:
+        valores = None
+    if not isinstance(valores, list) or len(valores) != longitud:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor de paginación no válido")
+    return valores
+
+def _total_estimado(consulta: Query) -> int:
+    """Filas que el planificador estima para la consulta (EXPLAIN, sin ejecutarla)"""
+    sentencia = consulta.order_by(None).statement
+    compilada = sentencia.compile(dialect=consulta.session.bind.dialect)
+    plan = consulta.session.connection().exec_driver_sql(
+        f"EXPLAIN (FORMAT JSON) {compilada}", compilada.params
+    ).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+def paginar(
+    consulta: Query,
+    response: Response,
+    columnas_orden: Dict[str, object],
+    columna_id,
+    orden: str,
+    cursor: Optional[str],
+    skip: int,
+    limit: int,
+    total: Optional[str]
+) -> List:
+    """
+    Ordena y pagina un listado:
+    - orden: nombre de una de columnas_orden, con '-' delante para orden descendente; siempre se
+      desempata por columna_id para que el orden sea total
+    - cursor: paginación por clave (keyset). Se devuelve en X-Siguiente-Cursor si hay más filas y
+      cada página cuesta lo mismo aunque se esté muy al final; skip se mantiene por compatibilidad
+    - total: 'exacto' (count) o 'estimado' (estimación del planificador, sin recorrer la tabla) en X-Total-Count
+    """
+    descendente = orden.startswith("-")
+    nombre = orden.lstrip("-")
+    if nombre not in columnas_orden:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Orden no válido: '{orden}'. Opciones: {', '.join(columnas_orden)} (con '-' para descendente)"
+        )
+    columna = columnas_orden[nombre]
+    claves = [columna_id] if columna is columna_id else [columna, columna_id]
+
+    if total == TOTAL_EXACTO:
+        response.headers[CABECERA_TOTAL] = str(consulta.order_by(None).count())
+    elif total == TOTAL_ESTIMADO:
+        response.headers[CABECERA_TOTAL] = str(_total_estimado(consulta))
+        response.headers[CABECERA_TOTAL_ESTIMADO] = "true"
+
+    if cursor:
+        valores = _decodificar_cursor(cursor, len(claves))
+        limite = tuple_(*claves)
+        consulta = consulta.filter(limite < tuple(valores) if descendente else limite > tuple(valores))
+        skip = 0
+
+    consulta = consulta.order_by(*[c.desc() if descendente else c.asc() for c in claves])
+    # Una fila de más para saber si hay página siguiente sin contar
+    filas = consulta.offset(skip).limit(limit + 1).all()
+    if len(filas) > limit:
+        filas = filas[:limit]
+        ultima = filas[-1]
+        response.headers[CABECERA_CURSOR] = _codificar_cursor([getattr(ultima, c.key) for c in claves])
+    return filas
@@ -0,0 +1,24 @@
+import threading
+from typing import Callable, Dict
+
+# Contadores y medidores en memoria (por proceso), expuestos en /metricas
+_contadores: Dict[str, float] = {}
+_medidores: Dict[str, Callable[[], float]] = {}
+_lock = threading.Lock()
+
+def incrementar(nombre: str, cantidad: float = 1):
+    """Incrementa un contador"""
+    with _lock:
+        _contadores[nombre] = _contadores.get(nombre, 0) + cantidad
+
+def registrar_medidor(nombre: str, funcion: Callable[[], float]):
+    """Registra un medidor cuyo valor se calcula al consultar las métricas"""
+    _medidores[nombre] = funcion
+
+def obtener_metricas() -> Dict[str, float]:
+    """Devuelve una foto de todos los contadores y medidores"""
+    with _lock:
+        metricas = dict(_contadores)
+    for nombre, funcion in _medidores.items():
+        metricas[nombre] = funcion()
+    return dict(sorted(metricas.items()))
@@ -0,0 +1,216 @@
+import logging
+import time as reloj
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.schemas.nominas import ReglasNomina, NominaTrabajador, ResultadoNomina
+
+logger = logging.getLogger(__name__)
+
+# Las fechas se manejan como días desde esta fecha (un sábado) para operar con enteros
+_EPOCA = date(2000, 1, 1)
+_DESFASE_LUNES = 5  # (dia + 5) % 7 da el día de la semana con lunes = 0
+_MINUTOS_DIA = 24 * 60
+
+_SQL_HORAS = """
+    SELECT chat_id::text,
+           fecha - DATE '2000-01-01',
+           EXTRACT(EPOCH FROM hora_inicio)::float8 / 60,
+           EXTRACT(EPOCH FROM hora_fin)::float8 / 60,
+           horas_totales::float8,
+           COALESCE(es_extra, FALSE)
+    FROM horas
+    WHERE fecha BETWEEN %(desde)s AND %(hasta)s
+"""
+
+@dataclass
+class HorasColumnares:
+    """Registros de horas de un periodo como arrays (una posición por registro)"""
+    chat_ids: np.ndarray     # chat_id de cada trabajador distinto (object)
+    trabajador: np.ndarray   # índice en chat_ids de cada registro (int)
+    dia: np.ndarray          # días desde _EPOCA (int)
+    inicio: np.ndarray       # minutos desde medianoche, NaN si no hay hora de inicio
+    fin: np.ndarray          # minutos desde medianoche, NaN si no hay hora de fin
+    horas: np.ndarray        # horas_totales, NaN si no está informado
+    marcada_extra: np.ndarray  # es_extra (bool)
+
+    @classmethod
+    def desde_filas(cls, filas: Sequence[tuple]) -> "HorasColumnares":
+        if not filas:
+            vacio = np.empty(0)
+            return cls(np.empty(0, dtype=object), vacio.astype(np.int64), vacio.astype(np.int64), vacio, vacio, vacio, vacio.astype(bool))
+        chat_id, dia, inicio, fin, horas, extra = zip(*filas)
+        chat_ids, trabajador = np.unique(np.array(chat_id, dtype=object), return_inverse=True)
+        return cls(
+            chat_ids=chat_ids,
+            trabajador=trabajador.astype(np.int64),
+            dia=np.array(dia, dtype=np.int64),
+            # None se convierte en NaN al crear arrays de float
+            inicio=np.array(inicio, dtype=np.float64),
+            fin=np.array(fin, dtype=np.float64),
+            horas=np.array(horas, dtype=np.float64),
+            marcada_extra=np.array(extra, dtype=bool),
+        )
+
+def a_dia(fecha: date) -> int:
+    return (fecha - _EPOCA).days
+
+def semanas_completas(desde: date, hasta: date):
+    """Amplía el periodo a semanas completas (de lunes a domingo) para aplicar el umbral semanal"""
+    return desde - timedelta(days=desde.weekday()), hasta + timedelta(days=6 - hasta.weekday())
+
+def cargar_horas(db: Session, desde: date, hasta: date, chat_ids: Optional[List[str]] = None) -> HorasColumnares:
+    """Carga en arrays los registros de horas entre dos fechas (una consulta, cursor de psycopg2 sin ORM)"""
+    sql, parametros = _SQL_HORAS, {"desde": desde, "hasta": hasta}
+    if chat_ids:
+        sql += " AND chat_id = ANY(%(chat_ids)s::citext[])"
+        parametros["chat_ids"] = list(chat_ids)
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.execute(sql, parametros)
+        return HorasColumnares.desde_filas(cursor.fetchall())
+    finally:
+        cursor.close()
+
+def _solape(inicio: np.ndarray, fin: np.ndarray, desde: float, hasta: float) -> np.ndarray:
+    """Minutos de [inicio, fin) dentro de [desde, hasta)"""
+    return np.clip(np.minimum(fin, hasta) - np.maximum(inicio, desde), 0, None)
+
+def calcular(
+    columnas: HorasColumnares,
+    desde: date,
+    hasta: date,
+    reglas: ReglasNomina,
+    nombres: Optional[Dict[str, str]] = None
+) -> List[NominaTrabajador]:
+    """
+    Aplica las reglas a todos los trabajadores a la vez, con operaciones sobre arrays:
+    - Horas del registro: horas_totales o, si falta, la diferencia entre hora_fin y hora_inicio
+    - Extra diarias: lo que pasa de umbral_diario cada día
+    - Extra semanales: horas ordinarias (ya sin las extra diarias) que pasan de umbral_semanal,
+      asignadas a los días en que se supera el umbral (lunes a domingo)
+    - Nocturnas: solape de hora_inicio-hora_fin con la franja nocturna (como mucho, las horas del registro)
+    - Fin de semana: horas en sábado, domingo o festivo
+    Las columnas deben cubrir las semanas completas del periodo (semanas_completas) para que el
+    umbral semanal tenga en cuenta los días de la semana fuera del periodo; en el resultado solo
+    cuentan los días entre desde y hasta.
+    """
+    nombres = nombres or {}
+    num_trabajadores = len(columnas.chat_ids)
+    if num_trabajadores == 0:
+        return []
+
+    inicio_semanas, fin_semanas = semanas_completas(desde, hasta)
+    dia0 = a_dia(inicio_semanas)
+    num_dias = (fin_semanas - inicio_semanas).days + 1
+    primer_dia, ultimo_dia = a_dia(desde) - dia0, a_dia(hasta) - dia0
+
+    dia = columnas.dia - dia0
+    dentro = (dia >= 0) & (dia < num_dias)
+    trabajador, dia = columnas.trabajador[dentro], dia[dentro]
+    inicio, fin = columnas.inicio[dentro], columnas.fin[dentro]
+    marcada_extra = columnas.marcada_extra[dentro]
+    duracion_tramo = np.nan_to_num((fin - inicio) / 60, nan=0.0)
+    horas = np.where(np.isnan(columnas.horas[dentro]), duracion_tramo, columnas.horas[dentro])
+    en_periodo = (dia >= primer_dia) & (dia <= ultimo_dia)
+
+    # Franja nocturna en minutos; si el inicio es posterior al fin, cruza la medianoche
+    noche_inicio = reglas.noche_inicio.hour * 60 + reglas.noche_inicio.minute
+    noche_fin = reglas.noche_fin.hour * 60 + reglas.noche_fin.minute
+    if noche_inicio > noche_fin:
+        nocturnas = _solape(inicio, fin, 0, noche_fin) + _solape(inicio, fin, noche_inicio, _MINUTOS_DIA)
+    else:
+        nocturnas = _solape(inicio, fin, noche_inicio, noche_fin)
+    nocturnas = np.minimum(np.nan_to_num(nocturnas / 60, nan=0.0), horas)
+
+    dia_absoluto = dia + dia0
+    festivo = np.isin(dia_absoluto, [a_dia(f) for f in reglas.festivos]) if reglas.festivos else False
+    fin_de_semana = ((dia_absoluto + _DESFASE_LUNES) % 7 >= 5) | festivo
+
+    # Rejilla trabajador x semana x día de la semana con las horas de cada día
+    horas_dia = np.bincount(
+        trabajador * num_dias + dia, weights=horas, minlength=num_trabajadores * num_dias
+    ).reshape(num_trabajadores, num_dias // 7, 7)
+    extra_diaria = np.maximum(horas_dia - reglas.umbral_diario, 0)
+    ordinaria = horas_dia - extra_diaria
+    exceso_semanal = np.maximum(np.cumsum(ordinaria, axis=2) - reglas.umbral_semanal, 0)
+    extra_semanal = np.diff(exceso_semanal, axis=2, prepend=0)
+    ordinaria = ordinaria - extra_semanal
+
+    # Del resto de la rejilla solo cuentan los días del periodo
+    mascara = np.zeros(num_dias, dtype=bool)
+    mascara[primer_dia:ultimo_dia + 1] = True
+    mascara = mascara.reshape(num_dias // 7, 7)
+
+    def por_dia(valores: np.ndarray) -> np.ndarray:
+        return (valores * mascara).sum(axis=(1, 2))
+
+    def por_registro(pesos: np.ndarray) -> np.ndarray:
+        return np.bincount(trabajador[en_periodo], weights=pesos[en_periodo], minlength=num_trabajadores)
+
+    totales = por_dia(horas_dia)
+    ordinarias = por_dia(ordinaria)
+    extra_diarias = por_dia(extra_diaria)
+    extra_semanales = por_dia(extra_semanal)
+    dias_trabajados = ((horas_dia > 0) & mascara).sum(axis=(1, 2))
+    registros = np.bincount(trabajador[en_periodo], minlength=num_trabajadores)
+    horas_nocturnas = por_registro(nocturnas)
+    horas_fin_de_semana = por_registro(np.where(fin_de_semana, horas, 0))
+    horas_marcadas = por_registro(np.where(marcada_extra, horas, 0))
+    extra = extra_diarias + extra_semanales
+    ponderadas = (
+        totales
+        + extra * reglas.prima_extra
+        + horas_nocturnas * reglas.prima_nocturna
+        + horas_fin_de_semana * reglas.prima_fin_de_semana
+    )
+
+    resultado = []
+    for i in np.flatnonzero(registros):
+        chat_id = columnas.chat_ids[i]
+        resultado.append(NominaTrabajador(
+            chat_id=chat_id,
+            nombre=nombres.get(chat_id),
+            registros=int(registros[i]),
+            dias_trabajados=int(dias_trabajados[i]),
+            horas_totales=round(float(totales[i]), 2),
+            horas_ordinarias=round(float(ordinarias[i]), 2),
+            horas_extra_diarias=round(float(extra_diarias[i]), 2),
+            horas_extra_semanales=round(float(extra_semanales[i]), 2),
+            horas_extra=round(float(extra[i]), 2),
+            horas_nocturnas=round(float(horas_nocturnas[i]), 2),
+            horas_fin_de_semana=round(float(horas_fin_de_semana[i]), 2),
+            horas_marcadas_extra=round(float(horas_marcadas[i]), 2),
+            horas_ponderadas=round(float(ponderadas[i]), 2),
+        ))
+    return resultado
+
+def calcular_nomina(
+    db: Session,
+    desde: date,
+    hasta: date,
+    reglas: ReglasNomina,
+    chat_ids: Optional[List[str]] = None
+) -> ResultadoNomina:
+    """Carga las horas de las semanas completas del periodo y calcula el desglose de cada trabajador"""
+    inicio = reloj.perf_counter()
+    columnas = cargar_horas(db, *semanas_completas(desde, hasta), chat_ids=chat_ids)
+    nombres = {}
+    if len(columnas.chat_ids):
+        cursor = db.connection().connection.cursor()
+        try:
+            cursor.execute(
+                "SELECT chat_id::text, nombre::text FROM trabajadores WHERE chat_id = ANY(%(chat_ids)s::citext[])",
+                {"chat_ids": list(columnas.chat_ids)}
+            )
+            nombres = dict(cursor.fetchall())
+        finally:
+            cursor.close()
+    trabajadores = calcular(columnas, desde, hasta, reglas, nombres)
+    duracion = reloj.perf_counter() - inicio
+    logger.info(f"Nómina {desde}..{hasta}: {len(columnas.dia)} registros, {len(trabajadores)} trabajadores en {duracion:.3f}s")
+    return ResultadoNomina(desde=desde, hasta=hasta, reglas=reglas, trabajadores=trabajadores, duracion_segundos=round(duracion, 4))
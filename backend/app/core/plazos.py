@@ -0,0 +1,202 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from typing import Dict, Optional
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as TimeoutPool
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.admision import clasificar, LECTURAS, ESCRITURAS, INFORMES, LOGIN
+from app.core.environment import PLAZO_LECTURAS_MS, PLAZO_ESCRITURAS_MS, PLAZO_INFORMES_MS, PLAZO_LOGIN_MS
+from app.core.metricas import incrementar
+from app.db.database import engine, replica_engine, SessionLocal, SessionReplica
+
+logger = logging.getLogger(__name__)
+
+# Presupuesto de tiempo de cada tipo de ruta (0 = sin límite)
+PRESUPUESTOS_MS = {
+    LECTURAS: PLAZO_LECTURAS_MS,
+    ESCRITURAS: PLAZO_ESCRITURAS_MS,
+    INFORMES: PLAZO_INFORMES_MS,
+    LOGIN: PLAZO_LOGIN_MS,
+}
+
+# SQLSTATE query_canceled: statement_timeout agotado o cancelación explícita
+_QUERY_CANCELED = "57014"
+
+# Conexión DBAPI en uso -> plazo de la petición que la tiene. Se borra al devolverla al pool,
+# así una cancelación nunca alcanza a una conexión que ya usa otra petición.
+_propietarios: Dict[int, "PlazoPeticion"] = {}
+_lock = threading.Lock()
+
+class PlazoPeticion:
+    """Plazo de una petición: límite de tiempo, y conexiones a cancelar si el cliente se desconecta"""
+
+    __slots__ = ("clase", "presupuesto_ms", "limite", "agotado", "cancelada", "_conexiones")
+
+    def __init__(self, clase: str, presupuesto_ms: int):
+        self.clase = clase
+        self.presupuesto_ms = presupuesto_ms
+        self.limite = time.monotonic() + presupuesto_ms / 1000
+        self.agotado = False
+        self.cancelada = False
+        self._conexiones = {}
+
+    def restante_ms(self) -> int:
+        # Mínimo 1 ms: con el plazo ya vencido, la primera sentencia falla (0 desactivaría el límite)
+        return max(int((self.limite - time.monotonic()) * 1000), 1)
+
+    def cancelar(self):
+        """Cancela las consultas en curso de la petición (el cliente se ha ido)"""
+        with _lock:
+            self.cancelada = True
+            conexiones = [c for k, c in self._conexiones.items() if _propietarios.get(k) is self]
+        for conexion in conexiones:
+            try:
+                conexion.cancel()
+            except Exception as e:
+                logger.warning(f"No se pudo cancelar la consulta: {e}")
+        if conexiones:
+            incrementar("plazos_consultas_canceladas")
+
+def _al_empezar(session, transaction, connection):
+    """Cada transacción de la petición se limita al tiempo que le queda (propagación del plazo)"""
+    plazo = session.info.get("plazo")
+    if plazo is None:
+        return
+    dbapi = connection.connection.dbapi_connection
+    with _lock:
+        _propietarios[id(dbapi)] = plazo
+        plazo._conexiones[id(dbapi)] = dbapi
+    # Si el cliente ya se fue, las transacciones nuevas fallan enseguida
+    milisegundos = 1 if plazo.cancelada else plazo.restante_ms()
+    connection.exec_driver_sql(f"SET LOCAL statement_timeout = {milisegundos}")
+
+def _al_devolver(dbapi_connection, connection_record):
+    with _lock:
+        plazo = _propietarios.pop(id(dbapi_connection), None)
+        if plazo is not None:
+            plazo._conexiones.pop(id(dbapi_connection), None)
+
+def _al_fallar(contexto):
+    """Marca el plazo como agotado si Postgres canceló la sentencia"""
+    if getattr(contexto.original_exception, "pgcode", None) != _QUERY_CANCELED or contexto.connection is None:
+        return
+    try:
+        dbapi = contexto.connection.connection.dbapi_connection
+    except Exception:
+        return
+    with _lock:
+        plazo = _propietarios.get(id(dbapi))
+    if plazo is not None and not plazo.cancelada:
+        plazo.agotado = True
+
+for _sesiones in (SessionLocal, SessionReplica):
+    if _sesiones is not None:
+        event.listen(_sesiones, "after_begin", _al_empezar)
+for _motor in (engine, replica_engine):
+    if _motor is not None:
+        event.listen(_motor, "checkin", _al_devolver)
+        event.listen(_motor, "handle_error", _al_fallar)
+
+class PlazosPeticion:
+    """
+    Middleware ASGI de plazos por petición:
+    - Cada tipo de ruta (lecturas, escrituras, informes, login) tiene un presupuesto de tiempo; las
+      sesiones de get_db aplican lo que queda con SET LOCAL statement_timeout en cada transacción
+    - Si el cliente se desconecta, se cancelan sus consultas en curso (cancel de libpq)
+    - Un statement_timeout se devuelve como 504 y la falta de conexiones en el pool como 503,
+      con un cuerpo JSON con 'codigo', aunque el endpoint haya convertido el error en un 500
+    Los streams (SSE) no tienen plazo: duran lo que el cliente quiera.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        clase = clasificar(scope["method"], scope["path"]) if scope["type"] == "http" else None
+        presupuesto = PRESUPUESTOS_MS.get(clase, 0)
+        if not presupuesto or scope["path"].endswith("/stream"):
+            await self.app(scope, receive, send)
+            return
+
+        plazo = PlazoPeticion(clase, presupuesto)
+        scope.setdefault("state", {})["plazo"] = plazo
+        estado = {"iniciada": False, "terminada": False, "sustituida": False, "desconectado": False}
+
+        # Se leen los mensajes del cliente en una tarea aparte para enterarse de la desconexión aunque
+        # el endpoint no lea el cuerpo. La cola de tamaño 1 mantiene el control de flujo de las subidas.
+        cola: asyncio.Queue = asyncio.Queue(maxsize=1)
+
+        async def bombear():
+            while True:
+                mensaje = await receive()
+                if mensaje["type"] == "http.disconnect":
+                    if not estado["terminada"]:
+                        estado["desconectado"] = True
+                        incrementar("plazos_desconexiones")
+                        await asyncio.to_thread(plazo.cancelar)
+                    await cola.put(mensaje)
+                    return
+                await cola.put(mensaje)
+
+        async def recibir() -> Message:
+            if estado["desconectado"] and cola.empty():
+                return {"type": "http.disconnect"}
+            return await cola.get()
+
+        async def enviar(mensaje: Message):
+            if mensaje["type"] == "http.response.start":
+                estado["iniciada"] = True
+                if mensaje["status"] == 500 and plazo.agotado:
+                    # El endpoint capturó el error de la base de datos y lo convirtió en un 500 genérico
+                    estado["sustituida"] = True
+                    await _responder_agotado(send, plazo)
+                    return
+            elif mensaje["type"] == "http.response.body" and not mensaje.get("more_body", False):
+                estado["terminada"] = True
+            if not estado["sustituida"]:
+                await send(mensaje)
+
+        bomba = asyncio.create_task(bombear())
+        try:
+            await self.app(scope, recibir, enviar)
+        except Exception as e:
+            if estado["desconectado"]:
+                # Nadie espera ya la respuesta
+                return
+            if estado["iniciada"]:
+                raise
+            if plazo.agotado or getattr(getattr(e, "orig", None), "pgcode", None) == _QUERY_CANCELED:
+                await _responder_agotado(send, plazo)
+            elif isinstance(e, TimeoutPool):
+                incrementar("plazos_pool_agotado")
+                await _responder(send, 503, {
+                    "detail": "No hay conexiones a la base de datos disponibles, vuelve a intentarlo",
+                    "codigo": "sin_conexiones",
+                }, retry_after=1)
+            else:
+                raise
+        finally:
+            estado["terminada"] = True
+            bomba.cancel()
+
+async def _responder_agotado(send: Send, plazo: PlazoPeticion):
+    incrementar(f"plazos_agotados_{plazo.clase}")
+    await _responder(send, 504, {
+        "detail": "La consulta ha superado el tiempo máximo de la petición",
+        "codigo": "tiempo_agotado",
+        "clase": plazo.clase,
+        "presupuesto_ms": plazo.presupuesto_ms,
+    })
+
+async def _responder(send: Send, estado_http: int, datos: dict, retry_after: Optional[int] = None):
+    cuerpo = json.dumps(datos).encode()
+    cabeceras = [(b"content-type", b"application/json"), (b"content-length", str(len(cuerpo)).encode())]
+    if retry_after:
+        cabeceras.append((b"retry-after", str(retry_after).encode()))
+    await send({"type": "http.response.start", "status": estado_http, "headers": cabeceras})
+    await send({"type": "http.response.body", "body": cuerpo})
@@ -0,0 +1,141 @@
+import logging
+import time
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.environment import PROPAGACION_TAMANO_LOTE, PROPAGACION_PAUSA_MS
+from app.core.cache_informes import incrementar_versiones, CLAVE_NOMBRES
+from app.core.trabajos import (
+    registrar_trabajo,
+    encolar_trabajo,
+    informar_progreso,
+    progreso_trabajo,
+    ESTADO_COMPLETADO
+)
+from app.models.trabajos import Trabajo
+
+logger = logging.getLogger(__name__)
+
+TIPO_TRABAJO = "propagacion"
+
+# Copias desnormalizadas que hay que mantener al renombrar una entidad:
+# tipo -> (tabla, columna con el nombre copiado, columna de filtro, clave primaria)
+DESTINOS_PROPAGACION = {
+    "trabajador": ("horas", "nombre_trabajador", "chat_id", "id_movimiento"),
+    "partida": ("horas", "nombre_partida", "id_partida", "id_movimiento"),
+    "obra": ("partidas", "nombre_obra", "id_obra", "id_partida"),
+}
+# Nombre vigente de cada entidad: tipo -> (tabla, columna del nombre, clave)
+ORIGENES_PROPAGACION = {
+    "trabajador": ("trabajadores", "nombre", "chat_id"),
+    "partida": ("partidas", "nombre_partida", "id_partida"),
+    "obra": ("obras", "nombre_obra", "id_obra"),
+}
+
+def encolar_propagacion(db: Session, tipo: str, id_entidad, nuevo_nombre: str, usuario=None, confirmar: bool = True) -> int:
+    """
+    Encola la propagación de un nombre como trabajo de la cola (tabla trabajos) y devuelve su ID.
+    El progreso se guarda en la fila del trabajo, así que se puede consultar desde cualquier worker
+    y la propagación se reintenta o se retoma si el proceso cae a mitad.
+    Con confirmar=False el trabajo queda en la transacción del cambio de nombre y se confirma con él.
+    """
+    if tipo not in DESTINOS_PROPAGACION:
+        raise ValueError(f"Tipo de propagación desconocido: {tipo}")
+    parametros = {"tipo": tipo, "id_entidad": str(id_entidad), "nuevo_nombre": nuevo_nombre}
+    return encolar_trabajo(db, TIPO_TRABAJO, parametros, usuario, confirmar=confirmar).id
+
+def _estado_propagacion(trabajo: Trabajo) -> dict:
+    progreso = trabajo.resultado or {}
+    return {
+        "id": trabajo.id,
+        "tipo": trabajo.parametros["tipo"],
+        "id_entidad": trabajo.parametros["id_entidad"],
+        "nuevo_nombre": trabajo.parametros["nuevo_nombre"],
+        "estado": "completada" if trabajo.estado == ESTADO_COMPLETADO else trabajo.estado,
+        "intentos": trabajo.intentos,
+        "filas_actualizadas": progreso.get("filas_actualizadas", 0),
+        "lotes": progreso.get("lotes", 0),
+        "inicio": trabajo.iniciado,
+        "fin": trabajo.finalizado,
+        "error": trabajo.error,
+    }
+
+def obtener_tarea_propagacion(db: Session, tarea_id: int) -> Optional[dict]:
+    """Devuelve el estado de la propagación, o None si no existe"""
+    trabajo = db.query(Trabajo).filter(Trabajo.id == tarea_id, Trabajo.tipo == TIPO_TRABAJO).first()
+    return _estado_propagacion(trabajo) if trabajo else None
+
+def listar_tareas_propagacion(db: Session, limite: int = 100) -> List[dict]:
+    """Devuelve el estado de las últimas propagaciones (las más recientes primero)"""
+    trabajos = db.query(Trabajo).filter(Trabajo.tipo == TIPO_TRABAJO).order_by(Trabajo.id.desc()).limit(limite)
+    return [_estado_propagacion(trabajo) for trabajo in trabajos]
+
+@registrar_trabajo(TIPO_TRABAJO, max_concurrencia=2)
+def _trabajo_propagacion(db: Session, parametros: dict, usuario):
+    """
+    Propaga el nombre a las copias desnormalizadas en lotes pequeños.
+    Cada lote es una transacción corta (UPDATE ... WHERE pk IN (SELECT ... LIMIT n)),
+    así no se mantienen bloqueos largos sobre la tabla horas. El progreso se guarda en la
+    fila del trabajo en la misma transacción que cada lote.
+    Cada lote toma el nombre de la tabla de la entidad (JOIN en la propia sentencia), no de los
+    parámetros ni de una lectura previa: si hay varios cambios de nombre seguidos, o una propagación
+    antigua se reintenta tarde, todas escriben el nombre vigente y las copias acaban con el último.
+    """
+    tipo = parametros["tipo"]
+    tabla, columna_nombre, columna_filtro, clave = DESTINOS_PROPAGACION[tipo]
+    tabla_origen, columna_origen, clave_origen = ORIGENES_PROPAGACION[tipo]
+    id_entidad = int(parametros["id_entidad"]) if columna_filtro != "chat_id" else parametros["id_entidad"]
+
+    progreso = {"filas_actualizadas": 0, "lotes": 0, **progreso_trabajo(db)}
+    # El nombre de la entidad ya ha cambiado: invalidar los informes aunque no haya copias que actualizar
+    incrementar_versiones(db, [CLAVE_NOMBRES])
+    informar_progreso(db, progreso)
+    db.commit()
+
+    # Copias de la entidad que no tienen su nombre vigente (ninguna si la entidad ya no existe)
+    desactualizadas = f"""
+        SELECT d.{clave} FROM {tabla} d
+        JOIN {tabla_origen} o ON o.{clave_origen} = :id_entidad
+        WHERE d.{columna_filtro} = :id_entidad
+          AND d.{columna_nombre} IS DISTINCT FROM o.{columna_origen}
+    """
+    sentencia = text(f"""
+        UPDATE {tabla} SET {columna_nombre} = o.{columna_origen}
+        FROM {tabla_origen} o
+        WHERE o.{clave_origen} = :id_entidad
+          AND {tabla}.{clave} IN (
+            {desactualizadas}
+            ORDER BY d.{clave}
+            LIMIT :tamano
+            FOR UPDATE OF d SKIP LOCKED
+        )
+    """)
+    pendientes = text(f"{desactualizadas} LIMIT 1")
+    valores = {"id_entidad": id_entidad, "tamano": PROPAGACION_TAMANO_LOTE}
+
+    while True:
+        resultado = db.execute(sentencia, valores)
+        if resultado.rowcount > 0:
+            progreso["filas_actualizadas"] += resultado.rowcount
+            progreso["lotes"] += 1
+            # Los informes cacheados incluyen los nombres: invalidarlos en la misma transacción del lote
+            incrementar_versiones(db, [CLAVE_NOMBRES])
+            informar_progreso(db, progreso)
+        db.commit()
+        if resultado.rowcount == 0:
+            # Puede haber filas bloqueadas por otra transacción (SKIP LOCKED): comprobar antes de terminar
+            hay_pendientes = db.execute(pendientes, valores).first()
+            db.commit()
+            if not hay_pendientes:
+                break
+            # Sigue bloqueada: renovar el bloqueo del trabajo mientras se espera
+            informar_progreso(db, progreso)
+            db.commit()
+
+        if PROPAGACION_PAUSA_MS > 0:
+            time.sleep(PROPAGACION_PAUSA_MS / 1000)
+
+    logger.info(f"Propagación {tipo} {id_entidad} completada: {progreso['filas_actualizadas']} filas en {progreso['lotes']} lotes")
+    return progreso
@@ -0,0 +1,348 @@
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Optional
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.environment import (
+    TRABAJOS_CONCURRENCIA,
+    TRABAJOS_INTERVALO_SEGUNDOS,
+    TRABAJOS_BLOQUEO_SEGUNDOS
+)
+from app.db.database import SessionLocal, engine
+from app.models.trabajos import Trabajo
+from app.models.usuarios import Usuario
+
+logger = logging.getLogger(__name__)
+
+ESTADO_PENDIENTE = "pendiente"
+ESTADO_EN_CURSO = "en_curso"
+ESTADO_COMPLETADO = "completado"
+ESTADO_ERROR = "error"
+
+# Funciones que ejecutan cada tipo de trabajo: (db, parametros, usuario) -> resultado serializable
+_manejadores: Dict[str, Callable] = {}
+# Límite de trabajos simultáneos por tipo en cada proceso (por defecto, la concurrencia global)
+_limites_por_tipo: Dict[str, int] = {}
+# Clave de Session.info con el ID del trabajo que se está ejecutando en la sesión
+_INFO_TRABAJO = "trabajo_id"
+# Advisory lock que elige el único worker de la API que ejecuta el runner y las tareas periódicas
+_CLAVE_BLOQUEO_SEGUNDO_PLANO = 703401
+_INTERVALO_ELECCION_SEGUNDOS = 30
+
+def registrar_trabajo(tipo: str, max_concurrencia: Optional[int] = None):
+    """Decorador para registrar la función que ejecuta un tipo de trabajo"""
+    def decorador(funcion: Callable):
+        _manejadores[tipo] = funcion
+        if max_concurrencia is not None:
+            _limites_por_tipo[tipo] = max_concurrencia
+        return funcion
+    return decorador
+
+def encolar_trabajo(
+    db: Session, tipo: str, parametros: dict, usuario: Usuario, max_intentos: int = 3, confirmar: bool = True
+) -> Trabajo:
+    """
+    Crea un trabajo pendiente y lo confirma; el runner lo recogerá en cuanto tenga hueco.
+    Con confirmar=False solo se envía a la base de datos (flush) y queda en la transacción en curso:
+    el trabajo se confirma, o se descarta, junto con la escritura que lo origina.
+    """
+    if tipo not in _manejadores:
+        raise ValueError(f"Tipo de trabajo desconocido: {tipo}")
+
+    trabajo = Trabajo(
+        tipo=tipo,
+        parametros=jsonable_encoder(parametros),
+        estado=ESTADO_PENDIENTE,
+        max_intentos=max_intentos,
+        id_usuario=usuario.id if usuario else None
+    )
+    db.add(trabajo)
+    if not confirmar:
+        db.flush()
+        return trabajo
+    db.commit()
+    db.refresh(trabajo)
+    return trabajo
+
+def progreso_trabajo(db: Session) -> dict:
+    """Último progreso guardado del trabajo en curso (para continuar la cuenta en un reintento)"""
+    trabajo_id = db.info.get(_INFO_TRABAJO)
+    if trabajo_id is None:
+        return {}
+    resultado = db.execute(text("SELECT resultado FROM trabajos WHERE id = :id"), {"id": trabajo_id}).scalar()
+    return resultado or {}
+
+def informar_progreso(db: Session, progreso: dict):
+    """
+    Guarda el progreso del trabajo en curso en su fila (columna resultado) y renueva su bloqueo para
+    que no se dé por abandonado. No hace commit: se confirma con la transacción del manejador, así el
+    progreso guardado corresponde siempre a lo ya confirmado. Fuera de un trabajo no hace nada.
+    """
+    trabajo_id = db.info.get(_INFO_TRABAJO)
+    if trabajo_id is None:
+        return
+    db.execute(text("""
+        UPDATE trabajos
+        SET resultado = CAST(:progreso AS jsonb), bloqueado_hasta = now() + make_interval(secs => :bloqueo)
+        WHERE id = :id
+    """), {"progreso": json.dumps(jsonable_encoder(progreso)), "bloqueo": TRABAJOS_BLOQUEO_SEGUNDOS, "id": trabajo_id})
+
+def reclamar_trabajo(db: Session, tipos_excluidos=()) -> Optional[Trabajo]:
+    """
+    Reclama el siguiente trabajo disponible con FOR UPDATE SKIP LOCKED, de modo que varios
+    procesos pueden consumir la cola sin bloquearse entre sí. También recupera trabajos
+    en curso cuyo bloqueo ha caducado (proceso caído a mitad de ejecución) si les quedan
+    intentos; los que ya no tienen se marcan como error en lugar de volver a ejecutarse.
+    """
+    db.execute(text("""
+        UPDATE trabajos
+        SET estado = :error, bloqueado_hasta = NULL, finalizado = now(),
+            error = COALESCE(error, 'El trabajo se interrumpió y no le quedan intentos')
+        WHERE estado = :en_curso AND bloqueado_hasta < now() AND intentos >= max_intentos
+    """), {"error": ESTADO_ERROR, "en_curso": ESTADO_EN_CURSO})
+
+    fila = db.execute(text("""
+        SELECT id FROM trabajos
+        WHERE (
+                (estado = :pendiente AND disponible_desde <= now())
+             OR (estado = :en_curso AND bloqueado_hasta < now() AND intentos < max_intentos)
+        )
+          AND NOT (tipo = ANY(CAST(:excluidos AS varchar[])))
+        ORDER BY disponible_desde, id
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    """), {
+        "pendiente": ESTADO_PENDIENTE,
+        "en_curso": ESTADO_EN_CURSO,
+        "excluidos": list(tipos_excluidos)
+    }).first()
+
+    if not fila:
+        db.commit()
+        return None
+
+    trabajo = db.query(Trabajo).filter(Trabajo.id == fila.id).first()
+    trabajo.estado = ESTADO_EN_CURSO
+    trabajo.intentos += 1
+    trabajo.iniciado = datetime.now()
+    trabajo.bloqueado_hasta = datetime.now() + timedelta(seconds=TRABAJOS_BLOQUEO_SEGUNDOS)
+    db.commit()
+    db.refresh(trabajo)
+    return trabajo
+
+def _cerrar_intento(db: Session, trabajo_id: int, intentos: int, valores: dict) -> bool:
+    """
+    Guarda el final de un intento solo si este runner sigue siendo su dueño: si el bloqueo caducó y
+    otro runner volvió a reclamar el trabajo, el intento ya no es el vigente y no se toca la fila
+    """
+    filas = db.query(Trabajo).filter(
+        Trabajo.id == trabajo_id,
+        Trabajo.estado == ESTADO_EN_CURSO,
+        Trabajo.intentos == intentos
+    ).update(valores, synchronize_session=False)
+    db.commit()
+    if not filas:
+        logger.warning(f"Trabajo {trabajo_id}: el intento {intentos} ya no es el vigente, no se guarda su resultado")
+    return filas > 0
+
+def ejecutar_trabajo(trabajo_id: int, intentos: Optional[int] = None):
+    """
+    Ejecuta un trabajo ya reclamado (en su intento número `intentos`) y guarda su resultado, o lo
+    reprograma si falla y le quedan intentos
+    """
+    db = SessionLocal()
+    try:
+        trabajo = db.query(Trabajo).filter(Trabajo.id == trabajo_id).first()
+        intentos = trabajo.intentos if intentos is None else intentos
+        tipo, max_intentos = trabajo.tipo, trabajo.max_intentos
+        manejador = _manejadores.get(trabajo.tipo)
+        usuario = db.query(Usuario).filter(Usuario.id == trabajo.id_usuario).first() if trabajo.id_usuario else None
+
+        try:
+            if manejador is None:
+                raise ValueError(f"No hay manejador registrado para el tipo '{trabajo.tipo}'")
+            db.info[_INFO_TRABAJO] = trabajo_id
+            resultado = manejador(db, trabajo.parametros, usuario)
+        except Exception as e:
+            db.rollback()
+            # Los errores de validación (HTTPException) no se arreglan reintentando
+            reintentable = not isinstance(e, HTTPException) and intentos < max_intentos
+            valores = {"error": e.detail if isinstance(e, HTTPException) else str(e), "bloqueado_hasta": None}
+            if reintentable:
+                valores.update(estado=ESTADO_PENDIENTE, disponible_desde=datetime.now() + timedelta(seconds=2 ** intentos))
+            else:
+                valores.update(estado=ESTADO_ERROR, finalizado=datetime.now())
+            if _cerrar_intento(db, trabajo_id, intentos, valores):
+                if reintentable:
+                    logger.warning(f"Trabajo {trabajo_id} ({tipo}) falló, reintento {intentos}/{max_intentos}: {e}")
+                else:
+                    logger.error(f"Trabajo {trabajo_id} ({tipo}) falló definitivamente: {e}")
+            return
+
+        if _cerrar_intento(db, trabajo_id, intentos, {
+            "resultado": jsonable_encoder(resultado),
+            "estado": ESTADO_COMPLETADO,
+            "error": None,
+            "bloqueado_hasta": None,
+            "finalizado": datetime.now()
+        }):
+            logger.info(f"Trabajo {trabajo_id} ({tipo}) completado")
+    finally:
+        db.close()
+
+class RunnerTrabajos:
+    """
+    Consume la cola de trabajos con un límite de concurrencia global y por tipo.
+    Puede ejecutarse dentro de la API (evento de inicio) o en un proceso aparte (worker_trabajos.py).
+    """
+
+    def __init__(self, concurrencia: int = TRABAJOS_CONCURRENCIA, intervalo: float = TRABAJOS_INTERVALO_SEGUNDOS):
+        self.concurrencia = concurrencia
+        self.intervalo = intervalo
+        self._en_curso: Dict[int, str] = {}
+        self._tarea: Optional[asyncio.Task] = None
+        self._detener = asyncio.Event()
+
+    def _tipos_saturados(self):
+        conteo: Dict[str, int] = {}
+        for tipo in self._en_curso.values():
+            conteo[tipo] = conteo.get(tipo, 0) + 1
+        return [tipo for tipo, n in conteo.items() if n >= _limites_por_tipo.get(tipo, self.concurrencia)]
+
+    def _reclamar(self) -> Optional[Trabajo]:
+        db = SessionLocal()
+        try:
+            return reclamar_trabajo(db, self._tipos_saturados())
+        finally:
+            db.close()
+
+    async def _ejecutar(self, trabajo_id: int, intentos: int):
+        try:
+            await asyncio.to_thread(ejecutar_trabajo, trabajo_id, intentos)
+        finally:
+            self._en_curso.pop(trabajo_id, None)
+
+    async def ejecutar(self):
+        """Bucle principal: reclama trabajos mientras haya hueco y espera cuando la cola está vacía"""
+        logger.info(f"Runner de trabajos iniciado (concurrencia {self.concurrencia})")
+        while not self._detener.is_set():
+            trabajo = None
+            if len(self._en_curso) < self.concurrencia:
+                try:
+                    trabajo = await asyncio.to_thread(self._reclamar)
+                except Exception as e:
+                    logger.error(f"Error al reclamar trabajos: {e}")
+
+            if trabajo is not None:
+                self._en_curso[trabajo.id] = trabajo.tipo
+                asyncio.create_task(self._ejecutar(trabajo.id, trabajo.intentos))
+                continue
+
+            try:
+                await asyncio.wait_for(self._detener.wait(), timeout=self.intervalo)
+            except asyncio.TimeoutError:
+                pass
+
+    def iniciar(self):
+        self._tarea = asyncio.create_task(self.ejecutar())
+
+    async def detener(self):
+        self._detener.set()
+        if self._tarea is not None:
+            await self._tarea
+
+class EleccionSegundoPlano:
+    """
+    Con varios workers de Gunicorn, solo uno ejecuta el runner y las tareas periódicas: el que consigue
+    un advisory lock de sesión en Postgres. El resto lo vuelve a intentar cada `intervalo` segundos y
+    toma el relevo si el líder cae (al cerrarse su conexión, Postgres libera el bloqueo). El líder
+    comprueba su conexión en cada intervalo y, si la pierde, detiene su trabajo en segundo plano.
+    """
+
+    def __init__(
+        self,
+        iniciar: Callable[[], None],
+        detener: Callable[[], Awaitable[None]],
+        intervalo: float = _INTERVALO_ELECCION_SEGUNDOS
+    ):
+        self._iniciar = iniciar
+        self._detener_trabajo = detener
+        self.intervalo = intervalo
+        self._conexion = None
+        self._tarea: Optional[asyncio.Task] = None
+        self._detener = asyncio.Event()
+
+    @property
+    def es_lider(self) -> bool:
+        return self._conexion is not None
+
+    def _intentar_bloqueo(self) -> bool:
+        conexion = engine.connect()
+        try:
+            obtenido = conexion.execute(
+                text("SELECT pg_try_advisory_lock(:clave)"), {"clave": _CLAVE_BLOQUEO_SEGUNDO_PLANO}
+            ).scalar()
+            conexion.commit()
+        except Exception:
+            conexion.close()
+            raise
+        if obtenido:
+            self._conexion = conexion
+        else:
+            conexion.close()
+        return bool(obtenido)
+
+    def _comprobar_conexion(self):
+        self._conexion.execute(text("SELECT 1"))
+        self._conexion.commit()
+
+    def _liberar(self):
+        conexion, self._conexion = self._conexion, None
+        if conexion is None:
+            return
+        try:
+            conexion.execute(text("SELECT pg_advisory_unlock(:clave)"), {"clave": _CLAVE_BLOQUEO_SEGUNDO_PLANO})
+            conexion.commit()
+            conexion.close()
+        except Exception:
+            # Conexión perdida: el bloqueo ya lo ha liberado Postgres
+            conexion.invalidate()
+
+    async def _dejar_de_ser_lider(self):
+        await self._detener_trabajo()
+        await asyncio.to_thread(self._liberar)
+
+    async def ejecutar(self):
+        while not self._detener.is_set():
+            try:
+                if not self.es_lider:
+                    if await asyncio.to_thread(self._intentar_bloqueo):
+                        logger.info(f"Proceso {os.getpid()} elegido para el trabajo en segundo plano")
+                        self._iniciar()
+                else:
+                    await asyncio.to_thread(self._comprobar_conexion)
+            except Exception as e:
+                logger.error(f"Error en la elección del trabajo en segundo plano: {e}")
+                if self.es_lider:
+                    await self._dejar_de_ser_lider()
+            try:
+                await asyncio.wait_for(self._detener.wait(), timeout=self.intervalo)
+            except asyncio.TimeoutError:
+                pass
+        if self.es_lider:
+            await self._dejar_de_ser_lider()
+
+    def iniciar(self):
+        self._tarea = asyncio.create_task(self.ejecutar())
+
+    async def detener(self):
+        self._detener.set()
+        if self._tarea is not None:
+            await self._tarea
@@ -0,0 +1,118 @@
+import asyncio
+import logging
+import time
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.core.environment import VISTAS_REFRESCO_MINUTOS
+from app.core.trabajos import registrar_trabajo, encolar_trabajo, ESTADO_PENDIENTE, ESTADO_EN_CURSO
+from app.db.database import SessionLocal, engine
+from app.models.trabajos import Trabajo
+
+logger = logging.getLogger(__name__)
+
+VISTA_OBRAS_MES = "mv_horas_obra_mes"
+VISTA_PARTIDAS_MES = "mv_horas_partida_mes"
+VISTAS = [VISTA_OBRAS_MES, VISTA_PARTIDAS_MES]
+
+# Clave del advisory lock que evita refrescos simultáneos desde varios procesos
+_CLAVE_BLOQUEO_REFRESCO = 703201
+
+# Definición de las vistas. id_obra/id_partida se normalizan a 0 (sin obra/partida) para que
+# el índice único cubra todas las filas, requisito de REFRESH MATERIALIZED VIEW CONCURRENTLY.
+DDL_VISTAS = [
+    f"""
+    CREATE MATERIALIZED VIEW IF NOT EXISTS {VISTA_OBRAS_MES} AS
+    SELECT
+        COALESCE(h.id_obra, 0) AS id_obra,
+        EXTRACT(YEAR FROM h.fecha)::integer AS año,
+        EXTRACT(MONTH FROM h.fecha)::integer AS mes,
+        COUNT(*) AS registros,
+        COUNT(DISTINCT h.chat_id) AS trabajadores,
+        COALESCE(SUM(h.horas_totales), 0) AS horas_totales,
+        COALESCE(SUM(h.horas_totales) FILTER (WHERE h.es_extra), 0) AS horas_extra,
+        COALESCE(SUM(h.horas_totales) FILTER (WHERE h.es_regularizacion), 0) AS horas_regularizacion
+    FROM horas h
+    GROUP BY 1, 2, 3
+    """,
+    f"CREATE UNIQUE INDEX IF NOT EXISTS ux_{VISTA_OBRAS_MES} ON {VISTA_OBRAS_MES} (id_obra, año, mes)",
+    f"""
+    CREATE MATERIALIZED VIEW IF NOT EXISTS {VISTA_PARTIDAS_MES} AS
+    SELECT
+        COALESCE(h.id_obra, 0) AS id_obra,
+        COALESCE(h.id_partida, 0) AS id_partida,
+        EXTRACT(YEAR FROM h.fecha)::integer AS año,
+        EXTRACT(MONTH FROM h.fecha)::integer AS mes,
+        COUNT(*) AS registros,
+        COUNT(DISTINCT h.chat_id) AS trabajadores,
+        COALESCE(SUM(h.horas_totales), 0) AS horas_totales,
+        COALESCE(SUM(h.horas_totales) FILTER (WHERE h.es_extra), 0) AS horas_extra,
+        COALESCE(SUM(h.horas_totales) FILTER (WHERE h.es_regularizacion), 0) AS horas_regularizacion
+    FROM horas h
+    GROUP BY 1, 2, 3, 4
+    """,
+    f"CREATE UNIQUE INDEX IF NOT EXISTS ux_{VISTA_PARTIDAS_MES} ON {VISTA_PARTIDAS_MES} (id_obra, id_partida, año, mes)",
+]
+
+def asegurar_vistas(bind: Engine = engine):
+    """Crea las vistas materializadas y sus índices únicos si no existen"""
+    with bind.begin() as conexion:
+        for sentencia in DDL_VISTAS:
+            conexion.execute(text(sentencia))
+
+def refrescar_vistas(bind: Engine = engine) -> dict:
+    """
+    Refresca las vistas con REFRESH MATERIALIZED VIEW CONCURRENTLY (las lecturas no se bloquean)
+    y registra la hora de refresco. Si otro proceso ya está refrescando, no hace nada.
+    """
+    duraciones = {}
+    with bind.connect().execution_options(isolation_level="AUTOCOMMIT") as conexion:
+        adquirido = conexion.execute(
+            text("SELECT pg_try_advisory_lock(:clave)"), {"clave": _CLAVE_BLOQUEO_REFRESCO}
+        ).scalar()
+        if not adquirido:
+            logger.info("Otro proceso está refrescando las vistas materializadas, se omite")
+            return {"omitido": True}
+        try:
+            for vista in VISTAS:
+                inicio = time.perf_counter()
+                conexion.execute(text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {vista}"))
+                conexion.execute(text("""
+                    INSERT INTO refrescos_vistas (vista, refrescado) VALUES (:vista, now())
+                    ON CONFLICT (vista) DO UPDATE SET refrescado = EXCLUDED.refrescado
+                """), {"vista": vista})
+                duraciones[vista] = round(time.perf_counter() - inicio, 3)
+                logger.info(f"Vista {vista} refrescada en {duraciones[vista]}s")
+        finally:
+            conexion.execute(text("SELECT pg_advisory_unlock(:clave)"), {"clave": _CLAVE_BLOQUEO_REFRESCO})
+    return {"omitido": False, "duraciones": duraciones}
+
+@registrar_trabajo("refrescar_vistas", max_concurrencia=1)
+def _trabajo_refrescar_vistas(db: Session, parametros: dict, usuario):
+    return refrescar_vistas()
+
+def encolar_refresco(db: Session, usuario=None) -> Trabajo:
+    """Encola un refresco salvo que ya haya uno pendiente o en curso (devuelve ese en tal caso)"""
+    existente = db.query(Trabajo).filter(
+        Trabajo.tipo == "refrescar_vistas",
+        Trabajo.estado.in_([ESTADO_PENDIENTE, ESTADO_EN_CURSO])
+    ).first()
+    if existente:
+        return existente
+    return encolar_trabajo(db, "refrescar_vistas", {}, usuario, max_intentos=2)
+
+async def programar_refresco_periodico():
+    """Encola un refresco cada VISTAS_REFRESCO_MINUTOS minutos (lo ejecuta la cola de trabajos)"""
+    if VISTAS_REFRESCO_MINUTOS <= 0:
+        return
+    while True:
+        await asyncio.sleep(VISTAS_REFRESCO_MINUTOS * 60)
+        db = SessionLocal()
+        try:
+            await asyncio.to_thread(encolar_refresco, db)
+        except Exception as e:
+            logger.error(f"No se pudo programar el refresco de las vistas: {e}")
+        finally:
+            db.close()
@@ -1,7 +1,25 @@
-from sqlalchemy import create_engine, MetaData
+import logging
+import threading
+import time
+from fastapi import Request
+from sqlalchemy import create_engine, MetaData, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from app.core.environment import DATABASE_URL
+from app.core.environment import (
+    DATABASE_URL,
+    DATABASE_REPLICA_URL,
+    REPLICA_MAX_LAG_SEGUNDOS,
+    DB_POOL_SIZE,
+    DB_MAX_OVERFLOW,
+    DB_POOL_TIMEOUT,
+    DB_POOL_RECYCLE
+)
+
+logger = logging.getLogger(__name__)
+
+# Cookie/cabecera que indican que el cliente acaba de escribir y debe leer del primario
+COOKIE_LECTURA_PRIMARIA = "leer_primario_hasta"
+CABECERA_LECTURA_PRIMARIA = "X-Leer-Primario"
 
 # Definir la convención de nombres para minúsculas
 naming_convention = {
@@ -20,7 +38,12 @@ metadata = MetaData(schema="public", naming_convention=naming_convention)
 engine = create_engine(
     DATABASE_URL,
     # Asegurarnos de que maneje correctamente las tablas en minúsculas
-    connect_args={"options": "-c search_path=public"}
+    connect_args={"options": "-c search_path=public"},
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=True
 )
 
 # Crear una sesión local
@@ -29,10 +52,87 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 # Base para los modelos
 Base = declarative_base(metadata=metadata)
 
+def _con_plazo(db, request: Request):
+    """Asocia a la sesión el plazo de la petición (middleware PlazosPeticion), si lo tiene"""
+    plazo = getattr(request.state, "plazo", None) if request is not None else None
+    if plazo is not None:
+        db.info["plazo"] = plazo
+    return db
+
 # Obtener una sesión de base de datos
-def get_db():
-    db = SessionLocal()
+def get_db(request: Request = None):
+    db = _con_plazo(SessionLocal(), request)
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
+
+# Motor y sesiones de la réplica de lectura (opcional)
+replica_engine = None
+SessionReplica = None
+if DATABASE_REPLICA_URL:
+    replica_engine = create_engine(
+        DATABASE_REPLICA_URL,
+        connect_args={"options": "-c search_path=public"},
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=True
+    )
+    SessionReplica = sessionmaker(autocommit=False, autoflush=False, bind=replica_engine)
+
+# Retraso de la réplica medido por última vez (se reutiliza unos segundos para no consultarlo en cada petición)
+_lag_replica = {"medido": 0.0, "segundos": None}
+_lag_lock = threading.Lock()
+_INTERVALO_MEDICION_LAG = 2.0
+
+def retraso_replica():
+    """
+    Devuelve el retraso de la réplica en segundos, o None si no está disponible.
+    Si ya ha reproducido todo lo recibido, el retraso es 0 aunque el primario esté inactivo.
+    """
+    ahora = time.monotonic()
+    with _lag_lock:
+        if ahora - _lag_replica["medido"] < _INTERVALO_MEDICION_LAG:
+            return _lag_replica["segundos"]
+        _lag_replica["medido"] = ahora
+
+    segundos = None
+    try:
+        with replica_engine.connect() as conexion:
+            segundos = conexion.execute(text("""
+                SELECT CASE
+                    WHEN NOT pg_is_in_recovery() THEN NULL
+                    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+                END
+            """)).scalar()
+            segundos = float(segundos) if segundos is not None else None
+    except Exception as e:
+        logger.warning(f"No se pudo medir el retraso de la réplica: {e}")
+
+    with _lag_lock:
+        _lag_replica["segundos"] = segundos
+    return segundos
+
+def _usar_replica(request: Request) -> bool:
+    if SessionReplica is None:
+        return False
+    # Lecturas propias tras una escritura reciente: siempre al primario
+    if request.headers.get(CABECERA_LECTURA_PRIMARIA):
+        return False
+    hasta = request.cookies.get(COOKIE_LECTURA_PRIMARIA)
+    if hasta and hasta.isdigit() and int(hasta) > time.time():
+        return False
+    segundos = retraso_replica()
+    return segundos is not None and segundos <= REPLICA_MAX_LAG_SEGUNDOS
+
+# Obtener una sesión de solo lectura (réplica si está configurada, al día y el cliente no acaba de escribir)
+def get_db_lectura(request: Request):
+    db = _con_plazo(SessionReplica() if _usar_replica(request) else SessionLocal(), request)
+    try:
+        yield db
+    finally:
+        db.close()
+
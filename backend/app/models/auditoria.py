@@ -0,0 +1,25 @@
+from sqlalchemy import Column, BigInteger, Integer, String, Date, TIMESTAMP, Index, func
+from sqlalchemy.dialects.postgresql import CITEXT, JSONB
+from app.db.database import Base
+
+class HoraAudit(Base):
+    """Modelo para la tabla horas_audit (historial de solo inserción de los cambios en horas)"""
+    __tablename__ = "horas_audit"
+    
+    id = Column(BigInteger, primary_key=True)
+    momento = Column(TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
+    accion = Column(String(20), nullable=False)  # creado/actualizado/eliminado
+    id_movimiento = Column(Integer, nullable=False)  # Sin clave foránea: el registro puede haberse eliminado
+    chat_id = Column(CITEXT, nullable=True)
+    fecha = Column(Date, nullable=True)
+    id_usuario = Column(Integer, nullable=True)
+    actor = Column(String(50), nullable=True)  # username de quien hizo el cambio
+    antes = Column(JSONB, nullable=True)  # Campos antes del cambio (solo los modificados en las actualizaciones)
+    despues = Column(JSONB, nullable=True)  # Campos después del cambio
+
+    __table_args__ = (
+        # BRIN: la tabla solo crece y momento va en el mismo orden que las filas físicas
+        Index("ix_horas_audit_momento", "momento", postgresql_using="brin"),
+        Index("ix_horas_audit_id_movimiento", "id_movimiento"),
+        Index("ix_horas_audit_chat_id_id", "chat_id", "id"),
+    )
@@ -3,5 +3,10 @@ from app.models.obras import Obra
 from app.models.partidas import Partida
 from app.models.horas import Hora
 from app.models.usuarios import Usuario
+from app.models.trabajos import Trabajo
+from app.models.versiones import VersionDatos
+from app.models.vistas import RefrescoVista
+from app.models.idempotencia import ClaveIdempotencia
+from app.models.auditoria import HoraAudit
 
 # Asegurarse de que todos los modelos estén importados aquí para que puedan ser descubiertos por Alembic 
\ No newline at end of file
@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Integer, SmallInteger, String, LargeBinary, TIMESTAMP, Index
+from app.db.database import Base
+
+class ClaveIdempotencia(Base):
+    """Modelo para la tabla claves_idempotencia (respuesta guardada de cada Idempotency-Key)"""
+    __tablename__ = "claves_idempotencia"
+    
+    clave = Column(String(100), primary_key=True)
+    id_usuario = Column(Integer, primary_key=True)
+    ruta = Column(String(50), nullable=False)
+    huella = Column(String(64), nullable=False)  # sha256 del cuerpo de la petición
+    estado_http = Column(SmallInteger, nullable=True)  # NULL mientras la petición está en curso
+    respuesta = Column(LargeBinary, nullable=True)  # Cuerpo JSON tal cual se devolvió
+    creado = Column(TIMESTAMP(timezone=True), nullable=False)
+    expira = Column(TIMESTAMP(timezone=True), nullable=False)
+
+    __table_args__ = (
+        Index("idx_claves_idempotencia_expira", "expira"),
+    )
@@ -0,0 +1,23 @@
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, TIMESTAMP
+from sqlalchemy.dialects.postgresql import JSONB
+from app.db.database import Base
+from datetime import datetime
+
+class Trabajo(Base):
+    """Modelo para la tabla trabajos (cola de trabajos en segundo plano)"""
+    __tablename__ = "trabajos"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    tipo = Column(String(50), nullable=False)
+    parametros = Column(JSONB, nullable=False, default=dict)
+    estado = Column(String(20), nullable=False, default="pendiente")  # pendiente/en_curso/completado/error
+    intentos = Column(Integer, nullable=False, default=0)
+    max_intentos = Column(Integer, nullable=False, default=3)
+    resultado = Column(JSONB, nullable=True)
+    error = Column(Text, nullable=True)
+    id_usuario = Column(Integer, ForeignKey("usuarios.id"), nullable=True)
+    creado = Column(TIMESTAMP(timezone=True), nullable=False, default=datetime.now)
+    disponible_desde = Column(TIMESTAMP(timezone=True), nullable=False, default=datetime.now)
+    bloqueado_hasta = Column(TIMESTAMP(timezone=True), nullable=True)
+    iniciado = Column(TIMESTAMP(timezone=True), nullable=True)
+    finalizado = Column(TIMESTAMP(timezone=True), nullable=True)
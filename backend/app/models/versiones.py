@@ -0,0 +1,9 @@
+from sqlalchemy import Column, String, BigInteger
+from app.db.database import Base
+
+class VersionDatos(Base):
+    """Modelo para la tabla versiones_datos (versión de los datos por mes/obra para invalidar cachés)"""
+    __tablename__ = "versiones_datos"
+    
+    clave = Column(String(100), primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
@@ -0,0 +1,9 @@
+from sqlalchemy import Column, String, TIMESTAMP
+from app.db.database import Base
+
+class RefrescoVista(Base):
+    """Modelo para la tabla refrescos_vistas (último refresco de cada vista materializada)"""
+    __tablename__ = "refrescos_vistas"
+    
+    vista = Column(String(100), primary_key=True)
+    refrescado = Column(TIMESTAMP(timezone=True), nullable=False)
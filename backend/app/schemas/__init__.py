@@ -6,6 +6,12 @@ from .trabajadores import *
 from .obras import *
 from .partidas import *
 from .horas import *
+from .propagaciones import *
+from .trabajos import *
+from .informes import *
+from .carga import *
+from .busqueda import *
+from .nominas import *
 
 # No es necesario usar update_forward_refs() ya que estamos
 # usando Any para evitar las referencias circulares 
\ No newline at end of file
@@ -0,0 +1,19 @@
+from pydantic import BaseModel, Field
+from typing import Any, Dict, Optional
+from datetime import date, datetime
+
+class RegistroAuditoria(BaseModel):
+    """Un cambio en un registro de horas (tabla horas_audit)"""
+    id: int
+    momento: datetime = Field(..., description="Momento de la transacción que hizo el cambio")
+    accion: str = Field(..., description="creado, actualizado o eliminado")
+    id_movimiento: int
+    chat_id: Optional[str] = None
+    fecha: Optional[date] = None
+    id_usuario: Optional[int] = Field(None, description="Usuario que hizo el cambio")
+    actor: Optional[str] = Field(None, description="username del usuario que hizo el cambio")
+    antes: Optional[Dict[str, Any]] = Field(None, description="Valores anteriores (en actualizaciones, solo los campos modificados)")
+    despues: Optional[Dict[str, Any]] = Field(None, description="Valores nuevos (en actualizaciones, solo los campos modificados)")
+
+    class Config:
+        from_attributes = True
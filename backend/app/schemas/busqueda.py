@@ -0,0 +1,11 @@
+from pydantic import BaseModel, Field
+from typing import Generic, List, TypeVar
+
+T = TypeVar("T")
+
+class PaginaBusqueda(BaseModel, Generic[T]):
+    """Página de resultados de una búsqueda, ordenados por relevancia"""
+    total: int = Field(..., description="Número total de resultados")
+    skip: int = Field(..., description="Resultados omitidos antes de esta página")
+    limit: int = Field(..., description="Tamaño máximo de la página")
+    resultados: List[T] = Field(default_factory=list, description="Resultados de la página")
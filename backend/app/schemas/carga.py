@@ -0,0 +1,18 @@
+from pydantic import BaseModel, Field
+from typing import Optional, List
+
+class ResultadoCarga(BaseModel):
+    """Resultado de un elemento de una carga masiva"""
+    posicion: int = Field(..., description="Posición del elemento en la carga (desde 0)")
+    clave: Optional[str] = Field(None, description="chat_id, id_obra o id_partida del elemento")
+    resultado: str = Field(..., description="creado, actualizado, sin_cambios o error")
+    error: Optional[str] = Field(None, description="Motivo del error, si lo hay")
+    propagacion_id: Optional[int] = Field(None, description="Propagación del nuevo nombre, si ha cambiado")
+
+class ResumenCarga(BaseModel):
+    """Resumen de una carga masiva con el resultado de cada elemento"""
+    creados: int
+    actualizados: int
+    sin_cambios: int
+    errores: int
+    resultados: List[ResultadoCarga]
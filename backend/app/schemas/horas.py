@@ -67,6 +67,27 @@ class ResumenMensual(BaseModel):
     class Config:
         from_attributes = True
 
+# Schemas para el resumen del día actual
+class ResumenObraHoy(BaseModel):
+    """Totales de una obra en el día actual"""
+    id_obra: Optional[int] = Field(None, description="ID de la obra (None para horas sin obra)")
+    nombre_obra: Optional[str] = Field(None, description="Nombre de la obra")
+    trabajadores: int = Field(..., description="Trabajadores con horas en la obra")
+    horas_totales: Decimal = Field(..., description="Total de horas en la obra")
+    horas_extra: Decimal = Field(..., description="Horas extra en la obra")
+
+class ResumenHoy(BaseModel):
+    """Resumen agregado de las horas del día actual"""
+    fecha: date = Field(..., description="Fecha del resumen")
+    registros: int = Field(..., description="Número de registros")
+    trabajadores: int = Field(..., description="Trabajadores que han fichado")
+    horas_totales: Decimal = Field(..., description="Total de horas")
+    horas_extra: Decimal = Field(..., description="Horas extra")
+    horas_normales: Decimal = Field(..., description="Horas normales (no extra)")
+    registros_regularizacion: int = Field(..., description="Número de registros de regularización")
+    horas_regularizacion: Decimal = Field(..., description="Horas de regularización")
+    obras: List[ResumenObraHoy] = Field(..., description="Totales por obra")
+
 # Alias para la respuesta API
 Hora = HoraInDB 
 
@@ -83,4 +104,52 @@ class TramoCreate(BaseModel):
     descripcion_extra: Optional[str] = None
 
 class HorasLoteCreate(BaseModel):
-    tramos: List[TramoCreate] 
\ No newline at end of file
+    tramos: List[TramoCreate]
+
+class ErrorImportacion(BaseModel):
+    fila: int
+    errores: List[str]
+
+class ImportacionHorasResultado(BaseModel):
+    filas: int
+    insertadas: int
+    errores_total: int
+    errores: List[ErrorImportacion]
+    solo_validar: bool
+    duracion_segundos: float
+
+# Schemas para la disponibilidad de un trabajador en un día
+class IntervaloHorario(BaseModel):
+    """Intervalo [inicio, fin) de un día"""
+    inicio: time = Field(..., description="Hora de inicio")
+    fin: time = Field(..., description="Hora de fin (23:59:59 representa el final del día)")
+    id_movimiento: Optional[int] = Field(None, description="Registro que ocupa el intervalo (solo en ocupados)")
+
+class DisponibilidadHoras(BaseModel):
+    """Tramos ocupados y huecos libres de un trabajador en un día"""
+    chat_id: str = Field(..., description="Trabajador")
+    fecha: date = Field(..., description="Día consultado")
+    ocupados: List[IntervaloHorario] = Field(..., description="Tramos registrados (sin regularizaciones), ordenados por inicio")
+    libres: List[IntervaloHorario] = Field(..., description="Huecos donde se puede registrar sin solapamiento")
+
+# Schemas del calendario anual de horas
+class CalendarioHoras(BaseModel):
+    """Horas de cada día del año de un trabajador (posición 0 = 1 de enero)"""
+    chat_id: str
+    año: int
+    primer_dia: date
+    dias: int = Field(..., description="Longitud de los arrays (365 o 366)")
+    horas: List[float] = Field(..., description="Total de horas de cada día")
+    extra: Optional[List[float]] = Field(None, description="Horas extra de cada día (con extra=true)")
+    obras: Optional[List[int]] = Field(None, description="Obra con más horas de cada día, 0 sin obra (con obras=true)")
+
+class CalendarioEquipo(BaseModel):
+    """Matriz trabajador x día de un año codificada como arrays binarios en base64"""
+    año: int
+    primer_dia: date
+    dias: int = Field(..., description="Columnas de la matriz (365 o 366)")
+    trabajadores: List[str] = Field(..., description="chat_id de cada fila de la matriz")
+    nombres: List[Optional[str]] = Field(..., description="Nombre de cada fila de la matriz")
+    tipo: str = Field(..., description="Tipo de los valores (float32 little-endian, filas consecutivas)")
+    horas: str = Field(..., description="Horas de cada trabajador y día en base64")
+    extra: Optional[str] = Field(None, description="Horas extra de cada trabajador y día en base64 (con extra=true)")
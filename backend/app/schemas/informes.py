@@ -0,0 +1,63 @@
+from pydantic import BaseModel, Field
+from typing import Dict, Optional, List
+from datetime import date, datetime
+from decimal import Decimal
+
+from app.core.environment import ANOMALIAS_MAX_HORAS_DIA, ANOMALIAS_MIN_HORAS_DIA, ANOMALIAS_TOLERANCIA_MINUTOS
+
+class TotalMensual(BaseModel):
+    """Totales de horas de un mes (base para obra y partida)"""
+    id_obra: Optional[int] = Field(None, description="ID de la obra (None para horas sin obra)")
+    año: int = Field(..., description="Año")
+    mes: int = Field(..., description="Mes (1-12)")
+    registros: int = Field(..., description="Número de registros")
+    trabajadores: int = Field(..., description="Trabajadores distintos")
+    horas_totales: Decimal = Field(..., description="Total de horas")
+    horas_extra: Decimal = Field(..., description="Horas extra")
+    horas_regularizacion: Decimal = Field(..., description="Horas de regularización")
+    
+    class Config:
+        from_attributes = True
+
+class TotalPartidaMensual(TotalMensual):
+    """Totales de horas de una partida en un mes"""
+    id_partida: Optional[int] = Field(None, description="ID de la partida (None para horas sin partida)")
+
+class TotalesObraMes(BaseModel):
+    """Respuesta de totales por obra y mes con la frescura de los datos"""
+    refrescado: Optional[datetime] = Field(None, description="Último refresco de la vista materializada")
+    filas: List[TotalMensual] = Field(..., description="Totales por obra y mes")
+
+class TotalesPartidaMes(BaseModel):
+    """Respuesta de totales por partida y mes con la frescura de los datos"""
+    refrescado: Optional[datetime] = Field(None, description="Último refresco de la vista materializada")
+    filas: List[TotalPartidaMensual] = Field(..., description="Totales por partida y mes")
+
+class UmbralesAnomalias(BaseModel):
+    """Umbrales de la detección de anomalías (los valores por defecto salen del entorno)"""
+    max_horas_dia: float = Field(ANOMALIAS_MAX_HORAS_DIA, gt=0, description="Horas por encima de las cuales un día es excesivo")
+    min_horas_dia: float = Field(ANOMALIAS_MIN_HORAS_DIA, ge=0, description="Horas por debajo de las cuales un día con registros es corto (0 = no se comprueba)")
+    tolerancia_minutos: float = Field(ANOMALIAS_TOLERANCIA_MINUTOS, ge=0, description="Diferencia admitida entre horas_totales y hora_fin - hora_inicio")
+    festivos: List[date] = Field(default_factory=list, description="Días festivos (no se exigen horas)")
+
+class Anomalia(BaseModel):
+    """Un registro o un día de un trabajador que conviene revisar"""
+    tipo: str = Field(..., description="dia_sin_horas, dia_excesivo, dia_corto, horas_cero, horas_incoherentes o partida_acabada")
+    chat_id: str
+    nombre: Optional[str] = None
+    fecha: date
+    id_movimiento: Optional[int] = Field(None, description="Registro afectado (None en las anomalías de día)")
+    id_partida: Optional[int] = None
+    nombre_partida: Optional[str] = None
+    valor: Optional[Decimal] = Field(None, description="Horas del día o del registro")
+    esperado: Optional[Decimal] = Field(None, description="Umbral superado o duración según hora_inicio y hora_fin")
+
+class ResultadoAnomalias(BaseModel):
+    """Anomalías de un periodo con el recuento por tipo"""
+    desde: date
+    hasta: date
+    umbrales: UmbralesAnomalias
+    total: int = Field(..., description="Anomalías encontradas (aunque la lista esté limitada)")
+    por_tipo: Dict[str, int] = Field(..., description="Número de anomalías de cada tipo")
+    anomalias: List[Anomalia] = Field(..., description="Anomalías ordenadas por fecha y trabajador")
+    duracion_segundos: float
@@ -0,0 +1,48 @@
+from pydantic import BaseModel, Field
+from typing import Optional, List
+from datetime import date, time
+
+from app.core.environment import (
+    NOMINA_UMBRAL_DIARIO,
+    NOMINA_UMBRAL_SEMANAL,
+    NOMINA_NOCHE_INICIO,
+    NOMINA_NOCHE_FIN,
+    NOMINA_PRIMA_EXTRA,
+    NOMINA_PRIMA_NOCTURNA,
+    NOMINA_PRIMA_FIN_DE_SEMANA
+)
+
+class ReglasNomina(BaseModel):
+    """Reglas de cálculo de horas extra y primas (los valores por defecto salen del entorno)"""
+    umbral_diario: float = Field(NOMINA_UMBRAL_DIARIO, ge=0, description="Horas ordinarias máximas por día; el resto son extra diarias")
+    umbral_semanal: float = Field(NOMINA_UMBRAL_SEMANAL, ge=0, description="Horas ordinarias máximas por semana (lunes a domingo); el resto son extra semanales")
+    noche_inicio: time = Field(time.fromisoformat(NOMINA_NOCHE_INICIO), description="Inicio de la franja nocturna")
+    noche_fin: time = Field(time.fromisoformat(NOMINA_NOCHE_FIN), description="Fin de la franja nocturna (si es anterior al inicio, cruza la medianoche)")
+    prima_extra: float = Field(NOMINA_PRIMA_EXTRA, ge=0, description="Recargo de las horas extra sobre la hora ordinaria")
+    prima_nocturna: float = Field(NOMINA_PRIMA_NOCTURNA, ge=0, description="Recargo de las horas nocturnas")
+    prima_fin_de_semana: float = Field(NOMINA_PRIMA_FIN_DE_SEMANA, ge=0, description="Recargo de las horas en sábado, domingo o festivo")
+    festivos: List[date] = Field(default_factory=list, description="Días festivos (cuentan como fin de semana)")
+
+class NominaTrabajador(BaseModel):
+    """Desglose de horas de un trabajador en el periodo"""
+    chat_id: str
+    nombre: Optional[str] = None
+    registros: int = Field(..., description="Registros de horas en el periodo")
+    dias_trabajados: int
+    horas_totales: float
+    horas_ordinarias: float
+    horas_extra_diarias: float = Field(..., description="Horas por encima del umbral diario")
+    horas_extra_semanales: float = Field(..., description="Horas ordinarias que superan el umbral semanal")
+    horas_extra: float = Field(..., description="Total de horas extra calculadas (diarias + semanales)")
+    horas_nocturnas: float
+    horas_fin_de_semana: float = Field(..., description="Horas en sábado, domingo o festivo")
+    horas_marcadas_extra: float = Field(..., description="Horas con es_extra marcado a mano en el registro")
+    horas_ponderadas: float = Field(..., description="Horas equivalentes a ordinarias aplicando las primas")
+
+class ResultadoNomina(BaseModel):
+    """Resultado del cálculo de nómina de un periodo"""
+    desde: date
+    hasta: date
+    reglas: ReglasNomina
+    trabajadores: List[NominaTrabajador]
+    duracion_segundos: float = Field(..., description="Tiempo de carga y cálculo")
@@ -10,6 +10,10 @@ class ObraCreate(ObraBase):
     """Schema para crear una obra"""
     pass
 
+class ObraCarga(ObraBase):
+    """Schema para la carga masiva de obras (sin id_obra se busca por nombre o se crea)"""
+    id_obra: Optional[int] = Field(None, description="ID de la obra a actualizar")
+
 class ObraUpdate(BaseModel):
     """Schema para actualizar una obra"""
     nombre_obra: Optional[str] = Field(None, description="Nombre de la obra")
@@ -1,5 +1,6 @@
 from pydantic import BaseModel, Field
 from typing import Optional, List
+from datetime import date
 
 class PartidaBase(BaseModel):
     """Schema base para partidas"""
@@ -10,6 +11,11 @@ class PartidaCreate(PartidaBase):
     """Schema para crear una partida"""
     pass
 
+class PartidaCarga(PartidaBase):
+    """Schema para la carga masiva de partidas (sin id_partida se busca por obra y nombre o se crea)"""
+    id_partida: Optional[int] = Field(None, description="ID de la partida a actualizar")
+    acabada: Optional[bool] = Field(None, description="Estado de la partida (si no se indica, se mantiene)")
+
 class PartidaUpdate(BaseModel):
     """Schema para actualizar una partida"""
     nombre_partida: Optional[str] = Field(None, description="Nombre de la partida")
@@ -32,5 +38,15 @@ class PartidaWithHoras(PartidaInDB):
     class Config:
         from_attributes = True
 
+# Schema de los listados, con los totales de horas opcionales (con_horas=true)
+class PartidaConTotales(PartidaInDB):
+    """Schema para partida en listados, con los totales de horas si se piden"""
+    horas_totales: Optional[float] = Field(None, description="Total de horas acumuladas en la partida")
+    horas_extra: Optional[float] = Field(None, description="Horas extra acumuladas en la partida")
+    ultima_actividad: Optional[date] = Field(None, description="Fecha del último registro de horas")
+    
+    class Config:
+        from_attributes = True
+
 # Alias para la respuesta API
 Partida = PartidaInDB 
\ No newline at end of file
@@ -0,0 +1,17 @@
+from pydantic import BaseModel, Field
+from typing import Optional
+from datetime import datetime
+
+class PropagacionEstado(BaseModel):
+    """Estado de una propagación de nombre desnormalizado"""
+    id: int = Field(..., description="ID de la propagación (trabajo de la cola)")
+    tipo: str = Field(..., description="Entidad renombrada (trabajador/partida/obra)")
+    id_entidad: str = Field(..., description="ID de la entidad renombrada")
+    nuevo_nombre: str = Field(..., description="Nombre que se está propagando")
+    estado: str = Field(..., description="pendiente/en_curso/completada/error")
+    intentos: int = Field(0, description="Intentos realizados")
+    filas_actualizadas: int = Field(0, description="Filas actualizadas hasta el momento")
+    lotes: int = Field(0, description="Lotes procesados hasta el momento")
+    inicio: Optional[datetime] = Field(None, description="Inicio de la propagación")
+    fin: Optional[datetime] = Field(None, description="Fin de la propagación")
+    error: Optional[str] = Field(None, description="Mensaje de error si ha fallado")
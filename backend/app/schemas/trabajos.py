@@ -0,0 +1,30 @@
+from pydantic import BaseModel, Field
+from typing import Optional, Any
+from datetime import datetime
+
+class TrabajoInDB(BaseModel):
+    """Schema para un trabajo de la cola en segundo plano"""
+    id: int = Field(..., description="ID único del trabajo")
+    tipo: str = Field(..., description="Tipo de trabajo (resumen_mensual, horas_lote...)")
+    estado: str = Field(..., description="pendiente/en_curso/completado/error")
+    intentos: int = Field(0, description="Intentos realizados")
+    max_intentos: int = Field(..., description="Intentos máximos")
+    error: Optional[str] = Field(None, description="Último error, si lo hay")
+    creado: datetime = Field(..., description="Fecha de creación")
+    iniciado: Optional[datetime] = Field(None, description="Inicio del último intento")
+    finalizado: Optional[datetime] = Field(None, description="Fecha de finalización")
+    
+    class Config:
+        from_attributes = True
+
+class TrabajoResultado(BaseModel):
+    """Schema para el resultado de un trabajo completado"""
+    id: int = Field(..., description="ID único del trabajo")
+    tipo: str = Field(..., description="Tipo de trabajo")
+    resultado: Any = Field(None, description="Resultado del trabajo")
+    
+    class Config:
+        from_attributes = True
+
+# Alias para la respuesta API
+Trabajo = TrabajoInDB
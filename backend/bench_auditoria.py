@@ -0,0 +1,90 @@
+"""
+Benchmark del sobrecoste del historial (horas_audit) en la creación de horas en lote.
+
+Ejecuta _crear_horas_lote (el mismo código que POST /horas/lote) alternando con y sin auditoría,
+dentro de una transacción que se deshace al final: los commits del lote solo liberan un savepoint,
+así que no quedan horas ni filas de historial en la base de datos.
+
+Uso:
+    python bench_auditoria.py [--lotes 50] [--tramos 50] [--chat-id 123456] [--max-sobrecoste 10]
+
+Termina con código 1 si la mediana con auditoría supera en más de --max-sobrecoste % a la mediana sin ella.
+"""
+import argparse
+import statistics
+import sys
+import time
+from datetime import date, time as hora, timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+
+from sqlalchemy.orm import Session
+
+import app.core.auditoria as auditoria
+from app.api.endpoints.horas import _crear_horas_lote
+from app.db.database import engine
+from app.models.trabajadores import Trabajador
+from app.schemas.horas import HorasLoteCreate, TramoCreate
+
+# Fechas lejanas para no solaparse con horas reales
+_PRIMER_DIA = date(2099, 1, 1)
+
+def lote(chat_id: str, numero: int, tramos: int) -> HorasLoteCreate:
+    """Un tramo de 08:00 a 16:00 por día, en días distintos para cada lote"""
+    return HorasLoteCreate(tramos=[
+        TramoCreate(
+            chat_id=chat_id,
+            fecha=_PRIMER_DIA + timedelta(days=numero * tramos + i),
+            hora_inicio=hora(8, 0),
+            hora_fin=hora(16, 0),
+            horas_totales=Decimal("8.00")
+        )
+        for i in range(tramos)
+    ])
+
+def medir(lotes: int, tramos: int, chat_id: str = None) -> dict:
+    usuario = SimpleNamespace(id=None, username="bench_auditoria", rol="admin", chat_id=None)
+    tiempos = {True: [], False: []}
+    with engine.connect() as conexion:
+        transaccion = conexion.begin()
+        db = Session(bind=conexion, join_transaction_mode="create_savepoint")
+        try:
+            if chat_id is None:
+                trabajador = db.query(Trabajador).first()
+                if trabajador is None:
+                    sys.exit("No hay trabajadores en la base de datos (indica --chat-id)")
+                chat_id = trabajador.chat_id
+            # Un lote de calentamiento de cada tipo, y después alternando para repartir el ruido
+            for numero in range(-2, lotes * 2):
+                auditar = numero % 2 == 0
+                auditoria.HORAS_AUDITORIA = auditar
+                datos = lote(chat_id, numero + 2, tramos)
+                inicio = time.perf_counter()
+                _crear_horas_lote(db, datos, usuario)
+                if numero >= 0:
+                    tiempos[auditar].append(time.perf_counter() - inicio)
+        finally:
+            db.close()
+            transaccion.rollback()
+
+    con, sin = statistics.median(tiempos[True]), statistics.median(tiempos[False])
+    return {"con_auditoria": con, "sin_auditoria": sin, "sobrecoste": (con - sin) / sin * 100}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lotes", type=int, default=50, help="Lotes de cada tipo (con y sin auditoría)")
+    parser.add_argument("--tramos", type=int, default=50, help="Tramos por lote")
+    parser.add_argument("--chat-id", help="Trabajador para los tramos (por defecto, el primero)")
+    parser.add_argument("--max-sobrecoste", type=float, default=10, help="Sobrecoste máximo admitido (%%)")
+    args = parser.parse_args()
+
+    resultado = medir(args.lotes, args.tramos, args.chat_id)
+    print(f"Lote de {args.tramos} tramos (mediana de {args.lotes}):")
+    print(f"  sin auditoría: {resultado['sin_auditoria'] * 1000:8.2f} ms")
+    print(f"  con auditoría: {resultado['con_auditoria'] * 1000:8.2f} ms")
+    print(f"  sobrecoste:    {resultado['sobrecoste']:8.2f} %")
+    if resultado["sobrecoste"] > args.max_sobrecoste:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Benchmark de escalado del servidor de producción (gunicorn_conf.py).
+
+Arranca Gunicorn con 1, 2, 4... workers y mide peticiones por segundo contra un endpoint.
+El generador de carga usa varios procesos con conexiones keep-alive (http.client) para que
+el cliente no sea el cuello de botella.
+
+Uso:
+    python bench_servidor.py [--workers 1,2,4] [--segundos 10] [--clientes 64] [--ruta /api/v1/health]
+
+Nota: para medir el servidor y no el cliente, conviene lanzarlo en una máquina con más
+CPUs que el máximo de workers probado (o el cliente en otra máquina con --url).
+"""
+import argparse
+import http.client
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlparse
+
+def _cliente(host: str, puerto: int, ruta: str, hilos: int, duracion: float, cola):
+    """Proceso generador de carga: varios hilos con una conexión keep-alive cada uno"""
+    contadores = []
+    fin = time.monotonic() + duracion
+
+    def hilo():
+        hechas = errores = 0
+        conexion = http.client.HTTPConnection(host, puerto, timeout=10)
+        while time.monotonic() < fin:
+            try:
+                conexion.request("GET", ruta)
+                respuesta = conexion.getresponse()
+                respuesta.read()
+                if respuesta.status == 200:
+                    hechas += 1
+                else:
+                    errores += 1
+            except Exception:
+                errores += 1
+                conexion.close()
+                conexion = http.client.HTTPConnection(host, puerto, timeout=10)
+        conexion.close()
+        contadores.append((hechas, errores))
+
+    hilos_lanzados = [threading.Thread(target=hilo) for _ in range(hilos)]
+    for h in hilos_lanzados:
+        h.start()
+    for h in hilos_lanzados:
+        h.join()
+    cola.put((sum(c[0] for c in contadores), sum(c[1] for c in contadores)))
+
+def medir(host: str, puerto: int, ruta: str, clientes: int, duracion: float, procesos: int):
+    """Lanza la carga y devuelve (peticiones por segundo, errores)"""
+    cola = multiprocessing.Queue()
+    hilos_por_proceso = max(clientes // procesos, 1)
+    generadores = [
+        multiprocessing.Process(target=_cliente, args=(host, puerto, ruta, hilos_por_proceso, duracion, cola))
+        for _ in range(procesos)
+    ]
+    inicio = time.monotonic()
+    for g in generadores:
+        g.start()
+    resultados = [cola.get() for _ in generadores]
+    for g in generadores:
+        g.join()
+    transcurrido = time.monotonic() - inicio
+    return sum(r[0] for r in resultados) / transcurrido, sum(r[1] for r in resultados)
+
+def esperar_servidor(host: str, puerto: int, ruta: str, limite: float = 30.0) -> bool:
+    fin = time.monotonic() + limite
+    while time.monotonic() < fin:
+        try:
+            conexion = http.client.HTTPConnection(host, puerto, timeout=1)
+            conexion.request("GET", ruta)
+            if conexion.getresponse().status == 200:
+                return True
+        except Exception:
+            time.sleep(0.3)
+    return False
+
+def arrancar_servidor(workers: int, puerto: int) -> subprocess.Popen:
+    entorno = dict(
+        os.environ,
+        WEB_CONCURRENCY=str(workers),
+        PORT=str(puerto),
+        ACCESS_LOG="",
+        TRABAJOS_EN_PROCESO="False",
+        VISTAS_REFRESCO_MINUTOS="0",
+    )
+    return subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn_conf.py", "main:app"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=entorno,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de escalado por número de workers")
+    parser.add_argument("--workers", default=",".join(str(n) for n in (1, 2, 4, 8) if n <= os.cpu_count()))
+    parser.add_argument("--segundos", type=float, default=10)
+    parser.add_argument("--clientes", type=int, default=64)
+    parser.add_argument("--procesos-cliente", type=int, default=max(os.cpu_count() // 2, 1))
+    parser.add_argument("--ruta", default="/api/v1/health")
+    parser.add_argument("--puerto", type=int, default=8765)
+    parser.add_argument("--url", help="Medir un servidor ya arrancado en lugar de lanzar Gunicorn")
+    args = parser.parse_args()
+
+    if args.url:
+        url = urlparse(args.url)
+        rps, errores = medir(url.hostname, url.port or 80, url.path or args.ruta, args.clientes, args.segundos, args.procesos_cliente)
+        print(f"{args.url}: {rps:,.0f} req/s ({errores} errores)")
+        return
+
+    print(f"{'workers':>8} {'req/s':>12} {'escalado':>9} {'errores':>8}")
+    base = None
+    for workers in [int(n) for n in args.workers.split(",")]:
+        servidor = arrancar_servidor(workers, args.puerto)
+        try:
+            if not esperar_servidor("127.0.0.1", args.puerto, args.ruta):
+                print(f"{workers:>8} el servidor no arrancó")
+                continue
+            # Calentamiento breve para que todos los workers tengan conexiones abiertas
+            medir("127.0.0.1", args.puerto, args.ruta, args.clientes, 1, args.procesos_cliente)
+            rps, errores = medir("127.0.0.1", args.puerto, args.ruta, args.clientes, args.segundos, args.procesos_cliente)
+            base = base or rps
+            print(f"{workers:>8} {rps:>12,.0f} {rps / base:>8.2f}x {errores:>8}")
+        finally:
+            # SIGTERM: parada ordenada de Gunicorn (drena las conexiones en curso)
+            os.killpg(servidor.pid, signal.SIGTERM)
+            servidor.wait(timeout=60)
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,9 @@
 -- Crear extensión citext para texto insensible a mayúsculas/minúsculas
 CREATE EXTENSION IF NOT EXISTS citext;
 
+-- Crear extensión pg_trgm para las búsquedas por nombre con índices de trigramas
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
 -- =====================================================
 -- SECUENCIAS
 -- =====================================================
@@ -127,6 +130,83 @@ CREATE TABLE IF NOT EXISTS notificaciones (
     id_usuario integer
 );
 
+-- Tabla: trabajos
+-- Cola de trabajos en segundo plano (informes pesados, lotes grandes)
+CREATE TABLE IF NOT EXISTS trabajos (
+    id serial PRIMARY KEY,
+    tipo character varying(50) NOT NULL,
+    parametros jsonb NOT NULL DEFAULT '{}'::jsonb,
+    estado character varying(20) NOT NULL DEFAULT 'pendiente',
+    intentos integer NOT NULL DEFAULT 0,
+    max_intentos integer NOT NULL DEFAULT 3,
+    resultado jsonb,
+    error text,
+    id_usuario integer REFERENCES usuarios(id),
+    creado timestamp with time zone NOT NULL DEFAULT now(),
+    disponible_desde timestamp with time zone NOT NULL DEFAULT now(),
+    bloqueado_hasta timestamp with time zone,
+    iniciado timestamp with time zone,
+    finalizado timestamp with time zone
+);
+
+-- Tabla: versiones_datos
+-- Versión de los datos por mes ('mes:AAAA-MM') y por obra ('obra:ID'),
+-- incrementada en cada escritura de horas para invalidar la caché de informes
+CREATE TABLE IF NOT EXISTS versiones_datos (
+    clave character varying(100) NOT NULL PRIMARY KEY,
+    version bigint NOT NULL DEFAULT 0
+);
+
+-- Tabla: claves_idempotencia
+-- Respuesta guardada de cada Idempotency-Key (POST /horas y /horas/lote) hasta que caduca
+CREATE TABLE IF NOT EXISTS claves_idempotencia (
+    clave character varying(100) NOT NULL,
+    id_usuario integer NOT NULL,
+    ruta character varying(50) NOT NULL,
+    huella character varying(64) NOT NULL,
+    estado_http smallint,
+    respuesta bytea,
+    creado timestamp with time zone NOT NULL,
+    expira timestamp with time zone NOT NULL,
+    PRIMARY KEY (clave, id_usuario)
+);
+
+-- Tabla: horas_audit
+-- Historial de solo inserción de los cambios en horas (se escribe en la misma transacción que el cambio)
+CREATE TABLE IF NOT EXISTS horas_audit (
+    id bigserial PRIMARY KEY,
+    momento timestamp with time zone NOT NULL DEFAULT now(),
+    accion character varying(20) NOT NULL,
+    id_movimiento integer NOT NULL,
+    chat_id citext,
+    fecha date,
+    id_usuario integer,
+    actor character varying(50),
+    antes jsonb,
+    despues jsonb
+);
+
+-- Tabla: horas_importacion
+-- Staging UNLOGGED para la importación masiva de horas por CSV (POST /horas/import).
+-- Cada importación escribe y borra sus filas (id_importacion) dentro de su propia transacción
+CREATE UNLOGGED TABLE IF NOT EXISTS horas_importacion (
+    id_importacion character varying(32) NOT NULL,
+    fila integer NOT NULL,
+    chat_id citext,
+    fecha date,
+    hora_inicio time without time zone,
+    hora_fin time without time zone,
+    id_obra integer,
+    id_partida integer,
+    horas_totales numeric(4,2),
+    es_extra boolean NOT NULL DEFAULT false,
+    tipo_extra citext,
+    descripcion_extra text,
+    error_formato text,
+    errores text[],
+    PRIMARY KEY (id_importacion, fila)
+);
+
 -- =====================================================
 -- CLAVES FORÁNEAS (FOREIGN KEYS)
 -- =====================================================
@@ -201,6 +281,95 @@ CREATE INDEX IF NOT EXISTS idx_horas_chat_id ON horas(chat_id);
 -- Índice para mejorar búsquedas por obra en horas
 CREATE INDEX IF NOT EXISTS idx_horas_id_obra ON horas(id_obra);
 
+-- Índice parcial para reclamar trabajos pendientes de la cola
+CREATE INDEX IF NOT EXISTS idx_trabajos_pendientes ON trabajos(disponible_desde, id)
+    WHERE estado IN ('pendiente', 'en_curso');
+
+-- Índice para los resúmenes del día filtrados por trabajador (/horas/hoy/resumen)
+CREATE INDEX IF NOT EXISTS idx_horas_fecha_chat_id ON horas(fecha, chat_id);
+
+-- Índice para borrar las claves de idempotencia caducadas
+CREATE INDEX IF NOT EXISTS idx_claves_idempotencia_expira ON claves_idempotencia (expira);
+
+-- Índices del historial de horas: BRIN por momento (periodos) y btree por registro y por trabajador
+CREATE INDEX IF NOT EXISTS ix_horas_audit_momento ON horas_audit USING brin (momento);
+CREATE INDEX IF NOT EXISTS ix_horas_audit_id_movimiento ON horas_audit (id_movimiento);
+CREATE INDEX IF NOT EXISTS ix_horas_audit_chat_id_id ON horas_audit (chat_id, id);
+
+-- El historial es de solo inserción: UPDATE, DELETE y TRUNCATE fallan
+CREATE OR REPLACE FUNCTION horas_audit_solo_insercion() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    RAISE EXCEPTION 'horas_audit es de solo inserción';
+END
+$$;
+DROP TRIGGER IF EXISTS tr_horas_audit_solo_insercion ON horas_audit;
+CREATE TRIGGER tr_horas_audit_solo_insercion
+BEFORE UPDATE OR DELETE OR TRUNCATE ON horas_audit
+FOR EACH STATEMENT EXECUTE FUNCTION horas_audit_solo_insercion();
+
+-- Índice para detectar solapamientos entre filas de una misma importación
+CREATE INDEX IF NOT EXISTS ix_horas_importacion_solape ON horas_importacion (id_importacion, chat_id, fecha);
+
+-- Índices de trigramas para las búsquedas por nombre (/obras/buscar, /partidas/buscar, /trabajadores/buscar)
+CREATE INDEX IF NOT EXISTS ix_obras_nombre_obra_trgm ON obras USING gin ((nombre_obra::text) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS ix_obras_direccion_obra_trgm ON obras USING gin ((direccion_obra::text) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS ix_partidas_nombre_partida_trgm ON partidas USING gin ((nombre_partida::text) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS ix_partidas_nombre_obra_trgm ON partidas USING gin ((nombre_obra::text) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS ix_trabajadores_nombre_trgm ON trabajadores USING gin ((nombre::text) gin_trgm_ops);
+
+-- Índices para los listados de obras y partidas ordenados y paginados por clave
+CREATE INDEX IF NOT EXISTS ix_obras_nombre_obra_id ON obras (nombre_obra, id_obra);
+CREATE INDEX IF NOT EXISTS ix_partidas_obra_nombre_id ON partidas (id_obra, nombre_partida, id_partida);
+CREATE INDEX IF NOT EXISTS ix_partidas_nombre_id ON partidas (nombre_partida, id_partida);
+
+-- Índice cubriente para los totales de horas por partida de los listados (con_horas=true)
+CREATE INDEX IF NOT EXISTS ix_horas_id_partida ON horas (id_partida) INCLUDE (fecha, horas_totales, es_extra);
+
+-- =====================================================
+-- VISTAS MATERIALIZADAS (TOTALES POR OBRA/PARTIDA Y MES)
+-- =====================================================
+
+-- Tabla: refrescos_vistas
+-- Último refresco de cada vista materializada (frescura expuesta en /informes)
+CREATE TABLE IF NOT EXISTS refrescos_vistas (
+    vista character varying(100) NOT NULL PRIMARY KEY,
+    refrescado timestamp with time zone NOT NULL
+);
+
+-- Vista: mv_horas_obra_mes (id_obra 0 = horas sin obra)
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_horas_obra_mes AS
+SELECT
+    COALESCE(h.id_obra, 0) AS id_obra,
+    EXTRACT(YEAR FROM h.fecha)::integer AS año,
+    EXTRACT(MONTH FROM h.fecha)::integer AS mes,
+    COUNT(*) AS registros,
+    COUNT(DISTINCT h.chat_id) AS trabajadores,
+    COALESCE(SUM(h.horas_totales), 0) AS horas_totales,
+    COALESCE(SUM(h.horas_totales) FILTER (WHERE h.es_extra), 0) AS horas_extra,
+    COALESCE(SUM(h.horas_totales) FILTER (WHERE h.es_regularizacion), 0) AS horas_regularizacion
+FROM horas h
+GROUP BY 1, 2, 3;
+
+-- Índice único necesario para REFRESH MATERIALIZED VIEW CONCURRENTLY
+CREATE UNIQUE INDEX IF NOT EXISTS ux_mv_horas_obra_mes ON mv_horas_obra_mes (id_obra, año, mes);
+
+-- Vista: mv_horas_partida_mes (id_obra/id_partida 0 = sin obra/partida)
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_horas_partida_mes AS
+SELECT
+    COALESCE(h.id_obra, 0) AS id_obra,
+    COALESCE(h.id_partida, 0) AS id_partida,
+    EXTRACT(YEAR FROM h.fecha)::integer AS año,
+    EXTRACT(MONTH FROM h.fecha)::integer AS mes,
+    COUNT(*) AS registros,
+    COUNT(DISTINCT h.chat_id) AS trabajadores,
+    COALESCE(SUM(h.horas_totales), 0) AS horas_totales,
+    COALESCE(SUM(h.horas_totales) FILTER (WHERE h.es_extra), 0) AS horas_extra,
+    COALESCE(SUM(h.horas_totales) FILTER (WHERE h.es_regularizacion), 0) AS horas_regularizacion
+FROM horas h
+GROUP BY 1, 2, 3, 4;
+
+CREATE UNIQUE INDEX IF NOT EXISTS ux_mv_horas_partida_mes ON mv_horas_partida_mes (id_obra, id_partida, año, mes);
+
 -- =====================================================
 -- DATOS INICIALES
 -- =====================================================
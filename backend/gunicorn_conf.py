@@ -0,0 +1,62 @@
+"""
+Configuración de Gunicorn para producción: varios workers Uvicorn (uvloop + httptools).
+
+Uso:
+    gunicorn -c gunicorn_conf.py main:app
+
+Variables de entorno:
+- WEB_CONCURRENCY: número de workers (por defecto, uno por CPU)
+- HOST / PORT o BIND: dirección de escucha
+- KEEPALIVE, BACKLOG, TIMEOUT, GRACEFUL_TIMEOUT: ajuste de conexiones y parada
+- PRELOAD_APP: cargar la aplicación en el proceso maestro antes de crear los workers
+- PROXY_IPS_CONFIABLES: IPs del proxy cuyas cabeceras X-Forwarded-* se aceptan (por defecto, *)
+"""
+import logging
+import multiprocessing
+import os
+
+def _entero(nombre: str, por_defecto: int) -> int:
+    valor = os.getenv(nombre)
+    return int(valor) if valor else por_defecto
+
+# Workers: uno por CPU. Cada uno tiene su propio event loop y su pool de conexiones (DB_POOL_SIZE)
+workers = max(_entero("WEB_CONCURRENCY", multiprocessing.cpu_count()), 1)
+worker_class = "uvicorn.workers.UvicornWorker"
+
+bind = os.getenv("BIND", f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', '8000')}")
+backlog = _entero("BACKLOG", 2048)
+
+# Mantener las conexiones del proxy abiertas más que su propio keep-alive evita cortes a mitad de petición
+keepalive = _entero("KEEPALIVE", 75)
+timeout = _entero("TIMEOUT", 120)
+# Al parar (SIGTERM) los workers dejan de aceptar conexiones y terminan las peticiones en curso
+graceful_timeout = _entero("GRACEFUL_TIMEOUT", 30)
+
+# Reciclar workers de vez en cuando (con desfase aleatorio) para acotar el crecimiento de memoria
+max_requests = _entero("MAX_REQUESTS", 0)
+max_requests_jitter = _entero("MAX_REQUESTS_JITTER", 0)
+
+preload_app = os.getenv("PRELOAD_APP", "True").lower() == "true"
+# Las mismas IPs de proxy que en la aplicación ("*" si no se restringen)
+forwarded_allow_ips = os.getenv("PROXY_IPS_CONFIABLES", "*")
+proxy_allow_ips = forwarded_allow_ips
+
+accesslog = os.getenv("ACCESS_LOG", "-") or None
+errorlog = "-"
+loglevel = os.getenv("LOG_LEVEL", "info")
+
+def post_fork(server, worker):
+    """
+    Con preload_app el motor de SQLAlchemy se crea en el maestro: cada worker descarta las
+    conexiones heredadas (sin cerrarlas, son del padre) y abre las suyas.
+    """
+    from app.db.database import engine, replica_engine
+
+    engine.dispose(close=False)
+    if replica_engine is not None:
+        replica_engine.dispose(close=False)
+
+def when_ready(server):
+    logging.getLogger("gunicorn.error").info(
+        f"Gunicorn listo en {bind} con {workers} workers ({worker_class}), keepalive {keepalive}s, backlog {backlog}"
+    )
@@ -1,19 +1,34 @@
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 from uvicorn.middleware.proxy_headers import ProxyHeadersMiddleware
 from fastapi.responses import FileResponse, HTMLResponse
+import asyncio
 import logging
 from sqlalchemy.orm import Session
 import os
+import time
 from pathlib import Path
 
 from app.api import api_router
-from app.core.environment import API_V1_STR
-from app.db.database import get_db, engine, Base
-from app.models.usuarios import Usuario
-from app.models.trabajadores import Trabajador
-from app.core.auth import get_password_hash
+from app.core.environment import (
+    API_V1_STR,
+    TRABAJOS_EN_PROCESO,
+    LECTURA_PRIMARIA_TRAS_ESCRITURA_SEGUNDOS,
+    ESTATICOS_DIRECTORIO,
+    ESTATICOS_MAX_BYTES_MEMORIA,
+    ESTATICOS_MAX_BYTES_FICHERO,
+    ADMISION_ACTIVA,
+    PROXY_IPS_CONFIABLES
+)
+from app.core.trabajos import RunnerTrabajos, EleccionSegundoPlano
+from app.core.vistas_materializadas import programar_refresco_periodico
+from app.core.idempotencia import programar_limpieza_idempotencia
+from app.core.anomalias import programar_revision_anomalias
+from app.core.arranque import inicializar_base_de_datos
+from app.core.estaticos import EstaticosSPA
+from app.core.admision import ControlAdmision
+from app.core.plazos import PlazosPeticion
+from app.db.database import SessionReplica, COOKIE_LECTURA_PRIMARIA
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
@@ -21,9 +36,19 @@ logger = logging.getLogger(__name__)
 
 app = FastAPI(title="Gestión de Horas API", redirect_slashes=True)
 
+# Plazo por petición (statement_timeout, cancelación si el cliente se va, 503/504 estructurados).
+# Queda por dentro del control de admisión: las peticiones rechazadas no consumen plazo
+app.add_middleware(PlazosPeticion)
+
+# Control de admisión (429 con Retry-After). Se añade antes que el resto para quedar por dentro:
+# así ve la IP real del cliente (ProxyHeaders) y las respuestas 429 llevan las cabeceras CORS
+app.add_middleware(ControlAdmision, activo=ADMISION_ACTIVA)
+
 # Middleware para confiar en los encabezados X-Forwarded-* del proxy
 # Esto es crucial para que las redirecciones y la generación de URLs funcionen correctamente con HTTPS
-app.add_middleware(ProxyHeadersMiddleware, trusted_hosts="*")
+# Por defecto se aceptan de cualquier origen; PROXY_IPS_CONFIABLES permite limitarlas a las IPs del proxy
+# para que ningún cliente pueda falsear su IP con X-Forwarded-For (y saltarse los límites por IP)
+app.add_middleware(ProxyHeadersMiddleware, trusted_hosts=PROXY_IPS_CONFIABLES)
 
 # Configurar CORS
 app.add_middleware(
@@ -32,61 +57,73 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Cabeceras de paginación de los listados que el frontend tiene que poder leer
+    expose_headers=["X-Total-Count", "X-Total-Estimado", "X-Siguiente-Cursor"],
 )
 
+# Leer del primario durante unos segundos tras una escritura (read-your-writes con réplica)
+@app.middleware("http")
+async def lectura_primaria_tras_escritura(request: Request, call_next):
+    response = await call_next(request)
+    if (
+        SessionReplica is not None
+        and request.method in ("POST", "PUT", "PATCH", "DELETE")
+        and response.status_code < 400
+    ):
+        hasta = int(time.time()) + LECTURA_PRIMARIA_TRAS_ESCRITURA_SEGUNDOS
+        response.set_cookie(
+            COOKIE_LECTURA_PRIMARIA, str(hasta),
+            max_age=LECTURA_PRIMARIA_TRAS_ESCRITURA_SEGUNDOS, httponly=True, samesite="lax"
+        )
+    return response
+
 # Incluir routers
 app.include_router(api_router, prefix=API_V1_STR)
 
+def iniciar_segundo_plano():
+    """Runner de trabajos y tareas periódicas (solo en el worker elegido)"""
+    app.state.runner_trabajos = RunnerTrabajos()
+    app.state.runner_trabajos.iniciar()
+    app.state.refresco_vistas = asyncio.create_task(programar_refresco_periodico())
+    app.state.limpieza_idempotencia = asyncio.create_task(programar_limpieza_idempotencia())
+    app.state.revision_anomalias = asyncio.create_task(programar_revision_anomalias())
+
+async def detener_segundo_plano():
+    for nombre in ("refresco_vistas", "limpieza_idempotencia", "revision_anomalias"):
+        tarea = getattr(app.state, nombre, None)
+        if tarea is not None:
+            tarea.cancel()
+            setattr(app.state, nombre, None)
+    runner = getattr(app.state, "runner_trabajos", None)
+    if runner is not None:
+        app.state.runner_trabajos = None
+        await runner.detener()
+
 # Evento de inicio de aplicación
 @app.on_event("startup")
 async def startup_event():
-    # Crear tablas si no existen
-    Base.metadata.create_all(bind=engine)
+    inicio = time.perf_counter()
     
-    # Comprobar si existe un superadmin
-    db = next(get_db())
+    # Crear el esquema (solo si ha cambiado) y el superadmin, una sola vez en todo el clúster
     try:
-        admin_exists = db.query(Usuario).filter(Usuario.rol == "admin").first() is not None
-        
-        if not admin_exists:
-            logger.info("No hay administrador, creando uno por defecto...")
-            
-            # Datos del superadmin (lee de variables de entorno o usa valores por defecto)
-            admin_username = os.getenv("ADMIN_USERNAME", "admin")
-            admin_password = os.getenv("ADMIN_PASSWORD", "admin123")
-            admin_chat_id = os.getenv("ADMIN_CHAT_ID", "admin_id")
-            admin_nombre = os.getenv("ADMIN_NOMBRE", "Administrador")
-            
-            # Comprobar si existe el trabajador
-            trabajador = db.query(Trabajador).filter(Trabajador.chat_id == admin_chat_id).first()
-            if not trabajador:
-                trabajador = Trabajador(
-                    chat_id=admin_chat_id,
-                    nombre=admin_nombre
-                )
-                db.add(trabajador)
-                db.commit()
-                logger.info(f"Trabajador '{admin_nombre}' creado con chat_id: {admin_chat_id}")
-            
-            # Crear el superadmin
-            password_hash = get_password_hash(admin_password)
-            new_admin = Usuario(
-                username=admin_username,
-                password_hash=password_hash,
-                chat_id=admin_chat_id,
-                rol="admin",
-                activo=True
-            )
-            db.add(new_admin)
-            db.commit()
-            logger.info(f"Superadmin '{admin_username}' creado correctamente")
-        else:
-            logger.info("Ya existe un administrador, no se creará uno por defecto")
-    
+        await asyncio.to_thread(inicializar_base_de_datos)
     except Exception as e:
-        logger.error(f"Error al crear el superadmin: {e}")
-    finally:
-        db.close()
+        logger.error(f"Error al inicializar la base de datos: {e}")
+    
+    # Iniciar el runner de la cola de trabajos dentro de la API (o usar worker_trabajos.py aparte).
+    # Con varios workers solo lo ejecuta uno, elegido con un advisory lock (los demás toman el relevo si cae)
+    if TRABAJOS_EN_PROCESO:
+        app.state.eleccion_segundo_plano = EleccionSegundoPlano(iniciar_segundo_plano, detener_segundo_plano)
+        app.state.eleccion_segundo_plano.iniciar()
+    
+    logger.info(f"Arranque del proceso {os.getpid()} completado en {time.perf_counter() - inicio:.3f}s")
+
+# Evento de parada de la aplicación
+@app.on_event("shutdown")
+async def shutdown_event():
+    eleccion = getattr(app.state, "eleccion_segundo_plano", None)
+    if eleccion is not None:
+        await eleccion.detener()
 
 # Definir handler para la API
 @app.get(f"{API_V1_STR}/health")
@@ -98,12 +135,16 @@ async def health_check():
     return {"status": "ok", "service": "Gestión de Horas API"}
 
 # Verificar que el directorio estático existe
-static_directory = Path("/app/static")
+static_directory = Path(ESTATICOS_DIRECTORIO)
 if static_directory.exists():
     logger.info(f"Directorio estático encontrado en {static_directory}")
     
-    # Montar los archivos estáticos directamente
-    app.mount("/", StaticFiles(directory="/app/static", html=True), name="static")
+    # Montar los archivos estáticos (variantes .br/.gz, caché immutable para los ficheros con hash, ETag)
+    app.mount(
+        "/",
+        EstaticosSPA(ESTATICOS_DIRECTORIO, ESTATICOS_MAX_BYTES_MEMORIA, ESTATICOS_MAX_BYTES_FICHERO),
+        name="static"
+    )
     
 else:
     logger.warning(f"Directorio de archivos estáticos no encontrado: {static_directory}")
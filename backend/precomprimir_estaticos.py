@@ -0,0 +1,21 @@
+"""
+Genera las variantes .gz y .br del build de la SPA para que la API las sirva sin
+comprimir en cada petición. Ejecutar al construir la imagen (falla si no está instalado
+brotli, para no publicar una imagen sin variantes .br sin darse cuenta):
+
+    python precomprimir_estaticos.py [directorio]
+"""
+import logging
+import sys
+
+from app.core.environment import ESTATICOS_DIRECTORIO
+from app.core.estaticos import precomprimir_directorio
+
+logging.basicConfig(level=logging.INFO)
+
+if __name__ == "__main__":
+    try:
+        import brotli  # noqa: F401
+    except ImportError:
+        sys.exit("Falta el paquete brotli (requirements.txt): no se pueden generar las variantes .br")
+    precomprimir_directorio(sys.argv[1] if len(sys.argv) > 1 else ESTATICOS_DIRECTORIO)
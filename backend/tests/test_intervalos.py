@@ -0,0 +1,108 @@
+import random
+from datetime import time
+
+import pytest
+
+from app.core.intervalos import SEGUNDOS_DIA, IndiceIntervalos, a_hora, a_segundos
+
+def h(valor: str) -> int:
+    horas, minutos = valor.split(":")
+    return int(horas) * 3600 + int(minutos) * 60
+
+def test_a_segundos_y_a_hora():
+    assert a_segundos(time(8, 30, 15)) == 8 * 3600 + 30 * 60 + 15
+    assert a_hora(h("17:45")) == time(17, 45)
+    # El final del día se representa como el último segundo
+    assert a_hora(SEGUNDOS_DIA) == time(23, 59, 59)
+
+def test_indice_vacio():
+    indice = IndiceIntervalos()
+    assert indice.solapa(h("08:00"), h("09:00")) is None
+    assert indice.libres() == [(0, SEGUNDOS_DIA)]
+
+@pytest.mark.parametrize("inicio, fin, solapa", [
+    ("07:00", "08:00", False),  # acaba justo cuando empieza el existente
+    ("12:00", "13:00", False),  # empieza justo cuando acaba
+    ("07:00", "08:01", True),
+    ("11:59", "13:00", True),
+    ("09:00", "10:00", True),   # dentro
+    ("07:00", "13:00", True),   # lo contiene
+    ("12:30", "14:00", False),  # en el hueco
+    ("13:30", "15:00", True),
+])
+def test_solapa_bordes(inicio, fin, solapa):
+    indice = IndiceIntervalos([(h("08:00"), h("12:00"), "a"), (h("14:00"), h("18:00"), "b")])
+    assert (indice.solapa(h(inicio), h(fin)) is not None) == solapa
+
+def test_solapa_con_tramos_antiguos_solapados_entre_si():
+    # Un tramo largo que empieza pronto tapa a otros más cortos posteriores
+    indice = IndiceIntervalos([(h("06:00"), h("20:00"), "largo"), (h("08:00"), h("09:00"), "corto")])
+    assert indice.solapa(h("15:00"), h("16:00"))[2] == "largo"
+    assert indice.solapa(h("20:00"), h("21:00")) is None
+
+def test_solapa_devuelve_un_tramo_que_solapa():
+    indice = IndiceIntervalos([(h("08:00"), h("09:00"), "a"), (h("10:00"), h("11:00"), "b")])
+    inicio, fin, referencia = indice.solapa(h("10:30"), h("12:00"))
+    assert referencia == "b"
+    assert inicio < h("12:00") and fin > h("10:30")
+
+def test_añadir_mantiene_el_orden():
+    indice = IndiceIntervalos([(h("14:00"), h("15:00"), "b")])
+    indice.añadir(h("08:00"), h("09:00"), "a")
+    indice.añadir(h("11:00"), h("12:00"), "c")
+    assert [t[2] for t in indice.tramos()] == ["a", "c", "b"]
+    assert len(indice) == 3
+    assert indice.solapa(h("11:30"), h("11:45"))[2] == "c"
+
+def test_libres_con_limites_y_minimo():
+    indice = IndiceIntervalos([
+        (h("08:00"), h("10:00"), None),
+        (h("09:00"), h("11:00"), None),   # solapado con el anterior
+        (h("11:15"), h("13:00"), None),
+        (h("15:00"), h("19:00"), None),
+    ])
+    assert indice.libres(h("07:00"), h("20:00")) == [
+        (h("07:00"), h("08:00")),
+        (h("11:00"), h("11:15")),
+        (h("13:00"), h("15:00")),
+        (h("19:00"), h("20:00")),
+    ]
+    assert indice.libres(h("07:00"), h("20:00"), minimo=30 * 60) == [
+        (h("07:00"), h("08:00")),
+        (h("13:00"), h("15:00")),
+        (h("19:00"), h("20:00")),
+    ]
+    # Límites que caen dentro de tramos ocupados
+    assert indice.libres(h("09:30"), h("16:00")) == [(h("11:00"), h("11:15")), (h("13:00"), h("15:00"))]
+    assert indice.libres(h("16:00"), h("18:00")) == []
+
+def test_solapa_y_libres_coinciden_con_la_fuerza_bruta():
+    aleatorio = random.Random(20240601)
+    paso = 15 * 60
+    for _ in range(500):
+        tramos = []
+        for _ in range(aleatorio.randint(0, 8)):
+            inicio = aleatorio.randrange(0, 96) * paso
+            tramos.append((inicio, min(inicio + aleatorio.randint(1, 16) * paso, SEGUNDOS_DIA), None))
+        indice = IndiceIntervalos(tramos)
+
+        inicio = aleatorio.randrange(0, 96) * paso
+        fin = min(inicio + aleatorio.randint(1, 16) * paso, SEGUNDOS_DIA)
+        esperado = any(i < fin and inicio < f for i, f, _ in tramos)
+        encontrado = indice.solapa(inicio, fin)
+        assert (encontrado is not None) == esperado
+        if encontrado is not None:
+            assert encontrado[0] < fin and inicio < encontrado[1]
+
+        libres = indice.libres()
+        # Los huecos no tocan ningún tramo y, junto con los tramos, cubren todo el día
+        for hueco_inicio, hueco_fin in libres:
+            assert indice.solapa(hueco_inicio, hueco_fin) is None
+        ocupado = set()
+        for i, f, _ in tramos:
+            ocupado.update(range(i // paso, f // paso))
+        libre = set()
+        for i, f in libres:
+            libre.update(range(i // paso, f // paso))
+        assert ocupado.isdisjoint(libre)
+        assert ocupado | libre == set(range(SEGUNDOS_DIA // paso))
@@ -0,0 +1,150 @@
+from datetime import date, time
+
+import pytest
+
+from app.core.nominas import HorasColumnares, a_dia, calcular, semanas_completas
+from app.schemas.nominas import ReglasNomina
+
+def _minutos(hora):
+    if hora is None:
+        return None
+    horas, minutos = hora.split(":")
+    return int(horas) * 60 + int(minutos)
+
+def columnas(*registros):
+    """Registros (chat_id, fecha, inicio 'HH:MM', fin 'HH:MM', horas_totales, es_extra) como HorasColumnares"""
+    return HorasColumnares.desde_filas([
+        (chat_id, a_dia(fecha), _minutos(inicio), _minutos(fin), horas, extra)
+        for chat_id, fecha, inicio, fin, horas, extra in registros
+    ])
+
+def reglas(**cambios):
+    valores = dict(
+        umbral_diario=8, umbral_semanal=40,
+        noche_inicio=time(22, 0), noche_fin=time(6, 0),
+        prima_extra=0.5, prima_nocturna=0.25, prima_fin_de_semana=1.0,
+        festivos=[],
+    )
+    valores.update(cambios)
+    return ReglasNomina(**valores)
+
+def unico(resultado):
+    assert len(resultado) == 1
+    return resultado[0]
+
+def test_semanas_completas_de_lunes_a_domingo():
+    # 1 de febrero de 2024 es jueves y el 29, jueves
+    assert semanas_completas(date(2024, 2, 1), date(2024, 2, 29)) == (date(2024, 1, 29), date(2024, 3, 3))
+
+def test_exceso_semanal_cuenta_los_dias_del_mes_anterior():
+    # Semana del lunes 29 de enero al domingo 4 de febrero: 8 h diarias de lunes a viernes
+    datos = columnas(*[
+        ("t1", date(2024, 1, dia), "08:00", "16:00", 8.0, False) for dia in (29, 30, 31)
+    ], *[
+        ("t1", date(2024, 2, dia), "08:00", "16:00", 8.0, False) for dia in (1, 2)
+    ])
+    nomina = unico(calcular(datos, date(2024, 2, 1), date(2024, 2, 29), reglas(umbral_semanal=30)))
+
+    # Acumulado 24 h al llegar a febrero: el jueves pasa a 32 (2 extra) y el viernes es todo extra
+    assert nomina.registros == 2
+    assert nomina.dias_trabajados == 2
+    assert nomina.horas_totales == 16
+    assert nomina.horas_extra_semanales == 10
+    assert nomina.horas_extra_diarias == 0
+    assert nomina.horas_ordinarias == 6
+
+def test_exceso_semanal_de_dias_posteriores_al_periodo_no_cuenta():
+    datos = columnas(*[
+        ("t1", date(2024, 1, dia), "08:00", "16:00", 8.0, False) for dia in (29, 30, 31)
+    ], *[
+        ("t1", date(2024, 2, dia), "08:00", "16:00", 8.0, False) for dia in (1, 2)
+    ])
+    nomina = unico(calcular(datos, date(2024, 1, 1), date(2024, 1, 31), reglas(umbral_semanal=30)))
+
+    # En enero solo hay 24 h de esa semana: el umbral se supera en febrero
+    assert nomina.registros == 3
+    assert nomina.horas_totales == 24
+    assert nomina.horas_extra_semanales == 0
+
+def test_extra_diaria_no_cuenta_para_el_umbral_semanal():
+    # Lunes con 10 h (2 extra diarias) y martes con 8 h; umbral semanal 16
+    datos = columnas(
+        ("t1", date(2024, 3, 4), "06:00", "16:00", 10.0, False),
+        ("t1", date(2024, 3, 5), "08:00", "16:00", 8.0, False),
+    )
+    nomina = unico(calcular(datos, date(2024, 3, 1), date(2024, 3, 31), reglas(umbral_semanal=16)))
+
+    assert nomina.horas_extra_diarias == 2
+    assert nomina.horas_extra_semanales == 0
+    assert nomina.horas_extra == 2
+    assert nomina.horas_ordinarias == 16
+
+def test_franja_nocturna_que_cruza_la_medianoche():
+    # Franja de 22:00 a 06:00: una hora por la noche y otra de madrugada
+    datos = columnas(
+        ("t1", date(2024, 3, 4), "20:00", "23:00", 3.0, False),
+        ("t1", date(2024, 3, 5), "05:00", "08:00", 3.0, False),
+        ("t1", date(2024, 3, 6), "08:00", "14:00", 6.0, False),
+    )
+    nomina = unico(calcular(datos, date(2024, 3, 1), date(2024, 3, 31), reglas()))
+
+    assert nomina.horas_nocturnas == 2
+    assert nomina.horas_ponderadas == pytest.approx(12 + 2 * 0.25)
+
+def test_franja_nocturna_sin_cruzar_la_medianoche():
+    datos = columnas(("t1", date(2024, 3, 4), "00:00", "08:00", 8.0, False))
+    nomina = unico(calcular(datos, date(2024, 3, 1), date(2024, 3, 31), reglas(noche_inicio=time(0, 0), noche_fin=time(5, 30))))
+
+    assert nomina.horas_nocturnas == 5.5
+
+def test_nocturnas_no_superan_las_horas_del_registro():
+    # Tramo entero de noche pero con horas_totales menor que la duración
+    datos = columnas(("t1", date(2024, 3, 4), "22:00", "23:59", 1.0, False))
+    nomina = unico(calcular(datos, date(2024, 3, 1), date(2024, 3, 31), reglas()))
+
+    assert nomina.horas_nocturnas == 1
+
+def test_festivos_cuentan_como_fin_de_semana():
+    # Miércoles festivo, sábado y un jueves laborable
+    datos = columnas(
+        ("t1", date(2024, 5, 1), "08:00", "12:00", 4.0, False),
+        ("t1", date(2024, 5, 2), "08:00", "12:00", 4.0, False),
+        ("t1", date(2024, 5, 4), "08:00", "11:00", 3.0, False),
+    )
+    sin_festivos = unico(calcular(datos, date(2024, 5, 1), date(2024, 5, 31), reglas()))
+    con_festivo = unico(calcular(datos, date(2024, 5, 1), date(2024, 5, 31), reglas(festivos=[date(2024, 5, 1)])))
+
+    assert sin_festivos.horas_fin_de_semana == 3
+    assert con_festivo.horas_fin_de_semana == 7
+    assert con_festivo.horas_ponderadas == pytest.approx(11 + 7 * 1.0)
+
+def test_horas_totales_nulas_usan_el_intervalo():
+    datos = columnas(
+        ("t1", date(2024, 3, 4), "08:00", "12:30", None, False),
+        ("t1", date(2024, 3, 5), "08:00", "10:00", 3.0, False),
+        # Sin horas_totales ni horario: no suma horas pero cuenta como registro
+        ("t1", date(2024, 3, 6), None, None, None, False),
+    )
+    nomina = unico(calcular(datos, date(2024, 3, 1), date(2024, 3, 31), reglas()))
+
+    assert nomina.horas_totales == 7.5
+    assert nomina.registros == 3
+    assert nomina.dias_trabajados == 2
+
+def test_varios_trabajadores_y_horas_marcadas_extra():
+    datos = columnas(
+        ("t2", date(2024, 3, 4), "08:00", "18:00", 10.0, True),
+        ("t1", date(2024, 3, 4), "08:00", "12:00", 4.0, False),
+        # Fuera del periodo (y de sus semanas): no aparece
+        ("t3", date(2024, 5, 6), "08:00", "12:00", 4.0, False),
+    )
+    resultado = {n.chat_id: n for n in calcular(datos, date(2024, 3, 1), date(2024, 3, 31), reglas(), {"t1": "Ana"})}
+
+    assert set(resultado) == {"t1", "t2"}
+    assert resultado["t1"].nombre == "Ana"
+    assert resultado["t1"].horas_extra == 0
+    assert resultado["t2"].horas_extra_diarias == 2
+    assert resultado["t2"].horas_marcadas_extra == 10
+
+def test_sin_registros():
+    assert calcular(columnas(), date(2024, 3, 1), date(2024, 3, 31), reglas()) == []
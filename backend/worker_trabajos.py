@@ -0,0 +1,38 @@
+"""
+Proceso independiente que consume la cola de trabajos en segundo plano.
+Usar junto con TRABAJOS_EN_PROCESO=false en la API para separar el trabajo pesado:
+
+    python worker_trabajos.py
+"""
+import asyncio
+import logging
+import signal
+
+# Importar los routers registra los manejadores de cada tipo de trabajo
+import app.api  # noqa: F401
+from app.core.trabajos import RunnerTrabajos
+from app.core.vistas_materializadas import programar_refresco_periodico
+from app.core.idempotencia import programar_limpieza_idempotencia
+from app.core.anomalias import programar_revision_anomalias
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+async def main():
+    runner = RunnerTrabajos()
+    loop = asyncio.get_running_loop()
+    for senal in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(senal, lambda: asyncio.create_task(runner.detener()))
+
+    periodicas = [
+        asyncio.create_task(programar_refresco_periodico()),
+        asyncio.create_task(programar_limpieza_idempotencia()),
+        asyncio.create_task(programar_revision_anomalias()),
+    ]
+    await runner.ejecutar()
+    for tarea in periodicas:
+        tarea.cancel()
+    logger.info("Worker de trabajos detenido")
+
+if __name__ == "__main__":
+    asyncio.run(main())
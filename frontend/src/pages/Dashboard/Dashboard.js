@@ -107,20 +107,17 @@ const Dashboard = () => {
   useEffect(() => {
     const fetchDashboardData = async () => {
       try {
-        // Cargar horas del día actual
-        const horasData = await horasService.getHorasHoy();
+        // Cargar horas del día actual y sus totales (calculados en el servidor)
+        const [horasData, resumenHoy] = await Promise.all([
+          horasService.getHorasHoy(),
+          horasService.getResumenHoy()
+        ]);
         setHorasHoy(horasData);
 
-        // Calcular estadísticas de horas (ejemplo)
-        const totalHours = horasData.reduce((acc, hora) => acc + parseFloat(hora.horas_totales || 0), 0);
-        const extrasHours = horasData.filter(h => h.es_extra).reduce(
-          (acc, hora) => acc + parseFloat(hora.horas_totales || 0), 
-          0
-        );
         setHorasStats({ 
-          total: totalHours, 
-          extras: extrasHours,
-          regular: totalHours - extrasHours
+          total: parseFloat(resumenHoy.horas_totales), 
+          extras: parseFloat(resumenHoy.horas_extra),
+          regular: parseFloat(resumenHoy.horas_normales)
         });
 
         // Cargar lista de obras (solo para admin/secretaria)
@@ -139,6 +136,40 @@ const Dashboard = () => {
     fetchDashboardData();
   }, [user.rol]);
 
+  // Actualizaciones en tiempo real de los registros y totales de hoy (solo admin/secretaria)
+  useEffect(() => {
+    if (user.rol !== 'admin' && user.rol !== 'secretaria') {
+      return undefined;
+    }
+
+    const aplicarTotales = (totales) => {
+      if (!totales) return;
+      setHorasStats({
+        total: totales.horas_totales,
+        extras: totales.horas_extra,
+        regular: totales.horas_normales
+      });
+    };
+
+    const cerrarStream = horasService.suscribirStreamHoras({
+      onTotales: aplicarTotales,
+      onHoras: (evento) => {
+        aplicarTotales(evento.totales);
+        const hoy = new Date();
+        const today = `${hoy.getFullYear()}-${(hoy.getMonth() + 1).toString().padStart(2, '0')}-${hoy.getDate().toString().padStart(2, '0')}`;
+
+        setHorasHoy((prev) => {
+          // Quitar los registros afectados y volver a añadir los que siguen siendo de hoy
+          const restantes = prev.filter((hora) => !evento.ids.includes(hora.id_movimiento));
+          const nuevos = evento.horas.filter((hora) => hora.fecha === today);
+          return [...restantes, ...nuevos];
+        });
+      }
+    });
+
+    return cerrarStream;
+  }, [user.rol]);
+
   // Datos para el gráfico de donut
   const chartData = {
     labels: ['Horas Regulares', 'Horas Extra'],
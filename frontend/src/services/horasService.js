@@ -1,5 +1,71 @@
 import api from './api';
 
+// Decodifica una respuesta en formato columnar ({ formato: 'columnar', columnas, diccionarios })
+// y devuelve un array de objetos fila equivalente al formato normal
+export const decodeColumnar = (data) => {
+  if (!data || data.formato !== 'columnar') {
+    return data;
+  }
+
+  const { total, columnas, diccionarios = {} } = data;
+  const nombres = Object.keys(columnas);
+  const filas = new Array(total);
+
+  for (let i = 0; i < total; i++) {
+    const fila = {};
+    for (const nombre of nombres) {
+      const valor = columnas[nombre][i];
+      const diccionario = diccionarios[nombre];
+      fila[nombre] = diccionario && valor !== null ? diccionario[valor] : valor;
+    }
+    filas[i] = fila;
+  }
+
+  return filas;
+};
+
+// Decodifica una matriz float32 en base64 (calendario de equipo) en un Float32Array por fila
+export const decodeMatriz = (base64, filas, columnas) => {
+  if (!base64) {
+    return null;
+  }
+  const binario = atob(base64);
+  const bytes = new Uint8Array(binario.length);
+  for (let i = 0; i < binario.length; i++) {
+    bytes[i] = binario.charCodeAt(i);
+  }
+  const valores = new Float32Array(bytes.buffer);
+  return Array.from({ length: filas }, (_, fila) => valores.subarray(fila * columnas, (fila + 1) * columnas));
+};
+
+// Genera una Idempotency-Key única por envío (se reutiliza en los reintentos del mismo envío)
+const generarClaveIdempotencia = () => {
+  if (window.crypto && window.crypto.randomUUID) {
+    return window.crypto.randomUUID();
+  }
+  return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+};
+
+// POST con Idempotency-Key: reintenta con la misma clave si se corta la conexión, el
+// primer intento sigue en curso (409 con Retry-After) o se supera el límite de peticiones
+// (429 con Retry-After); el servidor nunca duplica el registro
+const postIdempotente = async (url, data, intentos = 3) => {
+  const headers = { 'Idempotency-Key': generarClaveIdempotencia() };
+  for (let intento = 1; ; intento++) {
+    try {
+      return await api.post(url, data, { headers });
+    } catch (error) {
+      const reintentable = !error.response
+        || ([409, 429].includes(error.response.status) && error.response.headers['retry-after']);
+      if (!reintentable || intento >= intentos) {
+        throw error;
+      }
+      const espera = error.response ? Number(error.response.headers['retry-after']) * 1000 : 1000 * intento;
+      await new Promise((resolve) => setTimeout(resolve, espera));
+    }
+  }
+};
+
 const horasService = {
   // Obtener horas con filtros
   getHoras: async (filtros = {}) => {
@@ -19,7 +85,8 @@ const horasService = {
       
       // Realizar la petición con el query string
       const response = await api.get(`/horas${queryString ? `?${queryString}` : ''}`);
-      return response.data;
+      // Si se pidió format=columnar, devolver las filas ya decodificadas
+      return decodeColumnar(response.data);
     } catch (error) {
       console.error('Error al obtener horas:', error);
       throw error;
@@ -40,6 +107,12 @@ const horasService = {
     return response.data;
   },
   
+  // Obtener los totales del día de hoy calculados en el servidor
+  getResumenHoy: async () => {
+    const response = await api.get('/horas/hoy/resumen');
+    return response.data;
+  },
+  
   // Obtener horas de un mes específico
   getHorasMes: async (año, mes) => {
     // Calcular fechas de inicio y fin del mes (evitando problemas de zona horaria)
@@ -57,6 +130,17 @@ const horasService = {
     return response.data;
   },
   
+  // Obtener horas de un mes en formato columnar (payload más compacto para informes grandes)
+  getHorasMesColumnar: async (año, mes) => {
+    const params = new URLSearchParams();
+    params.append('año', año);
+    params.append('mes', mes);
+    params.append('format', 'columnar');
+    
+    const response = await api.get(`/horas/mes?${params.toString()}`);
+    return decodeColumnar(response.data);
+  },
+  
   // Obtener resumen mensual
   getResumenMensual: async (año, mes) => {
     const params = new URLSearchParams();
@@ -67,6 +151,46 @@ const horasService = {
     return response.data;
   },
   
+  // Obtener el calendario anual de un trabajador (un array de horas por día del año)
+  getCalendario: async (año, chatId = null, { extra = false, obras = false } = {}) => {
+    const params = new URLSearchParams();
+    params.append('año', año);
+    if (chatId) params.append('chat_id', chatId);
+    if (extra) params.append('extra', 'true');
+    if (obras) params.append('obras', 'true');
+
+    const response = await api.get(`/horas/calendario?${params.toString()}`);
+    return response.data;
+  },
+
+  // Obtener el calendario anual de todo el equipo con las matrices ya decodificadas
+  getCalendarioEquipo: async (año, { idObra = null, extra = false } = {}) => {
+    const params = new URLSearchParams();
+    params.append('año', año);
+    if (idObra) params.append('id_obra', idObra);
+    if (extra) params.append('extra', 'true');
+
+    const response = await api.get(`/horas/calendario/equipo?${params.toString()}`);
+    const data = response.data;
+    const filas = data.trabajadores.length;
+    return {
+      ...data,
+      horas: decodeMatriz(data.horas, filas, data.dias),
+      extra: decodeMatriz(data.extra, filas, data.dias)
+    };
+  },
+
+  // Obtener los tramos ocupados y los huecos libres de un trabajador en un día
+  getDisponibilidad: async (fecha, chatId = null, minimoMinutos = 0) => {
+    const params = new URLSearchParams();
+    params.append('fecha', fecha);
+    if (chatId) params.append('chat_id', chatId);
+    if (minimoMinutos) params.append('minimo_minutos', minimoMinutos);
+
+    const response = await api.get(`/horas/disponibilidad?${params.toString()}`);
+    return response.data;
+  },
+
   // Obtener una hora específica
   getHora: async (id) => {
     const response = await api.get(`/horas/${id}`);
@@ -75,13 +199,13 @@ const horasService = {
   
   // Crear un nuevo registro de horas
   createHora: async (horaData) => {
-    const response = await api.post('/horas', horaData);
+    const response = await postIdempotente('/horas', horaData);
     return response.data;
   },
 
   // Crear múltiples registros de horas (tramos) en lote
   createHorasLote: async (horasDataArray) => {
-    const response = await api.post('/horas/lote', horasDataArray);
+    const response = await postIdempotente('/horas/lote', horasDataArray);
     return response.data;
   },
   
@@ -94,6 +218,26 @@ const horasService = {
   // Eliminar un registro de horas
   deleteHora: async (id) => {
     return await api.delete(`/horas/${id}`);
+  },
+
+  // Suscribirse al stream de eventos de horas (SSE). Devuelve una función para cerrar la conexión.
+  // EventSource no permite cabeceras, así que el token se envía por query.
+  suscribirStreamHoras: ({ onTotales, onHoras, onError } = {}) => {
+    const token = localStorage.getItem('token');
+    const source = new EventSource(`${api.defaults.baseURL}/horas/stream?token=${encodeURIComponent(token || '')}`);
+
+    source.addEventListener('totales', (event) => {
+      if (onTotales) onTotales(JSON.parse(event.data));
+    });
+    source.addEventListener('horas', (event) => {
+      if (onHoras) onHoras(JSON.parse(event.data));
+    });
+    source.onerror = (error) => {
+      // EventSource reintenta la conexión automáticamente
+      if (onError) onError(error);
+    };
+
+    return () => source.close();
   }
 };
 
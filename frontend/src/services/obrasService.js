@@ -1,9 +1,15 @@
 import api from './api';
 
 const obrasService = {
-  // Obtener todas las obras
-  getObras: async () => {
-    const response = await api.get('/obras');
+  // Obtener todas las obras (admite prefijo, orden, cursor, limit y total; ver cabeceras X-Total-Count y X-Siguiente-Cursor)
+  getObras: async (params = {}) => {
+    const response = await api.get('/obras', { params });
+    return response.data;
+  },
+  
+  // Buscar obras por nombre o dirección (ordenadas por relevancia): { total, skip, limit, resultados }
+  buscarObras: async (q, params = {}) => {
+    const response = await api.get('/obras/buscar', { params: { q, ...params } });
     return response.data;
   },
   
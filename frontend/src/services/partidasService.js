@@ -7,9 +7,15 @@ const partidasService = {
     return response.data;
   },
   
-  // Obtener partidas por obra
-  getPartidasPorObra: async (idObra) => {
-    const response = await api.get(`/partidas/obra/${idObra}`);
+  // Buscar partidas por nombre (ordenadas por relevancia): { total, skip, limit, resultados }
+  buscarPartidas: async (q, params = {}) => {
+    const response = await api.get('/partidas/buscar', { params: { q, ...params } });
+    return response.data;
+  },
+  
+  // Obtener partidas por obra (con_horas: true añade horas_totales, horas_extra y ultima_actividad)
+  getPartidasPorObra: async (idObra, params = {}) => {
+    const response = await api.get(`/partidas/obra/${idObra}`, { params });
     return response.data;
   },
   
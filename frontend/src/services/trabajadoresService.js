@@ -7,6 +7,12 @@ const trabajadoresService = {
     return response.data;
   },
   
+  // Buscar trabajadores por nombre (ordenados por relevancia): { total, skip, limit, resultados }
+  buscarTrabajadores: async (q, params = {}) => {
+    const response = await api.get('/trabajadores/buscar', { params: { q, ...params } });
+    return response.data;
+  },
+  
   // Obtener un trabajador específico
   getTrabajador: async (chat_id) => {
     const response = await api.get(`/trabajadores/${chat_id}`);